@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+ImageConverterベンチマーク
+合成PNGコーパスを生成し、デコード・色変換・エンコード・サイズ制限付き変換・
+プレビュー生成の各処理を計測してJSONに出力する
+
+使用例:
+    python benchmarks/bench_converter.py --sizes small medium --repeat 5 -o bench.json
+    python benchmarks/bench_converter.py --compare before.json after.json
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# srcフォルダをパスに追加
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_dir, 'src'))
+
+from decoded_image import read_buffer, to_pil_image
+from image_converter import ImageConverter
+
+
+# コーパスのサイズ（width, height）
+SIZES = {
+    'small': (640, 480),
+    'medium': (1920, 1080),
+    'large': (3840, 2160),
+    'huge': (7680, 4320),
+}
+
+CONTENT_TYPES = ('photo', 'screenshot', 'flat_ui', 'alpha')
+
+BENCH_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# 合成コーパス
+# ---------------------------------------------------------------------------
+
+def make_photo(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """写真風: 滑らかなグラデーション + ぼかしたノイズ + 粒状ノイズ"""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(x / width * 3.1 + 0.5),
+        127 + 100 * np.cos(y / height * 2.3),
+        127 + 100 * np.sin((x + y) / (width + height) * 4.7),
+    ], axis=2)
+    blobs = rng.normal(0, 40, (height // 16 + 1, width // 16 + 1, 3)).astype(np.float32)
+    blobs = cv2.resize(blobs, (width, height), interpolation=cv2.INTER_CUBIC)
+    grain = rng.normal(0, 6, (height, width, 3)).astype(np.float32)
+    return np.clip(base + blobs + grain, 0, 255).astype(np.uint8)
+
+
+def make_screenshot(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """スクリーンショット風: ウィンドウ枠・文字列状の細かい線・アイコン"""
+    img = np.full((height, width, 3), 245, dtype=np.uint8)
+    for _ in range(max(4, width * height // 200000)):
+        x0, y0 = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        x1 = min(width - 1, x0 + int(rng.integers(100, max(101, width // 2))))
+        y1 = min(height - 1, y0 + int(rng.integers(60, max(61, height // 2))))
+        color = tuple(int(c) for c in rng.integers(150, 256, 3))
+        cv2.rectangle(img, (x0, y0), (x1, y1), color, -1)
+        cv2.rectangle(img, (x0, y0), (x1, y1), (80, 80, 80), 1)
+        for line_y in range(y0 + 20, y1 - 8, 14):
+            text = "".join(chr(int(c)) for c in rng.integers(65, 91, int(rng.integers(5, 40))))
+            cv2.putText(img, text, (x0 + 6, line_y), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (20, 20, 20), 1,
+                        cv2.LINE_AA)
+    return img
+
+
+def make_flat_ui(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """フラットUI風: 大きな単色領域と角丸ボタン"""
+    img = np.full((height, width, 3), (250, 246, 240), dtype=np.uint8)
+    cv2.rectangle(img, (0, 0), (width, max(40, height // 12)), (200, 120, 40), -1)
+    for _ in range(max(6, width * height // 150000)):
+        x0, y0 = int(rng.integers(0, width - 120)), int(rng.integers(0, height - 50))
+        color = tuple(int(c) for c in rng.integers(40, 230, 3))
+        cv2.rectangle(img, (x0, y0), (x0 + 110, y0 + 40), color, -1, cv2.LINE_AA)
+        cv2.circle(img, (x0 + 20, y0 + 20), 12, (255, 255, 255), -1, cv2.LINE_AA)
+    return img
+
+
+def make_alpha(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """透過付き: 写真風の画像に円形のアルファマスク"""
+    bgr = make_photo(width, height, rng)
+    alpha = np.zeros((height, width), dtype=np.uint8)
+    cv2.circle(alpha, (width // 2, height // 2), min(width, height) // 2 - 4, 255, -1, cv2.LINE_AA)
+    alpha = cv2.GaussianBlur(alpha, (0, 0), 6)
+    return np.dstack([bgr, alpha])
+
+
+GENERATORS: Dict[str, Callable[[int, int, np.random.Generator], np.ndarray]] = {
+    'photo': make_photo,
+    'screenshot': make_screenshot,
+    'flat_ui': make_flat_ui,
+    'alpha': make_alpha,
+}
+
+
+def build_corpus(corpus_dir: str, sizes: List[str], contents: List[str], seed: int) -> List[dict]:
+    """
+    合成PNGコーパスを生成（同じシードなら同じ画像）
+
+    Returns:
+        List[dict]: {path, size, content, width, height, file_size}
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = []
+    for size_name in sizes:
+        width, height = SIZES[size_name]
+        for content in contents:
+            path = os.path.join(corpus_dir, f"{content}_{size_name}_{width}x{height}_s{seed}.png")
+            if not os.path.exists(path):
+                rng = np.random.default_rng(seed)
+                img = GENERATORS[content](width, height, rng)
+                ok, data = cv2.imencode('.png', img)
+                if not ok:
+                    raise RuntimeError(f"コーパス生成失敗: {path}")
+                data.tofile(path)
+            corpus.append({
+                'path': path,
+                'size': size_name,
+                'content': content,
+                'width': width,
+                'height': height,
+                'file_size': os.path.getsize(path),
+            })
+    return corpus
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb() -> Optional[float]:
+    """プロセスのピークRSS（MB）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOSはバイト、Linuxはキロバイト
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+    """
+    fnを繰り返し実行して所要時間を計測
+
+    Returns:
+        dict: p50/p95/平均（ms）とnumpy確保量のピーク（tracemalloc、別途1回実行）
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # numpy/OpenCVの配列確保量（tracemallocで追跡される分）を1回だけ計測
+    tracemalloc.start()
+    fn()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'p50_ms': round(percentile(times, 50), 2),
+        'p95_ms': round(percentile(times, 95), 2),
+        'mean_ms': round(statistics.fmean(times), 2),
+        'traced_peak_mb': round(traced_peak / (1024 * 1024), 1),
+    }
+
+
+def bench_file(item: dict, args, output_dir: str) -> List[dict]:
+    """1ファイル分の各処理を計測"""
+    path = item['path']
+    megapixels = item['width'] * item['height'] / 1e6
+    converter = ImageConverter()
+    decoded = cv2.imdecode(read_buffer(path), cv2.IMREAD_COLOR)
+    rgb = cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB)
+    pil_img = Image.fromarray(rgb)
+    buffer = io.BytesIO()
+
+    def encode(image_format: str, quality: int):
+        def run():
+            buffer.seek(0)
+            buffer.truncate()
+            pil_img.save(buffer, image_format, quality=quality, optimize=True)
+        return run
+
+    stages = {
+        'decode': lambda: cv2.imdecode(read_buffer(path), cv2.IMREAD_UNCHANGED),
+        'color_convert': lambda: cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB),
+        'to_pil': lambda: Image.fromarray(rgb),
+        'to_pil_bgr': lambda: to_pil_image(decoded),
+        'preview': lambda: converter.create_preview(path, (200, 130)),
+    }
+    for quality in args.qualities:
+        stages[f'encode_jpeg_q{quality}'] = encode('JPEG', quality)
+        stages[f'encode_webp_q{quality}'] = encode('WEBP', quality)
+
+    results = []
+    for stage, fn in stages.items():
+        record = measure(fn, args.repeat)
+        record.update({'stage': stage})
+        results.append(record)
+
+    # サイズ制限付きの変換全体（エンコード回数・最終品質も記録）
+    for image_format in ('JPEG', 'WEBP'):
+        ext = '.jpg' if image_format == 'JPEG' else '.webp'
+        out_path = os.path.join(output_dir, os.path.basename(path) + ext)
+        convert = converter.convert_to_jpeg if image_format == 'JPEG' else converter.convert_to_webp
+        record = measure(lambda: convert(path, out_path, args.max_size_mb, args.quality), args.repeat)
+        last = converter.last_result or {}
+        record.update({
+            'stage': f'convert_{image_format.lower()}',
+            'final_quality': last.get('quality'),
+            'encodes': last.get('encodes'),
+            'output_size': last.get('output_size'),
+        })
+        results.append(record)
+
+    for record in results:
+        record.update({
+            'file': os.path.basename(path),
+            'size': item['size'],
+            'content': item['content'],
+            'megapixels': round(megapixels, 2),
+            'throughput_mp_s': round(megapixels / (record['p50_ms'] / 1000), 2) if record['p50_ms'] else None,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'pillow': Image.__version__,
+        'numpy': np.__version__,
+        'git_commit': commit,
+    }
+
+
+def compare(before_path: str, after_path: str):
+    """2つの結果ファイルのp50を比較して表示"""
+    def load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {(r['file'], r['stage']): r for r in data['results']}
+
+    before, after = load(before_path), load(after_path)
+    print(f"{'file':<40} {'stage':<22} {'before':>10} {'after':>10} {'change':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key]['p50_ms'], after[key]['p50_ms']
+        change = (a - b) / b * 100 if b else 0.0
+        print(f"{key[0]:<40} {key[1]:<22} {b:>9.1f}ms {a:>9.1f}ms {change:>+7.1f}%")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ImageConverterの各処理のベンチマーク")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'])
+    parser.add_argument('--contents', nargs='+', choices=list(CONTENT_TYPES), default=list(CONTENT_TYPES))
+    parser.add_argument('--repeat', type=int, default=5, help="各処理の計測回数")
+    parser.add_argument('--seed', type=int, default=1234, help="コーパス生成の乱数シード")
+    parser.add_argument('--qualities', nargs='+', type=int, default=[95, 75], help="単発エンコードを計測する品質")
+    parser.add_argument('--quality', type=int, default=100, help="サイズ制限付き変換の開始品質")
+    parser.add_argument('--max-size-mb', type=float, default=1, help="サイズ制限付き変換の最大サイズ（MB）")
+    parser.add_argument('--corpus-dir', default=None, help="コーパスの保存先（既定: 一時フォルダ）")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="結果JSONの出力先")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="2つの結果ファイルを比較")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    corpus_dir = args.corpus_dir or os.path.join(tempfile.gettempdir(), 'png2jpeg_bench_corpus')
+    corpus = build_corpus(corpus_dir, args.sizes, args.contents, args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for item in corpus:
+            print(f"計測中: {os.path.basename(item['path'])}", file=sys.stderr)
+            results.extend(bench_file(item, args, output_dir))
+
+    report = {
+        'version': BENCH_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('compare', 'output')},
+        'corpus': [{k: v for k, v in item.items() if k != 'path'} for item in corpus],
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{'file':<40} {'stage':<22} {'p50':>9} {'p95':>9} {'MP/s':>8}")
+    for r in results:
+        print(f"{r['file']:<40} {r['stage']:<22} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+              f"{r['throughput_mp_s'] or 0:>8.1f}")
+    print(f"結果を保存しました: {args.output}（ピークRSS {report['peak_rss_mb']} MB）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
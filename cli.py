@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+高品質PNG to JPEG変換ツール
+コマンドライン版（GUIなし・ヘッドレス環境用）
+
+使用例:
+    python cli.py ./input -o ./output -f webp -q 90 -s 2 -w 8
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import sys
+import os
+import multiprocessing
+
+# アプリケーションフォルダをパスに追加
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(app_dir, 'src'))
+
+from batch_cli import main
+
+
+if __name__ == "__main__":
+    # exe化した際のプロセスプール起動に必要
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -10,6 +10,7 @@ Version: 2.0.0 (CustomTkinter)
 
 import sys
 import os
+import multiprocessing
 import tkinter as tk
 from tkinter import messagebox
 import customtkinter as ctk
@@ -66,6 +67,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # exe化した際のプロセスプール起動に必要
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as e:
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+非同期変換サービス
+asyncioのイベントループから変換を呼び出すAPI（変換処理はプロセスプールで実行）
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
+from batch_engine import _init_worker, convert_file, get_output_path
+from memory_scheduler import MemoryScheduler, estimate_working_set
+
+
+class AsyncConversionService:
+    """
+    asyncio用の変換サービス
+
+    convert()は変換結果のdictを返すコルーチン、convert_batch()は完了した順に結果を返す
+    非同期イテレーター。実行中・待機中の変換はmax_pending件までで、それを超える呼び出しは
+    空きが出るまでイベントループを止めずに待つ（バッチの入力もその分だけ先読みする）。
+    呼び出し側のタスクを取り消すと、未開始の変換はプールからも取り消される。
+
+    使用例:
+        async with AsyncConversionService(workers=4) as service:
+            result = await service.convert("a.png", "out/a.jpg", max_size_mb=2, quality=90)
+            async for result in service.convert_batch(paths, "out"):
+                ...
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 executor: Optional[Executor] = None, memory_budget: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            workers: ワーカープロセス数（None時はCPUコア数、1ならスレッド1本で実行）
+            max_pending: 同時に受け付ける変換数（None時はworkersの2倍）
+            executor: 変換を実行するExecutor（指定時はclose()で終了しない）
+            memory_budget: 同時に変換する画像の見積もりメモリの上限（バイト、Noneなら制限なし）
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_pending = max(1, max_pending or self.workers * 2)
+        self.scheduler = MemoryScheduler(memory_budget) if memory_budget else None
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._memory_released: Optional[asyncio.Condition] = None
+        self._closed = False
+
+    async def __aenter__(self) -> 'AsyncConversionService':
+        self._ensure_started()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _ensure_started(self) -> Executor:
+        """Executorと同時実行数の制御を用意（初回呼び出し時）"""
+        if self._closed:
+            raise RuntimeError("変換サービスは終了しています")
+        if self._executor is None:
+            if self.workers == 1:
+                # プロセス起動コストを避ける（変換エンジンを共有するためスレッドは1本）
+                self._executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker)
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_init_worker)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._memory_released = asyncio.Condition()
+        return self._executor
+
+    async def close(self):
+        """サービスを終了（未開始の変換は取り消し、実行中の変換の完了を待つ）"""
+        if self._closed:
+            return
+        self._closed = True
+        executor, self._executor = self._executor, None
+        if executor is not None and self._owns_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, functools.partial(executor.shutdown, wait=True, cancel_futures=True))
+
+    async def convert(self, input_path: str, output_path: Optional[str] = None,
+                      output_format: str = "JPEG", max_size_mb: float = 4, quality: int = 100,
+                      output_dir: Optional[str] = None, **options) -> dict:
+        """
+        1ファイルを変換
+
+        Args:
+            input_path: 入力PNGファイルパス
+            output_path: 出力ファイルパス（None時はoutput_dirと形式から生成）
+            output_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（1-100）
+            output_dir: 出力フォルダ（output_path省略時）
+            **options: convert_fileのオプション（matte_color, alpha_quality, predict_quality,
+                fit_to_size, min_quality, timing, profile）
+
+        Returns:
+            dict: {input_path, output_path, success, error} と変換結果（最終品質・エンコード回数など）
+
+        Raises:
+            asyncio.CancelledError: 呼び出し側のタスクが取り消された場合
+        """
+        if output_path is None:
+            if output_dir is None:
+                raise ValueError("output_pathかoutput_dirを指定してください")
+            output_path = get_output_path(input_path, output_dir, output_format)
+        executor = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(convert_file, input_path, output_path, output_format.upper(),
+                                 max_size_mb, quality, **options)
+
+        async with self._slots:
+            cost = await self._acquire_memory(input_path)
+            try:
+                success, result = await loop.run_in_executor(executor, call)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                success, result = False, {'error': str(e)}
+            finally:
+                await self._release_memory(cost)
+
+        record = {'input_path': input_path, 'output_path': output_path,
+                  'success': success, 'error': None}
+        if result:
+            record.update(result)
+        if not success and not record['error']:
+            record['error'] = "変換失敗"
+        return record
+
+    async def convert_batch(self, files: Union[Iterable[str], AsyncIterable[str]],
+                            output_dir: str, output_format: str = "JPEG",
+                            max_size_mb: float = 4, quality: int = 100,
+                            **options) -> AsyncIterator[dict]:
+        """
+        複数ファイルを変換し、完了した順に結果を返す
+
+        filesは必要な分だけ先読みされる（同期イテラブルの場合、次の要素の取得は
+        イベントループ上で行われるため、時間のかかる列挙は非同期イテラブルで渡す）。
+        イテレーターを途中で閉じる・取り消すと、残りの変換は取り消される。
+
+        Args:
+            files: 入力PNGファイルパスの（非同期）イテラブル
+            output_dir: 出力フォルダ
+            output_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（1-100）
+            **options: convert()と同じオプション
+
+        Yields:
+            dict: convert()と同じ形式の変換結果
+        """
+        self._ensure_started()
+        concurrency = self.max_pending
+        inputs: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        finished_marker = object()
+        feed_error = None
+
+        async def feed():
+            nonlocal feed_error
+            try:
+                if hasattr(files, '__aiter__'):
+                    async for path in files:
+                        await inputs.put(path)
+                else:
+                    for path in files:
+                        await inputs.put(path)
+            except Exception as e:
+                feed_error = e
+            for _ in range(concurrency):
+                await inputs.put(finished_marker)
+
+        async def work():
+            while True:
+                path = await inputs.get()
+                if path is finished_marker:
+                    break
+                result = await self.convert(path, output_format=output_format,
+                                            max_size_mb=max_size_mb, quality=quality,
+                                            output_dir=output_dir, **options)
+                await results.put(result)
+            await results.put(finished_marker)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks.extend(asyncio.create_task(work()) for _ in range(concurrency))
+        try:
+            remaining = concurrency
+            while remaining:
+                item = await results.get()
+                if item is finished_marker:
+                    remaining -= 1
+                    continue
+                yield item
+            if feed_error is not None:
+                raise feed_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _acquire_memory(self, input_path: str) -> Optional[int]:
+        """メモリ予算が空くまで待って確保（予算なしならNone）"""
+        if self.scheduler is None:
+            return None
+        loop = asyncio.get_running_loop()
+        # ヘッダーの読み込みでイベントループを止めない
+        cost = await loop.run_in_executor(None, estimate_working_set, input_path)
+        async with self._memory_released:
+            await self._memory_released.wait_for(lambda: self.scheduler.try_acquire(cost))
+        return cost
+
+    async def _release_memory(self, cost: Optional[int]):
+        """確保した分を解放し、待っている変換に知らせる"""
+        if cost is None:
+            return
+        self.scheduler.release(cost)
+        async with self._memory_released:
+            self._memory_released.notify_all()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+コマンドライン版バッチ変換
+GUIなし（customtkinter・windnd不要）でサーバー・cron・CIから実行する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from conversion_thread import ConversionThread
+from derivatives import DEFAULT_NAME_TEMPLATE, DEFAULT_WIDTHS, derivative_outputs, make_levels
+from file_scanner import DirectoryScanner, OrderedFileIndex
+from image_converter import AVAILABLE_FORMATS, DEFAULT_ALPHA_QUALITY, DEFAULT_MATTE, MIN_QUALITY
+from instrumentation import Instrumentation, JsonlStageSink, ProfileCapture, StageAggregator
+
+
+def collect_inputs(patterns: List[str], recursive: bool = False,
+                   exclude: Sequence[str] = ()) -> List[str]:
+    """
+    入力指定（ファイル・globパターン・フォルダ）からPNGファイル一覧を作成
+
+    Args:
+        patterns: 入力指定のリスト
+        recursive: フォルダ指定時にサブフォルダも検索するか
+        exclude: フォルダ走査時に除外するパターン
+
+    Returns:
+        List[str]: 重複を除いたPNGファイルパス（指定順）
+    """
+    files = OrderedFileIndex()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            scanner = DirectoryScanner(pattern, exclude=exclude, recursive=recursive)
+            files.extend(os.path.abspath(path) for path in scanner.scan())
+            continue
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        files.extend(os.path.abspath(path) for path in matches
+                     if path.lower().endswith('.png') and os.path.isfile(path))
+    return list(files)
+
+
+def parse_color(value: str) -> Tuple[int, int, int]:
+    """'#RRGGBB' または 'R,G,B' を (R, G, B) に変換"""
+    try:
+        if ',' in value:
+            rgb = tuple(int(v) for v in value.split(','))
+        else:
+            hex_value = value.lstrip('#')
+            if len(hex_value) != 6:
+                raise ValueError(value)
+            rgb = tuple(int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"色の指定が不正です: {value}")
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise argparse.ArgumentTypeError(f"色の指定が不正です: {value}")
+    return rgb
+
+
+def parse_target(value: str) -> dict:
+    """'形式[:最大MB[:品質]]' を出力設定に変換（省略した値は -s・-q の値を使う）"""
+    parts = value.split(':')
+    output_format = parts[0].upper()
+    if output_format not in AVAILABLE_FORMATS or len(parts) > 3:
+        raise argparse.ArgumentTypeError(
+            f"出力の指定が不正です: {value}（形式は {', '.join(AVAILABLE_FORMATS).lower()}）")
+    target = {'format': output_format}
+    try:
+        if len(parts) > 1 and parts[1]:
+            target['max_size_mb'] = float(parts[1])
+        if len(parts) > 2 and parts[2]:
+            target['quality'] = int(parts[2])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"出力の指定が不正です: {value}")
+    return target
+
+
+def parse_numbers(value: str, number_type=float) -> List:
+    """カンマ区切りの数値リストを変換"""
+    try:
+        numbers = [number_type(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"数値の指定が不正です: {value}")
+    if not numbers or any(number <= 0 for number in numbers):
+        raise argparse.ArgumentTypeError(f"数値の指定が不正です: {value}")
+    return numbers
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="PNGをサイズ制限内の最高品質JPEG/WebP/AVIFに一括変換（1ファイル1行のJSONで進捗を出力）"
+    )
+    parser.add_argument('inputs', nargs='+', help="入力PNGファイル・globパターン・フォルダ")
+    parser.add_argument('-o', '--output-dir', required=True, help="出力フォルダ")
+    parser.add_argument('-f', '--format', choices=[fmt.lower() for fmt in AVAILABLE_FORMATS],
+                        default='jpeg', help="出力形式")
+    parser.add_argument('-t', '--target', type=parse_target, action='append', default=[],
+                        metavar='FORMAT[:MB[:QUALITY]]',
+                        help="複数形式に同時変換（例: -t jpeg:4:95 -t webp:2:90、1回のデコードを全形式で共有）")
+    parser.add_argument('--widths', type=lambda value: parse_numbers(value, int), nargs='?',
+                        const=list(DEFAULT_WIDTHS), default=None, metavar='W1,W2,...',
+                        help="幅の異なる派生画像を生成（既定の幅: "
+                             f"{','.join(str(width) for width in DEFAULT_WIDTHS)}、1回のデコードから縮小）")
+    parser.add_argument('--width-caps', type=parse_numbers, default=None, metavar='MB1,MB2,...',
+                        help="派生画像の幅ごとの最大ファイルサイズ（MB、幅の昇順。"
+                             "省略時は最大の幅を -s とし他の幅は画素数の比で割り当て）")
+    parser.add_argument('--name-template', default=DEFAULT_NAME_TEMPLATE, metavar='TEMPLATE',
+                        help="派生画像のファイル名（{stem} {width} {format} {ext}、"
+                             f"既定: {DEFAULT_NAME_TEMPLATE}）")
+    parser.add_argument('-q', '--quality', type=int, default=100, help="品質（1-100）")
+    parser.add_argument('-s', '--max-size-mb', type=float, default=4, help="最大ファイルサイズ（MB）")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="ワーカープロセス数（既定: CPUコア数）")
+    parser.add_argument('-r', '--recursive', action='store_true', help="フォルダ指定時にサブフォルダも検索")
+    parser.add_argument('-x', '--exclude', action='append', default=[],
+                        help="フォルダ走査時に除外するファイル名・フォルダ名のパターン（複数指定可）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="出力フォルダのマニフェストを使い、変更のない入力をスキップ")
+    parser.add_argument('--hash', action='store_true',
+                        help="差分判定で更新日時が変わった入力を内容ハッシュ（SHA-256）で再確認")
+    parser.add_argument('--memory-budget', type=int, default=None, metavar='MB',
+                        help="同時に変換する画像の見積もりメモリの上限（既定: 物理メモリの半分、0で制限なし）")
+    parser.add_argument('--matte', type=parse_color, default=DEFAULT_MATTE, metavar='COLOR',
+                        help="JPEG変換時に透過部分を合成する背景色（#RRGGBB、既定: #ffffff）")
+    parser.add_argument('--alpha-quality', type=int, default=DEFAULT_ALPHA_QUALITY,
+                        help="WebP変換時のアルファチャンネルの品質（1-100）")
+    parser.add_argument('--fit', action='store_true',
+                        help="最低品質でも最大サイズを超える場合は解像度を下げて収める（収まらなければ失敗）")
+    parser.add_argument('--min-quality', type=int, default=MIN_QUALITY,
+                        help=f"サイズ調整時の最低品質（既定: {MIN_QUALITY}）")
+    parser.add_argument('--no-predict', action='store_true',
+                        help="サイズ予測を使わず、指定品質から二分探索で品質を決める")
+    parser.add_argument('--stages', action='store_true',
+                        help="処理段階（読み込み・デコード・PILへの受け渡し・エンコード・書き込み）ごとの所要時間を集計")
+    parser.add_argument('--stage-log', metavar='PATH',
+                        help="1ファイルごとの段階別所要時間をJSON Linesで追記（--stagesを含む）")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="指定ファイル（パスまたはファイル名）の変換をcProfile・tracemallocで記録")
+    parser.add_argument('--profile-dir', metavar='DIR', default=None,
+                        help="プロファイル結果の保存先（既定: 出力フォルダ）")
+    return parser
+
+
+# JSONレコードの出力先（main()の実行中は元の標準出力、None時はsys.stdout）
+_record_stream = None
+
+
+def emit(record: dict):
+    """1レコードを1行のJSONとして出力"""
+    stream = _record_stream or sys.stdout
+    stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    CLIエントリーポイント
+
+    標準出力はJSONレコード専用とし、実行中のprint()などの診断メッセージは標準エラーへ送る
+    （forkで起動したワーカープロセスにも引き継がれる）。
+
+    Returns:
+        int: 終了コード（0: 全成功, 1: 失敗あり, 2: 入力なし・引数エラー）
+    """
+    global _record_stream
+    args = build_parser().parse_args(argv)
+
+    _record_stream = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args)
+    finally:
+        _record_stream = None
+
+
+def run(args: argparse.Namespace) -> int:
+    """解析済みの引数でバッチ変換を実行（終了コードはmain()と同じ）"""
+    files = collect_inputs(args.inputs, args.recursive, args.exclude)
+    if not files:
+        emit({'event': 'error', 'message': "PNGファイルが見つかりません"})
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    totals = {'bytes_in': 0, 'bytes_out': 0}
+
+    def callback(etype, p1, p2):
+        if etype == "result":
+            totals['bytes_in'] += p2['input_size']
+            # 複数形式・派生画像の場合は出力ごとに1行
+            outputs = p2['outputs'].items() if 'outputs' in p2 else [(args.format.upper(), p2)]
+            for output_format, output in outputs:
+                totals['bytes_out'] += output['output_size']
+                record = {
+                    'event': 'file',
+                    'status': 'ok',
+                    'input': p1,
+                    'output': output['output_path'],
+                    'format': output.get('format', output_format),
+                    'bytes_in': p2['input_size'],
+                    'bytes_out': output['output_size'],
+                    'quality': output['quality'],
+                    'scale': output['scale'],
+                    'encodes': output['encodes'],
+                    'predicted_quality': output.get('predicted_quality'),
+                    'within_limit': output['within_limit'],
+                    'alpha': p2['has_alpha'],
+                    'elapsed_ms': p2['elapsed_ms'],
+                }
+                if 'width' in output:
+                    record['width'] = output['output_width']
+                emit(record)
+        elif etype == "skipped":
+            emit({'event': 'file', 'status': 'skipped', 'input': p1, 'output': p2})
+        elif etype == "error":
+            emit({'event': 'file', 'status': 'error', 'input': p2, 'message': p1})
+
+        elif etype == "stages":
+            emit({'event': 'stages', 'files': p1['files'], 'stages': p1['stages']})
+
+    instrumentation = None
+    if args.stages or args.stage_log or args.profile:
+        sinks = []
+        if args.stages or args.stage_log:
+            sinks.append(StageAggregator())
+        if args.stage_log:
+            sinks.append(JsonlStageSink(args.stage_log))
+        profile = None
+        if args.profile:
+            profile = ProfileCapture(args.profile, args.profile_dir or args.output_dir)
+        instrumentation = Instrumentation(sinks, profile)
+
+    targets = [dict({'max_size_mb': args.max_size_mb, 'quality': args.quality}, **target)
+               for target in args.target]
+    if len({target['format'] for target in targets}) != len(targets):
+        emit({'event': 'error', 'message': "同じ形式の出力が複数指定されています"})
+        return 2
+    derivatives = None
+    if args.widths:
+        if targets:
+            emit({'event': 'error', 'message': "--widths と -t は同時に指定できません"})
+            return 2
+        try:
+            levels = make_levels(args.widths, args.max_size_mb, args.quality, args.width_caps)
+            # ファイル名の書式を変換前に確認
+            derivative_outputs(files[0], args.output_dir, levels, args.format, args.name_template)
+        except ValueError as e:
+            emit({'event': 'error', 'message': str(e)})
+            return 2
+        derivatives = {'levels': levels, 'name_template': args.name_template}
+
+    start_time = time.perf_counter()
+    conversion = ConversionThread(
+        files, args.output_dir, args.max_size_mb, args.quality,
+        args.format.upper(), callback, workers=args.workers,
+        incremental=args.incremental, use_hash=args.hash,
+        instrumentation=instrumentation,
+        matte_color=args.matte, alpha_quality=args.alpha_quality,
+        memory_budget_mb=args.memory_budget, predict_quality=not args.no_predict,
+        fit_to_size=args.fit, min_quality=args.min_quality,
+        targets=targets or None, derivatives=derivatives
+    )
+    thread = conversion.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        # Ctrl+Cで中止（実行中のファイルは完了まで待つ）
+        conversion.cancel()
+        thread.join()
+
+    summary = {
+        'event': 'summary',
+        'total': len(files),
+        'converted': conversion.counts['converted'],
+        'skipped': conversion.counts['skipped'],
+        'stale': conversion.counts['stale'],
+        'failed': conversion.counts['failed'],
+        'cancelled': conversion.engine.cancelled,
+        'bytes_in': totals['bytes_in'],
+        'bytes_out': totals['bytes_out'],
+        'encodes': conversion.counts['encodes'],
+        # 予測なしの二分探索と比べて1ファイルあたりに減らせたエンコード回数
+        'encodes_saved_per_file': round(
+            conversion.counts['encodes_saved'] / max(1, conversion.counts['converted']), 2),
+        'elapsed_ms': round((time.perf_counter() - start_time) * 1000, 1),
+    }
+    scheduler = conversion.engine.scheduler
+    if scheduler is not None:
+        # 見積もりメモリの最大同時使用量と、予算を超えるため単独で実行した件数
+        summary['memory_peak_estimate_mb'] = round(scheduler.peak_bytes / (1024 * 1024), 1)
+        summary['serialized'] = scheduler.serialized
+    emit(summary)
+    return 0 if conversion.counts['failed'] == 0 and not conversion.engine.cancelled else 1
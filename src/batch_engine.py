@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+並列バッチ変換エンジン
+ImageConverterの変換処理をプロセスプールに分散して実行
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from image_converter import (ImageConverter, DEFAULT_ALPHA_QUALITY, DEFAULT_MATTE, MIN_QUALITY,
+                             OUTPUT_EXTENSIONS)
+from derivatives import DerivativeGenerator, derivative_outputs
+from image_probe import probe_image
+from instrumentation import ProfileCapture
+from memory_scheduler import MemoryScheduler, estimate_working_set
+
+
+# ワーカープロセスごとに1つだけ生成する変換エンジン
+_worker_converter: Optional[ImageConverter] = None
+
+# ワーカープロセスごとの派生画像生成（縮小先の配列を変換間で再利用）
+_worker_generator: Optional[DerivativeGenerator] = None
+
+
+def _init_worker():
+    """ワーカープロセス初期化"""
+    global _worker_converter
+    _worker_converter = ImageConverter()
+
+
+def _get_worker_converter() -> ImageConverter:
+    """ワーカー用の変換エンジンを取得（未初期化なら生成）"""
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = ImageConverter()
+    return _worker_converter
+
+
+def get_output_path(input_path: str, output_dir: str, output_format: str = "JPEG") -> str:
+    """
+    出力ファイルパスを生成
+
+    Args:
+        input_path: 入力PNGファイルパス
+        output_dir: 出力フォルダ
+        output_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+
+    Returns:
+        str: 出力ファイルパス
+    """
+    extension = OUTPUT_EXTENSIONS.get(output_format.upper(), '.jpg')
+    return os.path.join(output_dir, Path(input_path).stem + extension)
+
+
+def get_target_outputs(input_path: str, output_dir: str, targets: List[dict]) -> List[dict]:
+    """複数形式の出力先（targetsの各要素にoutput_pathを加えたもの）"""
+    return [dict(target, output_path=get_output_path(input_path, output_dir, target['format']))
+            for target in targets]
+
+
+def convert_file(input_path: str, output_path: str, output_format: str,
+                 max_size_mb: int, quality: int, timing: bool = False,
+                 profile: Optional[ProfileCapture] = None,
+                 matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+                 alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+                 predict_quality: bool = True, fit_to_size: bool = False,
+                 min_quality: int = MIN_QUALITY) -> Tuple[bool, Optional[dict]]:
+    """
+    1ファイルを変換（プロセスプールから呼び出される）
+
+    Args:
+        timing: 処理段階ごとの所要時間を結果の'stages'に含めるか
+        profile: 対象ファイルならcProfile・tracemallocで記録
+        matte_color: JPEG変換時に透過部分を合成する背景色（RGB）
+        alpha_quality: WebP変換時のアルファチャンネルの品質
+        predict_quality: サイズ予測から品質探索を始めるか（予測モデルはワーカーごとに学習）
+        fit_to_size: 最低品質でも収まらない場合に解像度を下げて収めるか
+        min_quality: サイズ調整時の最低品質
+
+    Returns:
+        Tuple[bool, Optional[dict]]: (成功時True, 変換結果（最終品質・エンコード回数・処理時間など、失敗時は'error'のみ）)
+    """
+    converter = _get_worker_converter()
+    converter.timing = timing
+    converter.matte_color = tuple(matte_color)
+    converter.alpha_quality = alpha_quality
+    converter.predict_quality = predict_quality
+    converter.fit_to_size = fit_to_size
+    converter.min_quality = min_quality
+    start_time = time.perf_counter()
+    if profile is not None and profile.matches(input_path):
+        with profile.capture(input_path):
+            success = converter.convert(input_path, output_path, max_size_mb, quality,
+                                        output_format)
+    else:
+        success = converter.convert(input_path, output_path, max_size_mb, quality,
+                                    output_format)
+    if not success:
+        # 失敗時は理由のみ返す
+        return False, {'error': converter.last_error} if converter.last_error else None
+    if converter.last_result is None:
+        return success, None
+
+    result = dict(converter.last_result)
+    result['output_path'] = output_path
+    result['input_size'] = os.path.getsize(input_path)
+    result['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+    return success, result
+
+
+def convert_file_multi(input_path: str, outputs: List[dict], timing: bool = False,
+                       profile: Optional[ProfileCapture] = None,
+                       matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+                       alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+                       predict_quality: bool = True, fit_to_size: bool = False,
+                       min_quality: int = MIN_QUALITY) -> Tuple[bool, Optional[dict]]:
+    """
+    1ファイルを1回のデコードで複数形式に変換（プロセスプールから呼び出される）
+
+    Args:
+        outputs: 出力先のリスト（{'format', 'output_path', 'max_size_mb', 'quality'}）
+        その他の引数はconvert_fileと同じ
+
+    Returns:
+        Tuple[bool, Optional[dict]]: (全形式成功時True, 変換結果（'outputs'に形式ごとの結果）)
+    """
+    converter = _get_worker_converter()
+    converter.timing = timing
+    converter.matte_color = tuple(matte_color)
+    converter.alpha_quality = alpha_quality
+    converter.predict_quality = predict_quality
+    converter.fit_to_size = fit_to_size
+    converter.min_quality = min_quality
+    start_time = time.perf_counter()
+    if profile is not None and profile.matches(input_path):
+        with profile.capture(input_path):
+            success = converter.convert_multi(input_path, outputs)
+    else:
+        success = converter.convert_multi(input_path, outputs)
+    if converter.last_result is None:
+        return False, {'error': converter.last_error} if converter.last_error else None
+
+    # 一部の形式のみ失敗した場合も、成功した形式の結果は返す
+    result = dict(converter.last_result)
+    result['input_size'] = os.path.getsize(input_path)
+    result['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+    if not success:
+        result['error'] = converter.last_error
+    return success, result
+
+
+def generate_derivatives_file(input_path: str, outputs: List[dict], timing: bool = False,
+                              profile: Optional[ProfileCapture] = None,
+                              matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+                              alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+                              predict_quality: bool = True, fit_to_size: bool = False,
+                              min_quality: int = MIN_QUALITY) -> Tuple[bool, Optional[dict]]:
+    """
+    1ファイルから幅の異なる派生画像を生成（プロセスプールから呼び出される）
+
+    Args:
+        outputs: 出力先のリスト（derivative_outputsの結果）
+        その他の引数はconvert_fileと同じ
+
+    Returns:
+        Tuple[bool, Optional[dict]]: (全段成功時True, 生成結果（'outputs'に段ごとの結果）)
+    """
+    global _worker_generator
+    converter = _get_worker_converter()
+    converter.timing = timing
+    converter.matte_color = tuple(matte_color)
+    converter.alpha_quality = alpha_quality
+    converter.predict_quality = predict_quality
+    converter.fit_to_size = fit_to_size
+    converter.min_quality = min_quality
+    if _worker_generator is None or _worker_generator.converter is not converter:
+        _worker_generator = DerivativeGenerator(converter)
+    generator = _worker_generator
+    start_time = time.perf_counter()
+    if profile is not None and profile.matches(input_path):
+        with profile.capture(input_path):
+            success = generator.generate(input_path, outputs)
+    else:
+        success = generator.generate(input_path, outputs)
+    if generator.last_result is None:
+        return False, {'error': generator.last_error} if generator.last_error else None
+
+    # 一部の段のみ失敗した場合も、成功した段の結果は返す
+    result = dict(generator.last_result)
+    result['input_size'] = os.path.getsize(input_path)
+    result['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+    if not success:
+        result['error'] = generator.last_error
+    return success, result
+
+
+class ParallelConversionEngine:
+    """プロセスプールによる並列変換エンジン"""
+
+    def __init__(self, workers: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 timing: bool = False, profile: Optional[ProfileCapture] = None,
+                 memory_budget: Optional[int] = None, predict_quality: bool = True,
+                 fit_to_size: bool = False, min_quality: int = MIN_QUALITY):
+        """
+        初期化
+
+        Args:
+            workers: ワーカープロセス数（None時はCPUコア数、1ならプールを使わず逐次実行）
+            max_in_flight: 同時に投入しておく最大タスク数（None時はworkersの2倍）
+            timing: 処理段階ごとの所要時間を変換結果に含めるか
+            profile: 1ファイルのプロファイル取得設定
+            memory_budget: 同時に変換する画像の見積もりメモリの上限（バイト、Noneなら制限なし）
+            predict_quality: 画像の特徴からエンコード後のサイズを予測し、品質探索の開始点にするか
+            fit_to_size: 最低品質でも収まらない場合に解像度を下げて収めるか（収まらなければ失敗）
+            min_quality: サイズ調整時の最低品質
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_in_flight = max(1, max_in_flight or self.workers * 2)
+        self.timing = timing
+        self.profile = profile
+        self.memory_budget = memory_budget
+        self.predict_quality = predict_quality
+        self.fit_to_size = fit_to_size
+        self.min_quality = min_quality
+        # 直近の実行で使ったスケジューラー（統計の参照用）
+        self.scheduler: Optional[MemoryScheduler] = None
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """変換を中止（実行中のファイルは完了まで待つ）"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def run(self, files: Iterable[str], output_dir: str, output_format: str,
+            max_size_mb: int, quality: int,
+            callback: Optional[Callable] = None, total: Optional[int] = None,
+            should_convert: Optional[Callable[[str, str], bool]] = None,
+            matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+            alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+            targets: Optional[List[dict]] = None,
+            derivatives: Optional[dict] = None) -> int:
+        """
+        バッチ変換を実行（呼び出し元スレッドでブロック）
+
+        filesは遅延評価され、投入済みで未完了のタスクは常にmax_in_flight以下に保たれる。
+
+        Args:
+            files: 入力PNGファイルパスのイテラブル
+            output_dir: 出力フォルダ
+            output_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（1-100）
+            callback: callback(event_type, p1, p2) 形式のコールバック
+                （progress: 完了数/総数, processed: 入力/出力パス, result: 入力パス/結果dict,
+                  error: メッセージ/入力パス, skipped: 入力/出力パス, cancelled: 完了数/総数）
+            total: 総ファイル数（None時はlen(files)から取得を試みる）
+            should_convert: should_convert(入力パス, 出力パス) がFalseのファイルは変換せず
+                skippedとして完了扱いにする（差分変換用）
+            matte_color: JPEG変換時に透過部分を合成する背景色（RGB）
+            alpha_quality: WebP変換時のアルファチャンネルの品質（1-100）
+            targets: 複数形式に同時変換する場合の出力設定（{'format', 'max_size_mb', 'quality'}のリスト）。
+                指定時はoutput_format・max_size_mb・qualityを使わず、各入力を1回だけデコードする。
+                出力パス（should_convert・processedに渡す値）は出力先のリストになる
+            derivatives: 幅の異なる派生画像を生成する場合の設定
+                （{'levels': make_levelsの結果, 'name_template': 出力ファイル名の書式}）。
+                形式はoutput_formatを使い、出力パスはtargetsと同様に出力先のリストになる
+
+        Returns:
+            int: 完了（成功・失敗含む）したファイル数
+        """
+        if total is None:
+            try:
+                total = len(files)
+            except TypeError:
+                total = 0
+
+        def notify(etype, p1=None, p2=None):
+            if callback:
+                callback(etype, p1, p2)
+
+        done = 0
+        options = (self.timing, self.profile, matte_color, alpha_quality,
+                   self.predict_quality, self.fit_to_size, self.min_quality)
+
+        def outputs_for(file_path):
+            if derivatives is not None:
+                # 元画像より大きい幅は元画像の幅の1枚にまとめる（ファイル名は実際の幅）
+                header = probe_image(file_path)
+                return derivative_outputs(file_path, output_dir, derivatives['levels'],
+                                          output_format, derivatives['name_template'],
+                                          source_width=header['width'] if header else None)
+            if targets is None:
+                return get_output_path(file_path, output_dir, output_format)
+            return get_target_outputs(file_path, output_dir, targets)
+
+        def task_for(file_path, output_path):
+            # (関数, 引数...) の形で返す（プールへの投入と逐次実行で共通）
+            if derivatives is not None:
+                return (generate_derivatives_file, file_path, output_path) + options
+            if targets is None:
+                return (convert_file, file_path, output_path, output_format,
+                        max_size_mb, quality) + options
+            return (convert_file_multi, file_path, output_path) + options
+
+        # 見積もりメモリの出力数（派生画像は全段を合わせても元画像の4/3倍程度のため2出力分）
+        output_count = 2 if derivatives is not None else len(targets or [None])
+        # JPEGのみへの変換では巨大なPNGをストリップ単位でエンコードする（縮小する場合を除く）
+        output_formats = [target['format'].upper() for target in targets or [{'format': output_format}]]
+        streamed_jpeg = (derivatives is None and output_formats == ['JPEG']
+                         and not self.fit_to_size)
+
+        def handle_result(file_path, output_path, success, result=None, error=None):
+            nonlocal done
+            done += 1
+            if error is not None:
+                notify("error", f"エラー: {file_path} - {error}", file_path)
+            elif success:
+                notify("processed", file_path, output_path)
+                if result:
+                    notify("result", file_path, result)
+            elif result and result.get('error'):
+                notify("error", f"変換失敗: {file_path} - {result['error']}", file_path)
+            else:
+                notify("error", f"変換失敗: {file_path}", file_path)
+            notify("progress", done, max(total, done))
+
+        def skip(file_path, output_path):
+            nonlocal done
+            if should_convert is None or should_convert(file_path, output_path):
+                return False
+            done += 1
+            notify("skipped", file_path, output_path)
+            notify("progress", done, max(total, done))
+            return True
+
+        if self.workers == 1:
+            # 逐次実行（プロセス起動コストを避ける）
+            for file_path in files:
+                if self.cancelled:
+                    break
+                output_path = outputs_for(file_path)
+                if skip(file_path, output_path):
+                    continue
+                try:
+                    fn, *args = task_for(file_path, output_path)
+                    success, result = fn(*args)
+                    handle_result(file_path, output_path, success, result)
+                except Exception as e:
+                    handle_result(file_path, output_path, False, error=e)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=_init_worker) as executor:
+                in_flight = {}
+                file_iter = iter(files)
+                exhausted = False
+                # メモリ予算に収まらず開始を待っている先頭のタスク（順序は入れ替えない）
+                pending = None
+                scheduler = None
+                if self.memory_budget:
+                    scheduler = MemoryScheduler(self.memory_budget)
+                self.scheduler = scheduler
+
+                while True:
+                    # 上限まで投入（メモリ使用量を一定に保つ）
+                    while not self.cancelled and len(in_flight) < self.max_in_flight:
+                        if pending is None:
+                            if exhausted:
+                                break
+                            try:
+                                file_path = next(file_iter)
+                            except StopIteration:
+                                exhausted = True
+                                break
+                            output_path = outputs_for(file_path)
+                            if skip(file_path, output_path):
+                                continue
+                            cost = 0
+                            if scheduler is not None:
+                                cost = estimate_working_set(file_path, outputs=output_count,
+                                                            streamed_jpeg=streamed_jpeg)
+                            pending = (file_path, output_path, cost)
+                        file_path, output_path, cost = pending
+                        if scheduler is not None and not scheduler.try_acquire(cost):
+                            # 実行中のタスクが終わって予算が空くまで待つ
+                            break
+                        pending = None
+                        future = executor.submit(*task_for(file_path, output_path))
+                        in_flight[future] = (file_path, output_path, cost)
+
+                    if not in_flight:
+                        break
+
+                    if self.cancelled:
+                        # 未開始のタスクを取り消す
+                        for future in list(in_flight):
+                            if future.cancel():
+                                if scheduler is not None:
+                                    scheduler.release(in_flight[future][2])
+                                del in_flight[future]
+                        if not in_flight:
+                            break
+
+                    finished, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        file_path, output_path, cost = in_flight.pop(future)
+                        if scheduler is not None:
+                            scheduler.release(cost)
+                        try:
+                            success, result = future.result()
+                            handle_result(file_path, output_path, success, result)
+                        except Exception as e:
+                            handle_result(file_path, output_path, False, error=e)
+
+        if self.cancelled:
+            notify("cancelled", done, total)
+        return done
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+変換マニフェスト
+出力フォルダに変換履歴を保存し、変更のない入力の再変換を省略する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from typing import Optional
+
+
+MANIFEST_NAME = ".png2jpeg_manifest.json"
+MANIFEST_VERSION = 1
+
+# check()の判定結果
+STATUS_NEW = "new"        # 未変換
+STATUS_VALID = "valid"    # 出力が有効（再変換不要）
+STATUS_STALE = "stale"    # 変換済みだが入力・設定・出力のいずれかが変化
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """ファイル内容のSHA-256を計算"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """出力フォルダ単位の変換マニフェスト"""
+
+    def __init__(self, output_dir: str, use_hash: bool = False):
+        """
+        初期化
+
+        Args:
+            output_dir: 出力フォルダ（マニフェストはここに保存）
+            use_hash: 更新日時が変わった入力を内容ハッシュで再確認するか
+        """
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.use_hash = use_hash
+        self.entries = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """マニフェストを読み込み（存在しない・破損時は空）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """マニフェストを保存（一時ファイル + リネームで置き換え）"""
+        with self._lock:
+            data = json.dumps({'version': MANIFEST_VERSION, 'entries': self.entries},
+                              ensure_ascii=False)
+        temp_path = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"マニフェスト保存エラー: {self.path} - {str(e)}", file=sys.stderr)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _source_hash(self, source_path: str) -> str:
+        digest = self._hashes.get(source_path)
+        if digest is None:
+            digest = file_sha256(source_path)
+            self._hashes[source_path] = digest
+        return digest
+
+    def check(self, source_path: str, output_key: str, output_path: str, params: dict) -> str:
+        """
+        出力が再利用できるか判定
+
+        Args:
+            source_path: 入力ファイルパス
+            output_key: 出力の種類（"JPEG" / "WEBP" など）
+            output_path: 出力ファイルパス
+            params: 変換パラメータ（品質・最大サイズなど）
+
+        Returns:
+            str: STATUS_NEW / STATUS_VALID / STATUS_STALE
+        """
+        source_key = os.path.abspath(source_path)
+        with self._lock:
+            entry = self.entries.get(source_key)
+            output = entry['outputs'].get(output_key) if entry else None
+        if output is None:
+            return STATUS_NEW
+
+        try:
+            source_stat = os.stat(source_path)
+            output_stat = os.stat(output_path)
+        except OSError:
+            return STATUS_STALE
+
+        if source_stat.st_size != entry['size']:
+            return STATUS_STALE
+        if source_stat.st_mtime_ns != entry['mtime_ns']:
+            # 更新日時のみ変わった場合は内容ハッシュで確認
+            if not (self.use_hash and entry.get('sha256')
+                    and self._source_hash(source_path) == entry['sha256']):
+                return STATUS_STALE
+            # 内容が同じなら更新日時を記録し直し、次回のハッシュ計算を省く
+            with self._lock:
+                entry['mtime_ns'] = source_stat.st_mtime_ns
+
+        if (output['params'] != params
+                or output['path'] != os.path.abspath(output_path)
+                or output['bytes'] != output_stat.st_size
+                or output['mtime_ns'] != output_stat.st_mtime_ns):
+            return STATUS_STALE
+        return STATUS_VALID
+
+    def record(self, source_path: str, output_key: str, output_path: str, params: dict,
+               result: Optional[dict] = None):
+        """
+        変換結果を記録
+
+        Args:
+            source_path: 入力ファイルパス
+            output_key: 出力の種類（"JPEG" / "WEBP"、派生画像は "JPEG@640w" など）
+            output_path: 出力ファイルパス
+            params: 変換パラメータ
+            result: 変換結果（最終品質など）
+        """
+        source_stat = os.stat(source_path)
+        output_stat = os.stat(output_path)
+        source_key = os.path.abspath(source_path)
+
+        sha256 = None
+        if self.use_hash:
+            sha256 = self._source_hash(source_path)
+
+        with self._lock:
+            entry = self.entries.get(source_key)
+            unchanged = (entry is not None and entry['size'] == source_stat.st_size
+                         and (entry['mtime_ns'] == source_stat.st_mtime_ns
+                              or (sha256 is not None and entry.get('sha256') == sha256)))
+            if not unchanged:
+                # 入力が変わっていれば他形式の出力記録も無効
+                entry = {'outputs': {}}
+                self.entries[source_key] = entry
+            entry['size'] = source_stat.st_size
+            entry['mtime_ns'] = source_stat.st_mtime_ns
+            entry['sha256'] = sha256
+            entry['outputs'][output_key] = {
+                'path': os.path.abspath(output_path),
+                'params': params,
+                'bytes': output_stat.st_size,
+                'mtime_ns': output_stat.st_mtime_ns,
+                'quality': result.get('quality') if result else None,
+                'scale': result.get('scale', 1.0) if result else None,
+            }
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+変換スレッド
+GUI・CLI共通のバッチ変換処理（customtkinterに依存しない）
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+from batch_engine import ParallelConversionEngine
+from derivatives import fit_levels
+from image_converter import ALPHA_FORMATS, DEFAULT_ALPHA_QUALITY, DEFAULT_MATTE, MIN_QUALITY
+from conversion_manifest import ConversionManifest, STATUS_STALE, STATUS_VALID
+from instrumentation import Instrumentation
+from memory_scheduler import default_memory_budget
+
+
+class ConversionThread:
+    """画像変換処理クラス"""
+    
+    # 差分変換時、この件数ごとにマニフェストを途中保存
+    MANIFEST_SAVE_INTERVAL = 100
+    
+    def __init__(self, files: List[str], output_dir: str, 
+                 max_size_mb: int, quality: int, output_format: str = "JPEG", callback=None,
+                 workers: Optional[int] = None, incremental: bool = False, use_hash: bool = False,
+                 instrumentation: Optional[Instrumentation] = None,
+                 matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+                 alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+                 memory_budget_mb: Optional[int] = None, predict_quality: bool = True,
+                 fit_to_size: bool = False, min_quality: int = MIN_QUALITY,
+                 targets: Optional[List[dict]] = None, derivatives: Optional[dict] = None):
+        self.files = files
+        self.output_dir = output_dir
+        self.max_size_mb = max_size_mb
+        self.quality = quality
+        self.output_format = output_format
+        self.callback = callback
+        # 複数形式に同時変換する場合の出力設定（{'format', 'max_size_mb', 'quality'}のリスト）
+        # 指定時は各入力を1回だけデコードし、output_format・max_size_mb・qualityは使わない
+        self.targets = None
+        if targets:
+            self.targets = [dict(target, format=target['format'].upper()) for target in targets]
+        # 幅の異なる派生画像を生成する場合の設定（{'levels', 'name_template'}、形式はoutput_format）
+        # 指定時はmax_size_mb・qualityの代わりに段ごとの設定を使う
+        self.derivatives = derivatives
+        # 透過PNGの扱い（JPEGは背景色に合成、WebPはアルファを保持）
+        self.matte_color = tuple(matte_color)
+        self.alpha_quality = alpha_quality
+        # サイズ制限を優先する場合は解像度も下げる（min_qualityは品質の下限）
+        self.fit_to_size = fit_to_size
+        self.min_quality = min_quality
+        # 処理段階ごとの計測（シンクへの記録はこのスレッドで行う）
+        self.instrumentation = instrumentation
+        # 同時に変換する画像の見積もりメモリの上限（None時は物理メモリの半分、0で制限なし）
+        if memory_budget_mb is None:
+            memory_budget = default_memory_budget()
+        else:
+            memory_budget = memory_budget_mb * 1024 * 1024
+        # 並列変換エンジン（workers=None時はCPUコア数）
+        self.engine = ParallelConversionEngine(
+            workers=workers,
+            memory_budget=memory_budget,
+            predict_quality=predict_quality,
+            fit_to_size=fit_to_size,
+            min_quality=min_quality,
+            timing=instrumentation.timing if instrumentation else False,
+            profile=instrumentation.profile if instrumentation else None
+        )
+        # 差分変換（出力フォルダのマニフェストで変更のない入力をスキップ）
+        self.incremental = incremental
+        self.use_hash = use_hash
+        # encodes: エンコード回数の合計、encodes_saved: サイズ予測で減らせたエンコード回数の合計
+        self.counts = {'converted': 0, 'skipped': 0, 'stale': 0, 'failed': 0,
+                       'encodes': 0, 'encodes_saved': 0}
+        
+    @property
+    def params(self) -> dict:
+        """マニフェストに記録する変換パラメータ"""
+        return self.params_for(self.output_format, self.max_size_mb, self.quality)
+        
+    def params_for(self, output_format: str, max_size_mb: float, quality: int) -> dict:
+        """出力形式ごとのマニフェストに記録する変換パラメータ"""
+        params = {
+            'format': output_format.upper(),
+            'quality': quality,
+            'max_size_mb': max_size_mb,
+        }
+        # 透過の設定は既定値以外の場合のみ記録（既存のマニフェストを無効にしない）
+        if params['format'] == 'JPEG' and self.matte_color != DEFAULT_MATTE:
+            params['matte'] = list(self.matte_color)
+        if params['format'] in ALPHA_FORMATS and self.alpha_quality != DEFAULT_ALPHA_QUALITY:
+            params['alpha_quality'] = self.alpha_quality
+        if self.fit_to_size:
+            params['fit_to_size'] = True
+        if self.min_quality != MIN_QUALITY:
+            params['min_quality'] = self.min_quality
+        return params
+        
+    def start(self):
+        """変換処理開始"""
+        def conversion_worker():
+            manifest = None
+            if self.incremental:
+                manifest = ConversionManifest(self.output_dir, use_hash=self.use_hash)
+            output_key = self.output_format.upper()
+            params = self.params
+            # 出力ごとのパラメータ（複数形式は形式がキー）
+            target_params = {}
+            for target in self.targets or []:
+                target_params[target['format']] = self.params_for(
+                    target['format'], target['max_size_mb'], target['quality'])
+            
+            def level_params(levels):
+                # 派生画像の段ごとのパラメータ（「形式@実際の幅w」がキー、元画像の幅で入力ごとに変わる）
+                return {f"{output_key}@{level['width']}w": dict(
+                            self.params_for(output_key, level['max_size_mb'], level['quality']),
+                            width=level['width'])
+                        for level in levels}
+            
+            def should_convert(file_path, output_path):
+                if isinstance(output_path, str):
+                    statuses = [manifest.check(file_path, output_key, output_path, params)]
+                else:
+                    # 複数の出力はどれか1つでも変換が必要なら全出力を変換（デコードは1回）
+                    key_params = target_params
+                    if self.derivatives is not None:
+                        key_params = level_params(output_path)
+                    statuses = [manifest.check(file_path, output.get('key', output['format']),
+                                               output['output_path'],
+                                               key_params[output.get('key', output['format'])])
+                                for output in output_path]
+                if STATUS_STALE in statuses:
+                    self.counts['stale'] += 1
+                return any(status != STATUS_VALID for status in statuses)
+                
+            def handle_event(etype, p1, p2):
+                if etype == "result":
+                    self.counts['converted'] += 1
+                    # 複数形式・派生画像の場合は出力ごとの結果（outputs）を記録
+                    if 'outputs' in p2:
+                        key_params = target_params
+                        if self.derivatives is not None:
+                            key_params = level_params(fit_levels(self.derivatives['levels'],
+                                                                 p2['source_width']))
+                        outputs = [(key, result, key_params[key])
+                                   for key, result in p2['outputs'].items()]
+                    else:
+                        outputs = [(output_key, p2, params)]
+                    for _, result, _ in outputs:
+                        self.counts['encodes'] += result.get('encodes', 0)
+                        self.counts['encodes_saved'] += result.get('encodes_saved', 0)
+                    if self.instrumentation is not None:
+                        self.instrumentation.record(p1, p2)
+                    if manifest is not None:
+                        try:
+                            for key, result, key_params in outputs:
+                                manifest.record(p1, key, result['output_path'], key_params, result)
+                        except OSError as e:
+                            print(f"マニフェスト記録エラー: {p1} - {str(e)}", file=sys.stderr)
+                        if self.counts['converted'] % self.MANIFEST_SAVE_INTERVAL == 0:
+                            manifest.save()
+                elif etype == "skipped":
+                    self.counts['skipped'] += 1
+                elif etype == "error":
+                    self.counts['failed'] += 1
+                if self.callback:
+                    self.callback(etype, p1, p2)
+            
+            try:
+                self.engine.run(
+                    self.files, self.output_dir, self.output_format,
+                    self.max_size_mb, self.quality, callback=handle_event,
+                    should_convert=should_convert if manifest is not None else None,
+                    matte_color=self.matte_color, alpha_quality=self.alpha_quality,
+                    targets=self.targets, derivatives=self.derivatives
+                )
+            except Exception as e:
+                if self.callback:
+                    self.callback("error", f"エラー: {str(e)}", None)
+            
+            if manifest is not None:
+                manifest.save()
+            if self.instrumentation is not None:
+                self.instrumentation.close()
+                aggregator = self.instrumentation.aggregator
+                if aggregator is not None and self.callback:
+                    self.callback("stages", aggregator.summary(), None)
+            if self.callback:
+                self.callback("summary", dict(self.counts), None)
+                self.callback("completed", None, None)
+        
+        thread = threading.Thread(target=conversion_worker, daemon=True)
+        thread.start()
+        return thread
+        
+    def cancel(self):
+        """変換中止"""
+        self.engine.cancel()
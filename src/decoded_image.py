@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+デコード済み画像とキャッシュ
+1回のデコード結果をプレビュー・情報表示・変換で共有する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_probe import probe_image
+from instrumentation import NULL_TIMER
+
+
+# 縮小デコード倍率 -> OpenCVの読み込みフラグ
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# デコーダー側で縮小できる形式（PNGは全画素のデコードが必要）
+REDUCED_DECODE_FORMATS = ('JPEG', 'WEBP')
+
+# 不透明判定で一度に調べる行数（透過画素が見つかった時点で打ち切る）
+OPAQUE_CHECK_ROWS = 256
+
+
+def map_file(path: str) -> Optional[mmap.mmap]:
+    """
+    ファイルを読み取り専用でメモリマップ（空ファイルはNone）
+
+    Pythonのopen()を使うため日本語パスにも対応し、np.fromfileのように
+    ファイル全体をヒープへコピーしない。マップは参照がなくなった時点で解除される。
+    """
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空ファイルはマップできない
+            return None
+
+
+def as_buffer(mapping: Optional[mmap.mmap]) -> np.ndarray:
+    """メモリマップをデコーダーに渡せる読み取り専用のuint8配列として参照（コピーしない）"""
+    if mapping is None:
+        return np.empty(0, dtype=np.uint8)
+    return np.frombuffer(mapping, dtype=np.uint8)
+
+
+def read_buffer(path: str) -> np.ndarray:
+    """ファイル内容をメモリマップした読み取り専用のuint8配列"""
+    return as_buffer(map_file(path))
+
+
+def normalize_depth(img: np.ndarray) -> np.ndarray:
+    """16bit画像を8bitに変換（8bitはそのまま）"""
+    if img.dtype == np.uint8:
+        return img
+    # 1パスで丸めながら8bitへ（65535 -> 255）
+    return cv2.convertScaleAbs(img, alpha=255.0 / 65535.0)
+
+
+def is_opaque(img: np.ndarray) -> bool:
+    """
+    アルファが全画素255か判定（BGRA以外は常にTrue）
+
+    行ブロックごとに最小値を調べ、透過画素が見つかった時点で打ち切る。
+    """
+    if img.ndim != 3 or img.shape[2] != 4:
+        return True
+    alpha = img[:, :, 3]
+    for top in range(0, alpha.shape[0], OPAQUE_CHECK_ROWS):
+        if alpha[top:top + OPAQUE_CHECK_ROWS].min() < 255:
+            return False
+    return True
+
+
+def resize_to_fit(img: np.ndarray, max_size: Tuple[int, int]) -> np.ndarray:
+    """
+    アスペクト比を維持して最大サイズに収まるよう縮小
+
+    Args:
+        img: 画像
+        max_size: 最大サイズ (width, height)
+
+    Returns:
+        np.ndarray: 縮小後の画像（収まっている場合はそのまま）
+    """
+    height, width = img.shape[:2]
+    max_width, max_height = max_size
+
+    if width > max_width or height > max_height:
+        scale = min(max_width / width, max_height / height)
+        new_width = max(1, int(width * scale))
+        new_height = max(1, int(height * scale))
+        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+    return img
+
+
+# 背景合成で一度に処理する行数（uint16の一時配列をこの行数分に抑える）
+COMPOSITE_ROWS = 256
+
+
+def composite_on_matte(bgra: np.ndarray, matte: Tuple[int, int, int] = (255, 255, 255),
+                       out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    BGRA画像を背景色に合成（整数演算のみ、float64の中間配列を作らない）
+
+    各画素を (色 * α + 背景 * (255 - α)) / 255 で丸めて求める。
+    分子は最大 255 * 255 のためuint16に収まり、/255は (x + (x >> 8)) >> 8 で計算する。
+
+    Args:
+        bgra: BGRA画像（uint8）
+        matte: 背景色（RGB）
+        out: 出力先のBGR配列（bgra[:, :, :3] を渡すとその場で上書き）
+
+    Returns:
+        np.ndarray: 合成後のBGR画像
+    """
+    height, width = bgra.shape[:2]
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    matte_bgr = np.array(matte[::-1], dtype=np.uint16)
+    
+    for top in range(0, height, COMPOSITE_ROWS):
+        block = bgra[top:top + COMPOSITE_ROWS]
+        alpha = block[:, :, 3:4].astype(np.uint16)
+        color = block[:, :, :3].astype(np.uint16)
+        color *= alpha
+        np.subtract(255, alpha, out=alpha)
+        color += matte_bgr * alpha
+        # 四捨五入して255で割る
+        color += 128
+        color += color >> 8
+        color >>= 8
+        out[top:top + COMPOSITE_ROWS] = color
+    return out
+
+
+def to_pil_image(img: np.ndarray, keep_alpha: bool = True) -> Image.Image:
+    """
+    OpenCVの画像をPillowの画像に変換
+
+    BGR/BGRAの並びはPillowのrawモードで読み替えるため、cv2.cvtColorによる
+    全画素分のRGB配列を作らない（Pillow側へのコピー1回のみ）。
+
+    Args:
+        img: BGR・BGRA・グレースケールの画像
+        keep_alpha: BGRAのアルファを残すか（Falseならアルファを読み飛ばしてRGB）
+
+    Returns:
+        Image.Image: RGB・RGBA・Lの画像
+    """
+    if img.ndim == 2:
+        return Image.fromarray(img)
+    img = np.ascontiguousarray(img)
+    height, width = img.shape[:2]
+    if img.shape[2] == 4:
+        if keep_alpha:
+            return Image.frombuffer('RGBA', (width, height), img, 'raw', 'BGRA', 0, 1)
+        return Image.frombuffer('RGB', (width, height), img, 'raw', 'BGRX', 0, 1)
+    return Image.frombuffer('RGB', (width, height), img, 'raw', 'BGR', 0, 1)
+
+
+def decode_reduced(path: str, max_size: Tuple[int, int],
+                   header: Optional[dict] = None,
+                   data: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    プレビュー用に縮小デコード
+
+    JPEG/WebPは表示サイズを下回らない範囲で1/2・1/4・1/8の縮小デコードを行い、
+    その後1回だけ表示サイズへ縮小する。
+
+    Args:
+        path: 画像ファイルパス
+        max_size: 表示サイズ (width, height)
+        header: probe_imageの結果（Noneの場合は解析する）
+        data: ファイル内容（Noneの場合はメモリマップして読む）
+
+    Returns:
+        np.ndarray: 表示サイズに収まる画像（None if error）
+    """
+    if data is None:
+        data = read_buffer(path)
+    if data.size == 0:
+        return None
+    if header is None:
+        header = probe_image(path)
+
+    flag = cv2.IMREAD_COLOR
+    if header is not None and header['format'] in REDUCED_DECODE_FORMATS:
+        scale = min(header['width'] / max_size[0], header['height'] / max_size[1])
+        for factor in (8, 4, 2):
+            if scale >= factor:
+                flag = REDUCED_DECODE_FLAGS[factor]
+                break
+
+    img = cv2.imdecode(data, flag)
+    del data
+    if img is None:
+        return None
+    return resize_to_fit(img, max_size)
+
+
+class DecodedImage:
+    """
+    一度だけデコードした画像（画素・メタデータ・サムネイル）
+
+    open()で生成した場合はヘッダー情報のみを持ち、画素はpixelsへの
+    初回アクセス時にデコードする。サムネイルは画素が未デコードなら縮小デコードで作る。
+    ファイル内容はopen()時に1回だけメモリマップし、ヘッダー解析と最初のデコード
+    （全画素またはサムネイル）で共有した後に解放する（開いたままにしない）。
+    デコード・サムネイル作成は複数のスレッドから呼ばれても1回だけ行い、
+    保持するメモリ量が増えた場合はon_resize（登録先のキャッシュ）に通知する。
+    """
+
+    def __init__(self, path: str, file_size: int, mtime_ns: int,
+                 header: Optional[dict] = None, pixels: Optional[np.ndarray] = None,
+                 mapping: Optional[mmap.mmap] = None):
+        self.path = path
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+        # ヘッダー解析結果（ビット深度・アルファ有無など）
+        self.header = header
+        self._pixels = pixels
+        self._mapping = mapping
+        self._decode_failed = False
+        self._opaque: Optional[bool] = None
+        self._thumbnails: Dict[Tuple[int, int], np.ndarray] = {}
+        # サムネイルの合計バイト数（nbytesをロックなしで求めるため別に持つ）
+        self._thumbnail_bytes = 0
+        self._lock = threading.Lock()
+        # on_resize(画像) 画素・サムネイルの追加でnbytesが増えた時に呼ばれる（ロック外）
+        self.on_resize: Optional[Callable[["DecodedImage"], None]] = None
+
+    @classmethod
+    def open(cls, path: str) -> Optional["DecodedImage"]:
+        """
+        ヘッダーのみ解析して生成（画素は必要になるまでデコードしない）
+
+        Args:
+            path: 画像ファイルパス
+
+        Returns:
+            DecodedImage: 画像（None if error）
+        """
+        stat = os.stat(path)
+        mapping = map_file(path)
+        header = probe_image(path, mapping) if mapping is not None else None
+        image = cls(path, stat.st_size, stat.st_mtime_ns, header, mapping=mapping)
+        if header is None and image.pixels is None:
+            # ヘッダー解析できない形式はデコードして確認
+            return None
+        return image
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DecodedImage"]:
+        """
+        画像ファイルをデコード
+
+        Args:
+            path: 画像ファイルパス
+
+        Returns:
+            DecodedImage: デコード結果（None if error）
+        """
+        image = cls.open(path)
+        if image is None or image.pixels is None:
+            return None
+        return image
+
+    def _take_data(self) -> np.ndarray:
+        """共有中のファイル内容を受け取り、以降は保持しない"""
+        mapping, self._mapping = self._mapping, None
+        if mapping is None:
+            mapping = map_file(self.path)
+        return as_buffer(mapping)
+
+    def release_data(self):
+        """共有中のファイル内容（メモリマップ）を解放"""
+        self._mapping = None
+
+    @property
+    def pixels(self) -> Optional[np.ndarray]:
+        """デコード済み画素（8bitのBGR・BGRA・グレースケール、初回アクセス時にデコード）"""
+        return self.decode()
+
+    def decode(self, timer=NULL_TIMER) -> Optional[np.ndarray]:
+        """
+        画素をデコード（デコード済みならそのまま返す）
+
+        Args:
+            timer: 読み込み・デコードの所要時間を記録するStageTimer
+
+        Returns:
+            np.ndarray: 画素（8bitのBGR・BGRA・グレースケール、None if error）
+        """
+        if self._pixels is not None or self._decode_failed:
+            return self._pixels
+        with self._lock:
+            # 待っている間に他のスレッドがデコードした場合はそれを使う
+            if self._pixels is not None or self._decode_failed:
+                return self._pixels
+            with timer.stage('read') as stage:
+                img_array = self._take_data()
+                stage.nbytes = img_array.nbytes
+            with timer.stage('decode') as stage:
+                # アルファ・グレースケールを保持してデコード（16bitは8bitへ）
+                pixels = None
+                if img_array.size:
+                    pixels = cv2.imdecode(img_array, cv2.IMREAD_UNCHANGED)
+                del img_array
+                if pixels is not None:
+                    pixels = normalize_depth(pixels)
+                self._pixels = pixels
+                stage.nbytes = self._pixels.nbytes if self._pixels is not None else 0
+            self._decode_failed = self._pixels is None
+        self._notify_resize()
+        return self._pixels
+
+    def _notify_resize(self):
+        on_resize = self.on_resize
+        if on_resize is not None:
+            on_resize(self)
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._pixels is not None
+
+    @property
+    def has_alpha(self) -> bool:
+        """実際に透過画素を含むか（全画素不透明のアルファは透過なし扱い）"""
+        if self._opaque is None:
+            pixels = self.pixels
+            self._opaque = pixels is None or is_opaque(pixels)
+        return not self._opaque
+
+    @property
+    def width(self) -> int:
+        if self.header is not None:
+            return self.header['width']
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        if self.header is not None:
+            return self.header['height']
+        return self.pixels.shape[0]
+
+    @property
+    def channels(self) -> int:
+        if self.header is not None:
+            return self.header['channels']
+        return self.pixels.shape[2] if self.pixels.ndim == 3 else 1
+
+    @property
+    def info(self) -> dict:
+        """ImageConverter.get_image_infoと同じ形式の画像情報"""
+        info = dict(self.header) if self.header else {'channels': self.channels}
+        info.update({
+            'width': self.width,
+            'height': self.height,
+            'file_size': self.file_size,
+            'file_size_mb': round(self.file_size / (1024 * 1024), 2)
+        })
+        return info
+
+    @property
+    def nbytes(self) -> int:
+        """保持しているメモリ量（画素 + サムネイル）"""
+        pixels = self._pixels
+        return (pixels.nbytes if pixels is not None else 0) + self._thumbnail_bytes
+
+    def thumbnail(self, max_size: Tuple[int, int]) -> Optional[np.ndarray]:
+        """
+        サムネイルを取得（同じサイズは2回目以降キャッシュを返す）
+
+        Args:
+            max_size: 最大サイズ (width, height)
+
+        Returns:
+            np.ndarray: サムネイル画像（None if error）
+        """
+        key = (int(max_size[0]), int(max_size[1]))
+        thumb = self._thumbnails.get(key)
+        if thumb is not None:
+            return thumb
+        with self._lock:
+            thumb = self._thumbnails.get(key)
+            if thumb is not None:
+                return thumb
+            if self._pixels is not None:
+                thumb = resize_to_fit(self._pixels, key)
+            else:
+                thumb = decode_reduced(self.path, key, self.header, self._take_data())
+            if thumb is None:
+                return None
+            self._thumbnails[key] = thumb
+            self._thumbnail_bytes += thumb.nbytes
+        self._notify_resize()
+        return thumb
+
+    def is_current(self) -> bool:
+        """元ファイルが変更されていないか確認"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_size == self.file_size and stat.st_mtime_ns == self.mtime_ns
+
+
+class DecodedImageCache:
+    """デコード済み画像のLRUキャッシュ（バイト数で上限管理）"""
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        """
+        初期化
+
+        Args:
+            max_bytes: キャッシュの最大バイト数
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, DecodedImage]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, path: str) -> Optional[DecodedImage]:
+        """キャッシュ済みの画像を取得（ファイルが変更されていればNone）"""
+        with self._lock:
+            image = self._entries.get(path)
+            if image is None:
+                return None
+            if not image.is_current():
+                self._remove(path)
+                return None
+            self._entries.move_to_end(path)
+            return image
+
+    def load(self, path: str) -> Optional[DecodedImage]:
+        """
+        キャッシュから取得、なければ生成して登録（画素は必要時にデコード）
+
+        Args:
+            path: 画像ファイルパス
+
+        Returns:
+            DecodedImage: デコード結果（None if error）
+        """
+        image = self.get(path)
+        if image is not None:
+            return image
+
+        image = DecodedImage.open(path)
+        if image is not None:
+            self.put(image)
+        return image
+
+    def put(self, image: DecodedImage):
+        """画像を登録（上限を超える画像はキャッシュしない）"""
+        if image.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self._entries.get(image.path) not in (None, image):
+                self._remove(image.path)
+            self._entries[image.path] = image
+            self._entries.move_to_end(image.path)
+            # 登録後に画素・サムネイルが追加された分も上限に含める
+            image.on_resize = self._on_resize
+            self._account(image.path, image)
+            self._evict()
+
+    def _on_resize(self, image: DecodedImage):
+        """登録済みの画像の画素・サムネイルが増えた時（デコードしたスレッドから呼ばれる）"""
+        with self._lock:
+            if self._entries.get(image.path) is not image:
+                return
+            if image.nbytes > self.max_bytes:
+                # 単独で上限を超える画像は保持しない（呼び出し元は引き続き使える）
+                self._remove(image.path)
+                return
+            self._account(image.path, image)
+            self._evict()
+
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._lock:
+            for image in self._entries.values():
+                image.on_resize = None
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def _account(self, path: str, image: DecodedImage):
+        size = image.nbytes
+        self._total_bytes += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+
+    def _remove(self, path: str):
+        image = self._entries.pop(path, None)
+        if image is not None:
+            image.on_resize = None
+            image.release_data()
+        self._total_bytes -= self._sizes.pop(path, 0)
+
+    def _evict(self):
+        # 古いものから上限以下になるまで削除（最新の1件は残す）
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
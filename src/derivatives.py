@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+派生画像の生成
+1回のデコードから幅の異なる複数の画像（レスポンシブ画像のセット）を生成する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from decoded_image import DecodedImage, composite_on_matte, to_pil_image
+from image_converter import ALPHA_FORMATS, AVAILABLE_FORMATS, OUTPUT_EXTENSIONS, ImageConverter
+from instrumentation import NULL_TIMER, StageTimer
+
+
+# 既定の出力幅（px）
+DEFAULT_WIDTHS = (320, 640, 1280, 2560)
+
+# 既定の出力ファイル名（{stem}: 入力ファイル名, {width}: 幅, {format}: 形式の小文字, {ext}: 拡張子）
+DEFAULT_NAME_TEMPLATE = "{stem}-{width}w{ext}"
+
+
+def make_levels(widths: Sequence[int], max_size_mb: float, quality: int,
+                caps: Optional[Sequence[float]] = None) -> List[dict]:
+    """
+    幅ごとの出力設定を作成
+
+    Args:
+        widths: 出力幅（px）
+        max_size_mb: 最大の幅の最大ファイルサイズ（MB、capsを省略した場合）
+        quality: 品質（1-100）
+        caps: 幅ごとの最大ファイルサイズ（MB、widthsを昇順に並べた順、1つなら全幅共通）。
+            省略時は最大の幅をmax_size_mbとし、他の幅には画素数の比で割り当てる
+
+    Returns:
+        List[dict]: {'width', 'max_size_mb', 'quality'} のリスト（幅の昇順）
+    """
+    widths = sorted(set(int(width) for width in widths))
+    if not widths or widths[0] < 1:
+        raise ValueError("出力幅は1以上で指定してください")
+    if caps is None:
+        largest = widths[-1]
+        caps = [max_size_mb * (width / largest) ** 2 for width in widths]
+    elif len(caps) == 1:
+        caps = list(caps) * len(widths)
+    elif len(caps) != len(widths):
+        raise ValueError("最大ファイルサイズの数が出力幅の数と一致しません")
+    return [{'width': width, 'max_size_mb': cap, 'quality': quality}
+            for width, cap in zip(widths, caps)]
+
+
+def fit_levels(levels: List[dict], source_width: int) -> List[dict]:
+    """
+    元画像の幅に合わせた出力設定（拡大はしない）
+
+    元画像の幅以上の段は元画像の幅の1段にまとめる（最大ファイルサイズはまとめた段の最大）。
+
+    Args:
+        levels: make_levelsで作成した出力設定
+        source_width: 元画像の幅（px）
+
+    Returns:
+        List[dict]: {'width', 'max_size_mb', 'quality'} のリスト（幅の昇順）
+    """
+    fitted = [dict(level) for level in levels if level['width'] < source_width]
+    larger = [level for level in levels if level['width'] >= source_width]
+    if larger:
+        fitted.append({'width': source_width,
+                       'max_size_mb': max(level['max_size_mb'] for level in larger),
+                       'quality': larger[0]['quality']})
+    return sorted(fitted, key=lambda level: level['width'])
+
+
+def derivative_outputs(input_path: str, output_dir: str, levels: List[dict],
+                       output_format: str = "JPEG",
+                       name_template: str = DEFAULT_NAME_TEMPLATE,
+                       source_width: Optional[int] = None) -> List[dict]:
+    """
+    派生画像の出力先（levelsの各要素にkey・format・output_pathを加えたもの）
+
+    keyは「形式@幅w」（マニフェスト・変換結果のoutputsで使う）。
+    source_widthを指定した場合は、fit_levelsで元画像の幅に合わせた段の出力先を返す
+    （ファイル名・keyの幅は実際に出力する幅）。
+
+    Raises:
+        ValueError: ファイル名の書式が不正、または出力先が重複する場合
+    """
+    output_format = output_format.upper()
+    stem = Path(input_path).stem
+    extension = OUTPUT_EXTENSIONS.get(output_format, '.jpg')
+    if source_width is not None:
+        levels = fit_levels(levels, source_width)
+    outputs = []
+    for level in levels:
+        try:
+            name = name_template.format(stem=stem, width=level['width'],
+                                        format=output_format.lower(), ext=extension)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"出力ファイル名の書式が不正です: {name_template} - {str(e)}")
+        outputs.append(dict(level, key=f"{output_format}@{level['width']}w",
+                            format=output_format, output_path=os.path.join(output_dir, name)))
+    if len({output['output_path'] for output in outputs}) != len(outputs):
+        raise ValueError(f"出力ファイル名が重複します（{{width}}を含めてください）: {name_template}")
+    return outputs
+
+
+class DerivativeGenerator:
+    """
+    幅の異なる派生画像の生成（縮小ピラミッド）
+
+    各段は1つ前の段（最大の段は元画像）からcv2.INTER_AREAで縮小するため、
+    縮小にかかる画素数の合計は元画像1枚分程度に収まる。縮小先の配列は
+    形状ごとに保持し、同じ寸法の画像が続くバッチでは再確保しない。
+    拡大はしないため、元画像より大きい幅の出力先は受け付けない
+    （derivative_outputsにsource_widthを指定して元画像の幅にまとめる）。
+    """
+
+    def __init__(self, converter: Optional[ImageConverter] = None):
+        """
+        初期化
+
+        Args:
+            converter: エンコードに使う変換エンジン（品質探索・サイズ予測・背景色の設定を共有）
+        """
+        self.converter = converter or ImageConverter()
+        # 縮小先の配列（形状ごと、直前の画像で使ったものだけを残す）
+        self._buffers: Dict[tuple, np.ndarray] = {}
+        # 直近の生成結果（'outputs'に段ごとの結果）と失敗時の理由
+        self.last_result: Optional[dict] = None
+        self.last_error: Optional[str] = None
+
+    def generate(self, input_path: str, outputs: List[dict],
+                 decoded: Optional[DecodedImage] = None) -> bool:
+        """
+        派生画像を生成
+
+        Args:
+            input_path: 入力PNGファイルパス
+            outputs: derivative_outputsで作成した出力先（形式は全段で同じ、幅は元画像の幅以下）
+            decoded: デコード済み画像（指定時は再デコードしない）
+
+        Returns:
+            bool: 全段の生成に成功した場合True
+                （結果はlast_result['outputs']にkeyごとに格納）
+        """
+        self.last_result = None
+        self.last_error = None
+        converter = self.converter
+        timer = StageTimer() if converter.timing else NULL_TIMER
+        try:
+            formats = {output['format'].upper() for output in outputs}
+            if len(formats) != 1:
+                raise ValueError("派生画像の出力形式は1つにしてください")
+            image_format = formats.pop()
+            if image_format not in AVAILABLE_FORMATS:
+                raise ValueError(f"未対応の出力形式です: {image_format}")
+
+            owns_pixels = decoded is None and converter.image_cache is None
+            if decoded is None:
+                decoded = converter.load_image(input_path)
+            img = decoded.decode(timer) if decoded is not None else None
+            if img is None:
+                self.last_error = "画像読み込み失敗"
+                print(f"画像読み込み失敗: {input_path}", file=sys.stderr)
+                return False
+
+            with timer.stage('alpha'):
+                has_alpha = decoded.has_alpha
+            keep_alpha = has_alpha and image_format in ALPHA_FORMATS
+            if has_alpha and not keep_alpha:
+                # 縮小前に背景色へ合成（自前の配列ならその場で上書き）
+                with timer.stage('alpha'):
+                    if owns_pixels:
+                        composite_on_matte(img, converter.matte_color, out=img[:, :, :3])
+                    else:
+                        img = composite_on_matte(img, converter.matte_color)
+            if owns_pixels:
+                decoded = None
+            source_height, source_width = img.shape[:2]
+            oversized = sorted(output['width'] for output in outputs if output['width'] > source_width)
+            if oversized:
+                raise ValueError(f"元画像の幅（{source_width}px）より大きい幅は出力できません: "
+                                 f"{', '.join(map(str, oversized))}")
+
+            def encode(output: dict, pil_img) -> dict:
+                try:
+                    # ファイル名の書式がフォルダを含む場合に備える
+                    os.makedirs(os.path.dirname(output['output_path']) or '.', exist_ok=True)
+                    result = converter.encode_to_file(
+                        pil_img, image_format, output['output_path'], output['max_size_mb'],
+                        output['quality'], buffer_key=output['key'], timer=timer)
+                except Exception as e:
+                    result = {'error': str(e)}
+                result.update(format=image_format, width=output['width'],
+                              output_width=pil_img.width, output_height=pil_img.height,
+                              output_path=output['output_path'])
+                return result
+
+            # 大きい段から順に縮小し、縮小できた段からエンコードを始める
+            # （エンコーダーはGILを解放するため、次の段の縮小と並行して進む）
+            used_buffers = {}
+            futures = {}
+            level = img
+            with ThreadPoolExecutor(max_workers=len(outputs)) as executor:
+                for output in sorted(outputs, key=lambda o: o['width'], reverse=True):
+                    width = output['width']
+                    height = max(1, round(source_height * width / source_width))
+                    if (height, width) != level.shape[:2]:
+                        shape = (height, width) + level.shape[2:]
+                        buffer = self._buffers.get(shape)
+                        if buffer is None:
+                            buffer = np.empty(shape, dtype=np.uint8)
+                        used_buffers[shape] = buffer
+                        with timer.stage('resize', buffer.nbytes):
+                            level = cv2.resize(level, (width, height), dst=buffer,
+                                               interpolation=cv2.INTER_AREA)
+                    with timer.stage('to_pil', level.nbytes):
+                        pil_img = to_pil_image(level, keep_alpha=keep_alpha)
+                    if level is img:
+                        # 元画像の画素はPILへ渡した時点で不要
+                        img = None
+                    futures[output['key']] = executor.submit(encode, output, pil_img)
+                    pil_img = None
+                level = img = None
+                results = {key: future.result() for key, future in futures.items()}
+            self._buffers = used_buffers
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"派生画像生成エラー: {input_path} - {str(e)}", file=sys.stderr)
+            return False
+
+        ordered = {output['key']: results[output['key']] for output in outputs}
+        errors = [f"{key}: {result['error']}" for key, result in ordered.items()
+                  if 'error' in result]
+        self.last_result = {
+            'has_alpha': has_alpha,
+            'striped': False,
+            'source_width': source_width,
+            'source_height': source_height,
+            'outputs': ordered
+        }
+        if timer.enabled:
+            self.last_result['stages'] = timer.as_list()
+        if errors:
+            self.last_error = " / ".join(errors)
+            print(f"派生画像生成エラー: {input_path} - {self.last_error}", file=sys.stderr)
+            return False
+        return True
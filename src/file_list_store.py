@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+ファイル一覧ストア
+大量のファイルの状態を列ごとの配列で保持し、並べ替え・絞り込みを行う
+（customtkinterに依存しない）
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+# 変換状態
+STATUS_PENDING = 0
+STATUS_CONVERTED = 1
+STATUS_SKIPPED = 2
+STATUS_FAILED = 3
+
+STATUS_LABELS = {
+    STATUS_PENDING: "未変換",
+    STATUS_CONVERTED: "変換済み",
+    STATUS_SKIPPED: "スキップ",
+    STATUS_FAILED: "失敗",
+}
+
+# 並べ替えに使える列
+SORT_KEYS = ('index', 'name', 'size', 'pixels', 'status', 'output_bytes')
+
+# 配列の初期容量（以降は2倍ずつ拡張）
+INITIAL_CAPACITY = 1024
+
+
+class FileListStore:
+    """
+    ファイル一覧の列指向ストア
+
+    行ごとのdictを作らず、サイズ・寸法・状態・出力バイト数を列ごとのnumpy配列で持つ
+    （10万件で数MB）。行番号は追加順で、MainWindow.selected_filesのインデックスと一致する。
+    未取得の値（サイズ・出力バイト数）は-1、寸法は0。
+    変更のたびにversionが増えるため、表示側は値が変わった場合のみ再描画すればよい。
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.sizes = np.full(INITIAL_CAPACITY, -1, dtype=np.int64)
+        self.widths = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.heights = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.statuses = np.zeros(INITIAL_CAPACITY, dtype=np.uint8)
+        self.output_bytes = np.full(INITIAL_CAPACITY, -1, dtype=np.int64)
+        # 変更のたびに増える番号（表示の更新判定用）
+        self.version = 0
+        # 名前順の並び（パスが増えるまで再利用）
+        self._name_order: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _reserve(self, count: int):
+        capacity = len(self.sizes)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        for name, fill in (('sizes', -1), ('widths', 0), ('heights', 0),
+                           ('statuses', STATUS_PENDING), ('output_bytes', -1)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, paths: Sequence[str], sizes: Optional[Sequence[int]] = None):
+        """
+        行を追加（重複は呼び出し側で除く）
+
+        Args:
+            paths: ファイルパス
+            sizes: ファイルサイズ（バイト、不明なら-1、None時は全て不明）
+        """
+        if not paths:
+            return
+        start = len(self.paths)
+        end = start + len(paths)
+        self._reserve(end)
+        self.paths.extend(paths)
+        for row, path in enumerate(paths, start):
+            self._rows[path] = row
+        if sizes is not None:
+            self.sizes[start:end] = sizes
+        self._name_order = None
+        self.version += 1
+
+    def clear(self):
+        """全行を削除"""
+        self.paths = []
+        self._rows = {}
+        self.sizes[:] = -1
+        self.widths[:] = 0
+        self.heights[:] = 0
+        self.statuses[:] = STATUS_PENDING
+        self.output_bytes[:] = -1
+        self._name_order = None
+        self.version += 1
+
+    def row(self, path: str) -> Optional[int]:
+        """パスの行番号（なければNone）"""
+        return self._rows.get(path)
+
+    def update(self, path: str, size: Optional[int] = None, width: Optional[int] = None,
+               height: Optional[int] = None, status: Optional[int] = None,
+               output_bytes: Optional[int] = None) -> bool:
+        """
+        1行の値を更新（Noneの列は変更しない）
+
+        Returns:
+            bool: 行が存在した場合True
+        """
+        row = self._rows.get(path)
+        if row is None:
+            return False
+        if size is not None:
+            self.sizes[row] = size
+        if width is not None:
+            self.widths[row] = width
+        if height is not None:
+            self.heights[row] = height
+        if status is not None:
+            self.statuses[row] = status
+        if output_bytes is not None:
+            self.output_bytes[row] = output_bytes
+        self.version += 1
+        return True
+
+    def reset_status(self):
+        """全行を未変換に戻す（変換開始時）"""
+        count = len(self.paths)
+        self.statuses[:count] = STATUS_PENDING
+        self.output_bytes[:count] = -1
+        self.version += 1
+
+    def status_counts(self) -> Dict[int, int]:
+        """状態ごとの件数"""
+        counts = np.bincount(self.statuses[:len(self.paths)], minlength=len(STATUS_LABELS))
+        return {status: int(counts[status]) for status in STATUS_LABELS}
+
+    def view(self, sort_key: str = 'index', descending: bool = False,
+             statuses: Optional[Iterable[int]] = None, min_size: Optional[int] = None,
+             max_size: Optional[int] = None) -> np.ndarray:
+        """
+        並べ替え・絞り込み後の行番号
+
+        Args:
+            sort_key: 並べ替える列（SORT_KEYSのいずれか）
+            descending: 降順にするか
+            statuses: 表示する状態（None時は全て）
+            min_size: 最小ファイルサイズ（バイト、指定時はサイズ不明の行を除く）
+            max_size: 最大ファイルサイズ（バイト、指定時はサイズ不明の行を除く）
+
+        Returns:
+            np.ndarray: 表示順の行番号
+        """
+        count = len(self.paths)
+        if sort_key == 'name':
+            if self._name_order is None or len(self._name_order) != count:
+                self._name_order = np.array(sorted(range(count), key=self.paths.__getitem__),
+                                            dtype=np.int64)
+            order = self._name_order
+            if descending:
+                order = order[::-1]
+        elif sort_key == 'index':
+            order = np.arange(count - 1, -1, -1) if descending else np.arange(count)
+        else:
+            if sort_key == 'pixels':
+                values = self.widths[:count].astype(np.int64) * self.heights[:count]
+            elif sort_key in ('size', 'status', 'output_bytes'):
+                column = {'size': self.sizes, 'status': self.statuses,
+                          'output_bytes': self.output_bytes}[sort_key]
+                values = column[:count].astype(np.int64)
+            else:
+                raise ValueError(f"並べ替えできない列です: {sort_key}")
+            # 同じ値の行は追加順を保つ
+            order = np.argsort(-values if descending else values, kind='stable')
+
+        mask = None
+        if statuses is not None:
+            mask = np.isin(self.statuses[:count], np.fromiter(statuses, dtype=np.uint8))
+        if min_size is not None or max_size is not None:
+            sizes = self.sizes[:count]
+            size_mask = sizes >= max(0, min_size or 0)
+            if max_size is not None:
+                size_mask &= sizes <= max_size
+            mask = size_mask if mask is None else mask & size_mask
+        if mask is not None:
+            order = order[mask[order]]
+        return order
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+ファイル一覧ビュー
+CustomTkinter版 表示中の行だけを描画する仮想化リスト（10万件でも一定の描画コスト）
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import tkinter as tk
+import customtkinter as ctk
+
+from file_list_store import (FileListStore, STATUS_CONVERTED, STATUS_FAILED, STATUS_LABELS,
+                             STATUS_PENDING, STATUS_SKIPPED)
+
+
+def format_bytes(size: int) -> str:
+    """バイト数の表示（不明なら-）"""
+    if size < 0:
+        return "-"
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024:.0f} KB"
+
+
+class VirtualFileList(ctk.CTkFrame):
+    """
+    仮想化ファイル一覧
+
+    行ごとのウィジェットを作らず、Canvas上に表示中の行数分の図形だけを用意して
+    スクロールのたびに文字列を差し替える。並べ替え・絞り込みはFileListStore.view()で
+    行番号の配列として求め、変換中のように値が頻繁に変わる場合は並び順の再計算を
+    RESORT_INTERVAL秒に1回に抑える（表示中の行の値は毎回更新）。
+    """
+
+    ROW_HEIGHT = 20
+    HEADER_HEIGHT = 22
+    # 並び順を再計算する最短間隔（秒）
+    RESORT_INTERVAL = 0.25
+
+    # (見出し, 幅, 並べ替える列)
+    COLUMNS = (
+        ("ファイル名", 240, 'name'),
+        ("サイズ", 80, 'size'),
+        ("寸法", 100, 'pixels'),
+        ("状態", 70, 'status'),
+        ("出力", 80, 'output_bytes'),
+    )
+
+    # 状態の絞り込み（表示名 -> 状態、Noneは全て）
+    STATUS_FILTERS = {
+        "すべて": None,
+        "未変換": (STATUS_PENDING,),
+        "変換済み": (STATUS_CONVERTED,),
+        "スキップ": (STATUS_SKIPPED,),
+        "失敗": (STATUS_FAILED,),
+    }
+
+    STATUS_COLORS = {
+        STATUS_PENDING: "#e5e5e5",
+        STATUS_CONVERTED: "#10b981",
+        STATUS_SKIPPED: "#f59e0b",
+        STATUS_FAILED: "#ef4444",
+    }
+
+    BG_COLOR = "#2a2a2a"
+    ALT_BG_COLOR = "#303030"
+    SELECTED_COLOR = "#2563eb"
+    TEXT_COLOR = "#e5e5e5"
+
+    def __init__(self, master, store: FileListStore,
+                 on_select: Optional[Callable[[int], None]] = None, height: int = 180):
+        """
+        初期化
+
+        Args:
+            store: 表示するファイル一覧
+            on_select: on_select(行番号) 行をクリックした時に呼ばれる
+            height: 一覧部分の高さ（px）
+        """
+        super().__init__(master, fg_color="transparent")
+        self.store = store
+        self.on_select = on_select
+        self.sort_key = 'index'
+        self.descending = False
+        self.status_filter = None
+        self.min_size: Optional[int] = None
+        # 表示順の行番号と、それを求めた時点のストアの状態
+        self._rows = np.arange(0)
+        self._view_version = -1
+        self._view_count = 0
+        self._view_time = 0.0
+        self._view_dirty = True
+        self._drawn_version = -1
+        self._top = 0
+        self._selected_row: Optional[int] = None
+        # 表示行ごとの図形（背景, 各列の文字）
+        self._slots: List[tuple] = []
+
+        self._build(height)
+
+    def _build(self, height: int):
+        font = ctk.CTkFont(family="Segoe UI", size=10)
+        self._font = ("Segoe UI", 9)
+
+        toolbar = ctk.CTkFrame(self, fg_color="transparent")
+        toolbar.pack(fill="x", pady=(0, 4))
+        ctk.CTkLabel(toolbar, text="状態:", font=font).pack(side="left")
+        self.status_menu = ctk.CTkOptionMenu(toolbar, values=list(self.STATUS_FILTERS),
+                                             width=100, height=24, font=font,
+                                             command=self._on_status_filter)
+        self.status_menu.set("すべて")
+        self.status_menu.pack(side="left", padx=(4, 10))
+        ctk.CTkLabel(toolbar, text="最小サイズ(MB):", font=font).pack(side="left")
+        self.min_size_entry = ctk.CTkEntry(toolbar, width=60, height=24, font=font)
+        self.min_size_entry.pack(side="left", padx=4)
+        self.min_size_entry.bind("<Return>", self._on_size_filter)
+        self.min_size_entry.bind("<FocusOut>", self._on_size_filter)
+        self.count_label = ctk.CTkLabel(toolbar, text="", font=font)
+        self.count_label.pack(side="right")
+
+        self.header = tk.Canvas(self, height=self.HEADER_HEIGHT, bg="#3a3a3a",
+                                highlightthickness=0)
+        self.header.pack(fill="x")
+        self.header.bind("<Button-1>", self._on_header_click)
+
+        body = ctk.CTkFrame(self, fg_color="transparent")
+        body.pack(fill="both", expand=True)
+        self.canvas = tk.Canvas(body, height=height, bg=self.BG_COLOR, highlightthickness=0)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(body, command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        # 外側のスクロール領域に伝えない
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._scroll_rows(-3))
+        self.canvas.bind("<Button-5>", lambda e: self._scroll_rows(3))
+        self._draw_header()
+
+    # --- 表示 ---
+
+    def _draw_header(self):
+        self.header.delete("all")
+        x = 6
+        for title, width, key in self.COLUMNS:
+            if key == self.sort_key:
+                title += " ▼" if self.descending else " ▲"
+            self.header.create_text(x, self.HEADER_HEIGHT // 2, text=title, anchor="w",
+                                    fill=self.TEXT_COLOR, font=self._font)
+            x += width
+
+    def _visible_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT + 1)
+
+    def _ensure_slots(self, count: int):
+        """表示行数分の図形を用意（増えた分だけ作成し、以降は再利用）"""
+        while len(self._slots) < count:
+            y = len(self._slots) * self.ROW_HEIGHT
+            background = self.canvas.create_rectangle(0, y, 4000, y + self.ROW_HEIGHT,
+                                                      width=0, fill=self.BG_COLOR)
+            texts = []
+            x = 6
+            for _, width, _ in self.COLUMNS:
+                texts.append(self.canvas.create_text(x, y + self.ROW_HEIGHT // 2, anchor="w",
+                                                     fill=self.TEXT_COLOR, font=self._font))
+                x += width
+            self._slots.append((background, texts))
+
+    def refresh(self, force: bool = False):
+        """
+        ストアの変更を反映（メインループから定期的に呼ぶ）
+
+        Args:
+            force: 間隔に関係なく並び順を再計算するか
+        """
+        store = self.store
+        if (store.version == self._drawn_version == self._view_version
+                and not self._view_dirty and not force):
+            return
+        now = time.monotonic()
+        shrunk = len(store) < self._view_count
+        if (force or shrunk or self._view_dirty
+                or (store.version != self._view_version
+                    and now - self._view_time >= self.RESORT_INTERVAL)):
+            self._rows = store.view(self.sort_key, self.descending, self.status_filter,
+                                    self.min_size)
+            self._view_version = store.version
+            self._view_count = len(store)
+            self._view_time = now
+            self._view_dirty = False
+            self.count_label.configure(text=f"{len(self._rows)} / {len(store)}件")
+        self.redraw()
+        self._drawn_version = store.version
+
+    def redraw(self):
+        """表示中の行のみ描画"""
+        store = self.store
+        visible = self._visible_rows()
+        total = len(self._rows)
+        self._top = max(0, min(self._top, total - visible + 1))
+        self._ensure_slots(visible)
+        item_config = self.canvas.itemconfigure
+        for slot_index, (background, texts) in enumerate(self._slots):
+            position = self._top + slot_index
+            if slot_index >= visible or position >= total:
+                item_config(background, fill=self.BG_COLOR)
+                for text in texts:
+                    item_config(text, text="")
+                continue
+            row = int(self._rows[position])
+            if row >= len(store):
+                continue
+            status = int(store.statuses[row])
+            width, height = int(store.widths[row]), int(store.heights[row])
+            values = (
+                os.path.basename(store.paths[row]),
+                format_bytes(int(store.sizes[row])),
+                f"{width} × {height}" if width else "-",
+                STATUS_LABELS.get(status, ""),
+                format_bytes(int(store.output_bytes[row])),
+            )
+            if row == self._selected_row:
+                fill = self.SELECTED_COLOR
+            else:
+                fill = self.ALT_BG_COLOR if position % 2 else self.BG_COLOR
+            item_config(background, fill=fill)
+            for column, (text, value) in enumerate(zip(texts, values)):
+                max_chars = self.COLUMNS[column][1] // 7
+                if len(value) > max_chars:
+                    value = value[:max_chars - 1] + "…"
+                color = self.STATUS_COLORS.get(status) if column == 3 else self.TEXT_COLOR
+                item_config(text, text=value, fill=color)
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def select_row(self, row: Optional[int]):
+        """行を選択表示（表示範囲外ならスクロール）"""
+        self._selected_row = row
+        if row is not None:
+            positions = np.flatnonzero(self._rows == row)
+            if positions.size:
+                position = int(positions[0])
+                visible = self._visible_rows() - 1
+                if position < self._top or position >= self._top + visible:
+                    self._top = max(0, position - visible // 2)
+        self.redraw()
+
+    # --- 操作 ---
+
+    def _scroll_rows(self, delta: int):
+        self._top += delta
+        self.redraw()
+        return "break"
+
+    def _on_wheel(self, event):
+        return self._scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_scroll(self, *args):
+        total = len(self._rows)
+        if args[0] == "moveto":
+            self._top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self._visible_rows() - 1
+            self._top += step
+        self.redraw()
+
+    def _on_click(self, event):
+        position = self._top + event.y // self.ROW_HEIGHT
+        if 0 <= position < len(self._rows):
+            row = int(self._rows[position])
+            self.select_row(row)
+            if self.on_select:
+                self.on_select(row)
+
+    def _on_header_click(self, event):
+        x = 6
+        for _, width, key in self.COLUMNS:
+            if event.x < x + width:
+                break
+            x += width
+        # 同じ列は昇順・降順を切り替え、3回目で追加順に戻す
+        if key != self.sort_key:
+            self.sort_key, self.descending = key, False
+        elif not self.descending:
+            self.descending = True
+        else:
+            self.sort_key, self.descending = 'index', False
+        self._draw_header()
+        self._view_dirty = True
+        self.refresh()
+
+    def _on_status_filter(self, value: str):
+        self.status_filter = self.STATUS_FILTERS.get(value)
+        self._top = 0
+        self._view_dirty = True
+        self.refresh()
+
+    def _on_size_filter(self, event=None):
+        text = self.min_size_entry.get().strip()
+        try:
+            min_size = int(float(text) * 1024 * 1024) if text else None
+        except ValueError:
+            return
+        if min_size != self.min_size:
+            self.min_size = min_size
+            self._top = 0
+            self._view_dirty = True
+            self.refresh()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+ファイルスキャナー
+フォルダを再帰的に走査し、見つかったPNGを少しずつ通知する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import fnmatch
+import os
+import sys
+import re
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_INCLUDE = ("*.png",)
+
+
+def _compile_patterns(patterns: Sequence[str]) -> Optional["re.Pattern"]:
+    """globパターン群を大文字小文字を区別しない1つの正規表現にまとめる"""
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns), re.IGNORECASE)
+
+
+class OrderedFileIndex:
+    """追加順を保持し、重複判定をO(1)で行うファイル一覧"""
+
+    def __init__(self, files: Iterable[str] = ()):
+        self._items: List[str] = []
+        self._seen = set()
+        self.extend(files)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._seen
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def add(self, path: str) -> bool:
+        """追加（既に存在する場合はFalse）"""
+        if path in self._seen:
+            return False
+        self._seen.add(path)
+        self._items.append(path)
+        return True
+
+    def extend(self, paths: Iterable[str]) -> List[str]:
+        """
+        まとめて追加
+
+        Returns:
+            List[str]: 新たに追加されたパス（重複を除く）
+        """
+        added = []
+        for path in paths:
+            if path not in self._seen:
+                self._seen.add(path)
+                self._items.append(path)
+                added.append(path)
+        return added
+
+    def index(self, path: str) -> int:
+        return self._items.index(path)
+
+    def clear(self):
+        self._items.clear()
+        self._seen.clear()
+
+
+class DirectoryScanner:
+    """os.scandirによるフォルダ走査（バックグラウンドスレッドで見つかった順に通知）"""
+
+    def __init__(self, root: str, include: Sequence[str] = DEFAULT_INCLUDE,
+                 exclude: Sequence[str] = (), recursive: bool = True, chunk_size: int = 500):
+        """
+        初期化
+
+        Args:
+            root: 走査するフォルダ
+            include: 対象とするファイル名のパターン（大文字小文字を区別しない）
+            exclude: 除外するファイル名・フォルダ名・相対パスのパターン
+            recursive: サブフォルダも走査するか
+            chunk_size: 1回の通知にまとめる件数
+        """
+        self.root = root
+        self.recursive = recursive
+        self.chunk_size = max(1, chunk_size)
+        self._include = _compile_patterns(include)
+        self._exclude = _compile_patterns(exclude)
+        self._cancel_event = threading.Event()
+        self.found = 0
+
+    def cancel(self):
+        """走査を中止"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def _excluded(self, name: str, path: str) -> bool:
+        if self._exclude is None:
+            return False
+        rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        return bool(self._exclude.match(name) or self._exclude.match(rel_path))
+
+    def scan(self) -> Iterator[str]:
+        """
+        一致するファイルを見つかった順に返す（呼び出し元スレッドで走査）
+
+        Returns:
+            Iterator[str]: ファイルパス
+        """
+        for path, _ in self.scan_entries(with_size=False):
+            yield path
+
+    def scan_entries(self, with_size: bool = True) -> Iterator[Tuple[str, int]]:
+        """
+        一致するファイルとサイズを見つかった順に返す（呼び出し元スレッドで走査）
+
+        Args:
+            with_size: ファイルサイズを取得するか（Windowsは走査時に取得済みのため追加コストなし）
+
+        Returns:
+            Iterator[Tuple[str, int]]: (ファイルパス, バイト数（取得しない・失敗時は-1）)
+        """
+        stack = [self.root]
+        while stack and not self.cancelled:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    sub_dirs = []
+                    files = []
+                    for entry in entries:
+                        if self.cancelled:
+                            return
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive and not self._excluded(entry.name, entry.path):
+                                    sub_dirs.append(entry.path)
+                            elif entry.is_file():
+                                if self._include is not None and not self._include.match(entry.name):
+                                    continue
+                                if self._excluded(entry.name, entry.path):
+                                    continue
+                                size = -1
+                                if with_size:
+                                    try:
+                                        size = entry.stat().st_size
+                                    except OSError:
+                                        pass
+                                files.append((entry.path, size))
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"フォルダ走査エラー: {directory} - {str(e)}", file=sys.stderr)
+                continue
+                
+            # フォルダ内は名前順に返す
+            for path, size in sorted(files):
+                if self.cancelled:
+                    return
+                self.found += 1
+                yield path, size
+            # サブフォルダも名前順に辿るため逆順に積む
+            stack.extend(sorted(sub_dirs, reverse=True))
+
+    def start(self, on_chunk: Callable[[List], None],
+              on_done: Optional[Callable[[int], None]] = None,
+              with_size: bool = False) -> threading.Thread:
+        """
+        バックグラウンドで走査開始
+
+        Args:
+            on_chunk: on_chunk(パスのリスト) chunk_size件ごとに走査スレッドから呼ばれる
+                （with_size時は (パス, バイト数) のリスト）
+            on_done: on_done(見つかった件数) 走査終了時に走査スレッドから呼ばれる
+            with_size: ファイルサイズも通知するか
+
+        Returns:
+            threading.Thread: 走査スレッド
+        """
+        def scan_worker():
+            chunk = []
+            try:
+                for path, size in self.scan_entries(with_size):
+                    chunk.append((path, size) if with_size else path)
+                    if len(chunk) >= self.chunk_size:
+                        on_chunk(chunk)
+                        chunk = []
+                if chunk:
+                    on_chunk(chunk)
+            finally:
+                if on_done:
+                    on_done(self.found)
+
+        thread = threading.Thread(target=scan_worker, daemon=True)
+        thread.start()
+        return thread
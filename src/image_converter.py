@@ -8,24 +8,121 @@ Date: 2025-12-30
 Version: 1.0.0
 """
 
-import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, features
 import os
+import sys
 from pathlib import Path
-from typing import Tuple, Optional
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, Set, Tuple
+import io
+import math
+import uuid
+
+from decoded_image import DecodedImage, DecodedImageCache, composite_on_matte, to_pil_image
+from image_probe import probe_image
+from png_strip_reader import PngStripReader, read_png_striped
+from jpeg_strip_writer import JpegStripStats, JpegStripWriter, STRIP_ROW_MULTIPLE
+from instrumentation import NULL_TIMER, StageTimer
+from quality_predictor import QualityPredictor, SizePredictor, bisection_encodes
+from thumbnail_cache import ThumbnailCache
+
+
+# サイズ調整時の最低品質
+MIN_QUALITY = 10
+
+# JPEG変換時に透過部分を合成する背景色（RGB）
+DEFAULT_MATTE = (255, 255, 255)
+
+# WebP変換時のアルファチャンネルの品質
+DEFAULT_ALPHA_QUALITY = 100
+
+# アルファチャンネルを保持できる出力形式
+ALPHA_FORMATS = ('WEBP', 'AVIF')
+
+# 出力できる形式（AVIFはPillowが対応している場合のみ）
+AVAILABLE_FORMATS = ('JPEG', 'WEBP') + (('AVIF',) if features.check('avif') else ())
+
+# 出力形式ごとの拡張子
+OUTPUT_EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'AVIF': '.avif'}
+
+# この画素数以上のPNGはストリップ単位で読み込む（全画素のnumpy配列を作らない、
+# JPEGのみへの変換では全画素の画像も作らずにストリップ単位でエンコードする）
+LARGE_IMAGE_PIXELS = 64 * 1000 * 1000
+
+# ストリップ単位のJPEG変換で、品質ごとの出力サイズの予測に使う見本のストリップ数・品質の数
+STREAM_SAMPLE_STRIPS = 32
+STREAM_SAMPLE_QUALITIES = 8
+
+# ストリップ単位のJPEG変換で、1回の展開で出力サイズを求める品質の数
+STREAM_QUALITIES_PER_PASS = 4
+
+# ストリップ単位のJPEG変換で、0xFFの後に挿入する0x00を除いたサイズが最大サイズのこの割合を
+# 超える品質は、書き込む前に正確なバイト数を数えて確かめる
+STREAM_SIZE_MARGIN = 0.98
+
+# 縮小して収める場合に試す倍率の数の上限・縮小後の最小辺（px）
+MAX_SCALE_STEPS = 6
+MIN_SCALED_SIDE = 16
+
+# 縮小倍率の見積もりに掛ける余裕（少し小さめにして1回で収まるようにする）
+SCALE_MARGIN = 0.95
+
+# 縮小倍率の探索を終える区間の幅（収まらない倍率 / 収まる倍率 - 1）
+SCALE_TOLERANCE = 0.03
+
+# 予測を使う品質探索で、予測から次の品質を決める回数（以降は二分探索）
+GUIDED_PROBES = 2
 
 
 class ImageConverter:
     """高品質画像変換クラス"""
     
-    def __init__(self):
-        """初期化"""
-        self.temp_dir = tempfile.mkdtemp()
+    def __init__(self, image_cache: Optional[DecodedImageCache] = None, timing: bool = False,
+                 matte_color: Tuple[int, int, int] = DEFAULT_MATTE,
+                 alpha_quality: int = DEFAULT_ALPHA_QUALITY,
+                 large_image_pixels: int = LARGE_IMAGE_PIXELS,
+                 predict_quality: bool = True, fit_to_size: bool = False,
+                 min_quality: int = MIN_QUALITY,
+                 thumbnail_cache: Optional[ThumbnailCache] = None):
+        """
+        初期化
+        
+        Args:
+            image_cache: デコード済み画像キャッシュ（指定時はプレビュー・情報取得・変換で共有）
+            timing: 処理段階ごとの所要時間をlast_result['stages']に記録するか
+            matte_color: JPEG変換時に透過部分を合成する背景色（RGB）
+            alpha_quality: WebP変換時のアルファチャンネルの品質（1-100）
+            large_image_pixels: この画素数以上のPNGをストリップ単位で読み込む（0で無効）
+                （JPEGのみへの変換ではストリップ単位でエンコードまで行う）
+            predict_quality: 画像の特徴からエンコード後のサイズを予測し、品質探索の開始点にするか
+            fit_to_size: 最低品質でも収まらない場合に解像度を下げて収めるか
+                （収まらない場合は書き込まずに失敗とする）
+            min_quality: サイズ調整時の最低品質
+            thumbnail_cache: プレビュー画像のディスクキャッシュ（指定時は起動し直しても再デコードしない）
+        """
+        self.image_cache = image_cache
+        self.thumbnail_cache = thumbnail_cache
+        self.timing = timing
+        self.matte_color = tuple(matte_color)
+        self.alpha_quality = alpha_quality
+        self.large_image_pixels = large_image_pixels
+        # サイズ予測モデル（変換結果から学習するため変換エンジンと同じ寿命で保持）
+        self.predictor = QualityPredictor()
+        self.predict_quality = predict_quality
+        self.fit_to_size = fit_to_size
+        self.min_quality = min_quality
+        # エンコード用の再利用バッファ（試行用・採用候補用）
+        self._trial_buffer = io.BytesIO()
+        self._best_buffer = io.BytesIO()
+        self._format_buffers = {}
+        # 直近の変換結果（最終品質・エンコード回数など）と失敗時の理由
+        self.last_result: Optional[dict] = None
+        self.last_error: Optional[str] = None
         
     def convert_to_jpeg(self, input_path: str, output_path: str, 
-                       max_size_mb: int, quality: int) -> bool:
+                       max_size_mb: int, quality: int,
+                       decoded: Optional[DecodedImage] = None) -> bool:
         """
         PNGをJPEGに変換
         
@@ -34,55 +131,21 @@ class ImageConverter:
             output_path: 出力JPEGファイルパス
             max_size_mb: 最大ファイルサイズ（MB）
             quality: JPEG品質（1-100）
+            decoded: デコード済み画像（指定時は再デコードしない）
             
         Returns:
-            bool: 成功時True、失敗時False
+            bool: 成功時True、失敗時False（結果の詳細はlast_resultに格納）
         """
         try:
-            # OpenCVで画像を読み込み
-            # 日本語パス対応
-            img_array = np.fromfile(input_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is None:
-                print(f"画像読み込み失敗: {input_path}")
-                return False
-            
-            # カラー画像の場合、BGRからRGBに変換
-            if len(img.shape) == 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img_rgb = img
-                
-            # PILで最高品質JPEG変換
-            pil_img = Image.fromarray(img_rgb)
-            
-            # 初期品質設定
-            current_quality = quality
-            temp_output = self._get_temp_path(output_path)
-            
-            # ファイルサイズ制限を満たすまで品質を調整
-            while current_quality > 10:  # 最低品質10
-                # 一時ファイルに保存
-                pil_img.save(temp_output, 'JPEG', quality=current_quality, optimize=True)
-                
-                # ファイルサイズチェック
-                if os.path.getsize(temp_output) <= max_size_mb * 1024 * 1024:
-                    break
-                    
-                # 品質を10%ずつ下げる
-                current_quality = max(10, int(current_quality * 0.9))
-            
-            # 最終ファイルをコピー
-            os.replace(temp_output, output_path)
-            
-            return True
-            
+            return self._convert(input_path, output_path, max_size_mb, quality, 'JPEG', decoded)
         except Exception as e:
-            print(f"変換エラー: {input_path} - {str(e)}")
+            self.last_error = str(e)
+            print(f"変換エラー: {input_path} - {str(e)}", file=sys.stderr)
             return False
             
     def convert_to_webp(self, input_path: str, output_path: str, 
-                       max_size_mb: int, quality: int) -> bool:
+                       max_size_mb: int, quality: int,
+                       decoded: Optional[DecodedImage] = None) -> bool:
         """
         PNGをWebPに変換
         
@@ -91,136 +154,859 @@ class ImageConverter:
             output_path: 出力WebPファイルパス
             max_size_mb: 最大ファイルサイズ（MB）
             quality: WebP品質（1-100）
+            decoded: デコード済み画像（指定時は再デコードしない）
             
         Returns:
-            bool: 成功時True、失敗時False
+            bool: 成功時True、失敗時False（結果の詳細はlast_resultに格納）
         """
         try:
-            # OpenCVで画像を読み込み
-            # 日本語パス対応
-            img_array = np.fromfile(input_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is None:
-                print(f"画像読み込み失敗: {input_path}")
+            return self._convert(input_path, output_path, max_size_mb, quality, 'WEBP', decoded)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"WebP変換エラー: {input_path} - {str(e)}", file=sys.stderr)
+            return False
+            
+    def convert(self, input_path: str, output_path: str, max_size_mb: int, quality: int,
+                image_format: str = 'JPEG', decoded: Optional[DecodedImage] = None) -> bool:
+        """
+        PNGを指定した形式（AVAILABLE_FORMATS）に変換
+        
+        Args:
+            input_path: 入力PNGファイルパス
+            output_path: 出力ファイルパス
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（1-100）
+            image_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+            decoded: デコード済み画像（指定時は再デコードしない）
+            
+        Returns:
+            bool: 成功時True、失敗時False（結果の詳細はlast_resultに格納）
+        """
+        image_format = image_format.upper()
+        try:
+            if image_format not in AVAILABLE_FORMATS:
+                raise ValueError(f"未対応の出力形式です: {image_format}")
+            return self._convert(input_path, output_path, max_size_mb, quality, image_format, decoded)
+        except Exception as e:
+            self.last_result = None
+            self.last_error = str(e)
+            print(f"変換エラー: {input_path} - {str(e)}", file=sys.stderr)
+            return False
+            
+    def convert_multi(self, input_path: str, targets: List[dict],
+                      decoded: Optional[DecodedImage] = None) -> bool:
+        """
+        1回のデコードから複数の形式に変換（形式ごとのエンコードは並列実行）
+        
+        Args:
+            input_path: 入力PNGファイルパス
+            targets: 出力先のリスト（{'format', 'output_path', 'max_size_mb', 'quality'}、形式は重複不可）
+            decoded: デコード済み画像（指定時は再デコードしない）
+            
+        Returns:
+            bool: 全形式の変換に成功した場合True
+                （結果はlast_result['outputs']に形式ごとに格納）
+        """
+        self.last_result = None
+        self.last_error = None
+        try:
+            formats = [target['format'].upper() for target in targets]
+            if len(set(formats)) != len(formats):
+                raise ValueError("出力形式が重複しています")
+            unsupported = [fmt for fmt in formats if fmt not in AVAILABLE_FORMATS]
+            if unsupported:
+                raise ValueError(f"未対応の出力形式です: {', '.join(unsupported)}")
+            timer = StageTimer() if self.timing else NULL_TIMER
+            if formats == ['JPEG']:
+                target = targets[0]
+                result = self._convert_streamed(input_path, target['output_path'],
+                                                target['max_size_mb'], target['quality'],
+                                                decoded, timer)
+                if result is not None:
+                    has_alpha = result.pop('has_alpha')
+                    result.pop('striped')
+                    result['output_path'] = target['output_path']
+                    self.last_result = {'has_alpha': has_alpha, 'striped': True,
+                                        'outputs': {'JPEG': result}}
+                    if timer.enabled:
+                        self.last_result['stages'] = timer.as_list()
+                    return True
+            loaded = self._load_for_encode(input_path, decoded, set(formats), timer)
+            if loaded is None:
                 return False
+            images, has_alpha, striped = loaded
             
-            # カラー画像の場合、BGRからRGBに変換
-            if len(img.shape) == 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img_rgb = img
+            def run(target: dict) -> dict:
+                image_format = target['format'].upper()
+                try:
+                    result = self._encode_target(
+                        images[image_format], image_format, target['output_path'],
+                        target['max_size_mb'], target['quality'],
+                        self._target_buffers(image_format), timer)
+                except Exception as e:
+                    result = {'error': str(e)}
+                result['output_path'] = target['output_path']
+                return result
                 
-            # PILでWebP変換
-            pil_img = Image.fromarray(img_rgb)
+            if len(targets) == 1:
+                results = [run(targets[0])]
+            else:
+                # エンコーダーはGILを解放するため、形式ごとのスレッドで同時に実行
+                with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                    results = list(executor.map(run, targets))
+            images = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"変換エラー: {input_path} - {str(e)}", file=sys.stderr)
+            return False
+        
+        errors = [f"{fmt}: {result['error']}" for fmt, result in zip(formats, results)
+                  if 'error' in result]
+        self.last_result = {
+            'has_alpha': has_alpha,
+            'striped': striped,
+            'outputs': dict(zip(formats, results))
+        }
+        if timer.enabled:
+            self.last_result['stages'] = timer.as_list()
+        if errors:
+            self.last_error = " / ".join(errors)
+            print(f"変換エラー: {input_path} - {self.last_error}", file=sys.stderr)
+            return False
+        return True
+        
+    def _convert(self, input_path: str, output_path: str,
+                 max_size_mb: int, quality: int, image_format: str,
+                 decoded: Optional[DecodedImage] = None) -> bool:
+        """出力形式共通の変換処理"""
+        self.last_result = None
+        self.last_error = None
+        # 無効時は何もしないタイマー（呼び出しコストのみ）
+        timer = StageTimer() if self.timing else NULL_TIMER
+        
+        if image_format == 'JPEG':
+            # 巨大なPNGは全画素の画像を作らずにストリップ単位でエンコード
+            result = self._convert_streamed(input_path, output_path, max_size_mb, quality,
+                                            decoded, timer)
+            if result is not None:
+                if timer.enabled:
+                    result['stages'] = timer.as_list()
+                self.last_result = result
+                return True
+        
+        loaded = self._load_for_encode(input_path, decoded, {image_format}, timer)
+        if loaded is None:
+            return False
+        images, has_alpha, striped = loaded
+        pil_img = images.pop(image_format)
+        
+        result = self._encode_target(pil_img, image_format, output_path, max_size_mb, quality,
+                                     (self._trial_buffer, self._best_buffer), timer)
+        result['has_alpha'] = has_alpha
+        result['striped'] = striped
+        self.last_result = result
+        if 'error' in result:
+            self.last_error = result.pop('error')
+            print(f"サイズ制限超過: {input_path} - {self.last_error}", file=sys.stderr)
+            return False
+        if timer.enabled:
+            self.last_result['stages'] = timer.as_list()
+        return True
+        
+    def _load_for_encode(self, input_path: str, decoded: Optional[DecodedImage],
+                         formats: Set[str], timer=NULL_TIMER) -> Optional[Tuple[dict, bool, bool]]:
+        """
+        画像を読み込み、出力形式ごとにエンコードするPillow画像を用意
+        
+        透過画素がある場合、アルファを持てない形式（JPEG）には背景色に合成した画像、
+        それ以外の形式にはアルファ付きの画像を渡す（透過がなければ全形式で同じ画像を共有）。
+        
+        Returns:
+            Tuple[dict, bool, bool]: ({形式: 画像}, 透過画素を含むか, ストリップ読み込みか)
+                （None if 読み込み失敗）
+        """
+        need_alpha = any(fmt in ALPHA_FORMATS for fmt in formats)
+        need_matte = any(fmt not in ALPHA_FORMATS for fmt in formats)
+        
+        # 画像を読み込み（デコード済みならそのまま使う）
+        # キャッシュも呼び出し元も画素を参照しない場合は、PILへ渡した後に解放する
+        owns_pixels = decoded is None and self.image_cache is None
+        if decoded is None:
+            decoded = self.load_image(input_path)
+        if decoded is None:
+            self.last_error = "画像読み込み失敗"
+            print(f"画像読み込み失敗: {input_path}", file=sys.stderr)
+            return None
+        
+        striped = None
+        if self._use_striped_read(decoded):
+            # 巨大なPNGは行単位で展開してPILの画像へ直接書き込む
+            striped = read_png_striped(input_path, keep_alpha=need_alpha,
+                                       matte=self.matte_color, timer=timer)
+        if striped is not None:
+            alpha_img, has_alpha = striped
+            decoded.release_data()
+            decoded = None
+            matte_img = alpha_img
+            if need_matte and alpha_img.mode == 'RGBA':
+                # アルファ付きで読み込んだ場合、JPEG用には背景色に合成した画像を別に作る
+                with timer.stage('alpha'):
+                    if has_alpha:
+                        matte_img = Image.fromarray(
+                            composite_on_matte(np.asarray(alpha_img), self.matte_color[::-1]), 'RGB')
+                    else:
+                        matte_img = alpha_img.convert('RGB')
+        else:
+            img = decoded.decode(timer)
+            if img is None:
+                self.last_error = "画像読み込み失敗"
+                print(f"画像読み込み失敗: {input_path}", file=sys.stderr)
+                return None
+            
+            # 透過画素がある場合のみアルファを扱う（全画素不透明なら通常の経路）
+            with timer.stage('alpha'):
+                has_alpha = decoded.has_alpha
+            alpha_img = matte_img = None
+            if has_alpha and need_alpha:
+                with timer.stage('to_pil', img.nbytes):
+                    alpha_img = to_pil_image(img, keep_alpha=True)
+            if alpha_img is None or need_matte:
+                if has_alpha:
+                    # JPEGは透過できないため背景色に合成（自前の配列ならその場で上書き）
+                    with timer.stage('alpha'):
+                        if owns_pixels:
+                            composite_on_matte(img, self.matte_color, out=img[:, :, :3])
+                        else:
+                            img = composite_on_matte(img, self.matte_color)
+                # BGR(A)のままPILへ渡す（RGB配列のコピーを作らない）
+                with timer.stage('to_pil', img.nbytes):
+                    matte_img = to_pil_image(img, keep_alpha=False)
+            if alpha_img is None:
+                alpha_img = matte_img
+            if owns_pixels:
+                # エンコード中のピークメモリを下げるため元の配列を手放す
+                img = decoded = None
+        
+        images = {fmt: alpha_img if fmt in ALPHA_FORMATS else matte_img for fmt in formats}
+        return images, has_alpha, striped is not None
+        
+    def encode_to_file(self, pil_img: Image.Image, image_format: str, output_path: str,
+                       max_size_mb: float, quality: int, buffer_key: Optional[str] = None,
+                       timer=NULL_TIMER) -> dict:
+        """
+        デコード済みの画像をサイズ制限内の最高品質でエンコードして書き込み
+        
+        Args:
+            pil_img: エンコードする画像
+            image_format: 出力形式（"JPEG" / "WEBP" / "AVIF"）
+            output_path: 出力ファイルパス
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（探索の上限）
+            buffer_key: 複数スレッドから同時に呼ぶ場合のエンコードバッファの区別
+                （Noneなら単一変換と同じバッファを使う）
+            timer: 所要時間を記録するStageTimer
+            
+        Returns:
+            dict: 変換結果（最終品質・縮小倍率・エンコード回数など、書き込めなかった場合は'error'を含む）
+        """
+        image_format = image_format.upper()
+        if image_format not in AVAILABLE_FORMATS:
+            raise ValueError(f"未対応の出力形式です: {image_format}")
+        if buffer_key is None:
+            buffers = (self._trial_buffer, self._best_buffer)
+        else:
+            buffers = self._target_buffers(buffer_key)
+        return self._encode_target(pil_img, image_format, output_path, max_size_mb, quality,
+                                   buffers, timer)
+        
+    def _target_buffers(self, key: str) -> Tuple[io.BytesIO, io.BytesIO]:
+        """同時にエンコードする出力ごとのエンコードバッファ（形式などのキーごとに再利用）"""
+        buffers = self._format_buffers.get(key)
+        if buffers is None:
+            buffers = (io.BytesIO(), io.BytesIO())
+            self._format_buffers[key] = buffers
+        return buffers
+        
+    def _encode_target(self, pil_img: Image.Image, image_format: str, output_path: str,
+                       max_size_mb: float, quality: int,
+                       buffers: Tuple[io.BytesIO, io.BytesIO], timer=NULL_TIMER) -> dict:
+        """
+        サイズ制限内で最高品質にエンコードして書き込み
+        
+        Args:
+            pil_img: エンコードする画像
+            image_format: 出力形式
+            output_path: 出力ファイルパス
+            max_size_mb: 最大ファイルサイズ（MB）
+            quality: 品質（探索の上限）
+            buffers: (試行用, 採用候補用) のエンコードバッファ
+            timer: 所要時間を記録するStageTimer
             
-            # 初期品質設定
-            current_quality = quality
-            temp_output = self._get_temp_path(output_path)
+        Returns:
+            dict: 変換結果（最終品質・縮小倍率・エンコード回数など、書き込めなかった場合は'error'を含む）
+        """
+        save_options = {}
+        if image_format == 'WEBP':
+            save_options['alpha_quality'] = self.alpha_quality
+        trial_buffer, best_buffer = buffers
+        # エンコード対象（縮小して収める場合は縮小後の画像に差し替える）
+        target = pil_img
+        kept_size = 0
+        
+        def encode(q: int) -> int:
+            # メモリ上のバッファにエンコードしてサイズを返す
+            with timer.stage('encode') as stage:
+                trial_buffer.seek(0)
+                trial_buffer.truncate()
+                target.save(trial_buffer, image_format, quality=q, optimize=True, **save_options)
+                stage.nbytes = trial_buffer.tell()
+            return stage.nbytes
             
-            # ファイルサイズ制限を満たすまで品質を調整
-            while current_quality > 10:  # 最低品質10
-                # 一時ファイルに保存
-                pil_img.save(temp_output, 'WEBP', quality=current_quality, optimize=True)
+        def keep():
+            # 直前のエンコード結果を採用候補として保持（バッファを入れ替えるだけでコピーしない）
+            nonlocal trial_buffer, best_buffer, kept_size
+            trial_buffer, best_buffer = best_buffer, trial_buffer
+            kept_size = best_buffer.tell()
+        
+        max_bytes = max_size_mb * 1024 * 1024
+        quality = max(1, min(100, int(quality)))
+        min_quality = min(self.min_quality, quality)
+        
+        def search(image: Image.Image) -> Tuple[int, int, bool, Optional[int]]:
+            # ファイルサイズ制限内で最高の品質を探索（予測できる場合は予測値から）
+            nonlocal target
+            target = image
+            size_predictor = None
+            if self.predict_quality:
+                with timer.stage('predict'):
+                    size_predictor = self.predictor.for_image(image, image_format, save_options)
+            if size_predictor is None:
+                return self._search_quality(encode, keep, max_bytes, quality, min_quality) + (None,)
+            return self._search_quality_predicted(encode, keep, max_bytes, quality,
+                                                  size_predictor, timer, min_quality)
+        
+        def measure(image: Image.Image, q: int) -> int:
+            # 品質を探索せずに1回だけエンコード（縮小倍率の探索用）
+            nonlocal target
+            target = image
+            return encode(q)
+        
+        final_quality, encodes, within_limit, predicted_quality = search(pil_img)
+        encodes_saved = None
+        if predicted_quality is not None:
+            encodes_saved = bisection_encodes(quality, min_quality,
+                                              final_quality if within_limit else None) - encodes
+            self.predictor.record(encodes_saved)
+        
+        scale = 1.0
+        if not within_limit and self.fit_to_size:
+            final_quality, scale, scaled_encodes, within_limit = self._fit_by_scale(
+                pil_img, kept_size, max_bytes, min_quality, measure, search, timer)
+            encodes += scaled_encodes
+            target = None
+        
+        result = {
+            'quality': final_quality,
+            'scale': scale,
+            'encodes': encodes,
+            'output_size': kept_size,
+            'within_limit': within_limit
+        }
+        if encodes_saved is not None:
+            result['predicted_quality'] = predicted_quality
+            result['encodes_saved'] = encodes_saved
+        if not within_limit and self.fit_to_size:
+            # サイズ制限を守れない結果は書き込まない
+            result['error'] = f"縮小しても{max_size_mb}MB以内に収まりません"
+            return result
+        
+        # 採用したバイト列のみをディスクに書き込む
+        with best_buffer.getbuffer() as data:
+            self._write_atomic(output_path, data, timer)
+        return result
+        
+    def _fit_by_scale(self, pil_img: Image.Image, full_size: int, max_bytes: int,
+                      min_quality: int, measure: Callable[[Image.Image, int], int],
+                      search: Callable[[Image.Image], tuple],
+                      timer=NULL_TIMER) -> Tuple[int, float, int, bool]:
+        """
+        最低品質で収まる最大の縮小倍率を探し、その解像度で最高品質を探索
+        
+        縮小はデコード済みの画像から毎回行う（再デコードも縮小の繰り返しもしない）。
+        最低品質での出力サイズは倍率のべき乗で近似できるため、収まる倍率と収まらない倍率の
+        区間を対数上の補間で狭め、区間の比がSCALE_TOLERANCE以下になった時点で確定する。
+        
+        Args:
+            pil_img: 元の解像度の画像
+            full_size: 元の解像度・最低品質でのバイト数
+            max_bytes: 最大バイト数
+            min_quality: 最低品質
+            measure: measure(画像, 品質) -> エンコード後のバイト数
+            search: search(画像) -> (品質, エンコード回数, 制限内に収まったか, 予測した品質)
+            timer: 縮小の所要時間を記録するStageTimer
+            
+        Returns:
+            Tuple[int, float, int, bool]: (最終品質, 縮小倍率, エンコード回数, 制限内に収まったか)
+        """
+        width, height = pil_img.size
+        
+        def resize(factor: float) -> Optional[Image.Image]:
+            size = (max(1, round(width * factor)), max(1, round(height * factor)))
+            if min(size) < MIN_SCALED_SIDE:
+                return None
+            with timer.stage('resize', size[0] * size[1] * len(pil_img.getbands())):
+                return pil_img.resize(size, Image.Resampling.BOX)
+        
+        # fit: 最低品質で収まる最大の倍率、over: 収まらない最小の倍率
+        fit = fit_image = None
+        over, over_size = 1.0, full_size
+        fit_size = 0
+        encodes = 0
+        for _ in range(MAX_SCALE_STEPS):
+            if fit is not None and over / fit <= 1 + SCALE_TOLERANCE:
+                break
+            if fit is None:
+                # 最初は出力サイズが画素数に比例すると仮定
+                factor = over * math.sqrt(max_bytes / over_size) * SCALE_MARGIN
+            else:
+                # 2点のサイズからべき乗の指数を求めて補間
+                exponent = math.log(over_size / fit_size) / math.log(over / fit)
+                factor = over * (max_bytes * SCALE_MARGIN / over_size) ** (1 / max(exponent, 1.0))
+                factor = min(max(factor, fit * (1 + SCALE_TOLERANCE / 2)), over / (1 + SCALE_TOLERANCE / 2))
+            image = resize(factor)
+            if image is None:
+                break
+            size = measure(image, min_quality)
+            encodes += 1
+            if size <= max_bytes:
+                fit, fit_size, fit_image = factor, size, image
+            else:
+                over, over_size = factor, size
+        
+        if fit_image is None:
+            return min_quality, round(over, 4), encodes, False
+        quality, search_encodes, within_limit, _ = search(fit_image)
+        return quality, round(fit_image.width / width, 4), encodes + search_encodes, within_limit
+        
+    def _use_striped_read(self, decoded: DecodedImage) -> bool:
+        """ストリップ読み込みの対象か（未デコードの巨大なPNGのみ）"""
+        return not decoded.is_decoded and self._is_large_png(decoded.header)
+        
+    def _is_large_png(self, header: Optional[dict]) -> bool:
+        return (bool(self.large_image_pixels) and header is not None
+                and header['format'] == 'PNG'
+                and header['width'] * header['height'] >= self.large_image_pixels)
+        
+    def _convert_streamed(self, input_path: str, output_path: str, max_size_mb: float,
+                          quality: int, decoded: Optional[DecodedImage] = None,
+                          timer=NULL_TIMER) -> Optional[dict]:
+        """
+        巨大なPNGをストリップ単位で展開しながらJPEGに書き込む（全画素の画像を作らない）
+        
+        1ストリップずつ展開・エンコードするため、メモリ使用量は画像の幅に比例する。
+        出力は通常の経路（optimize=True）と同じバイト列になる（JpegStripWriterを参照）。
+        品質の探索では書き込まずに展開し直す。まず見本のストリップのみを集計して品質ごとの
+        出力サイズを予測し、予測した品質の前後STREAM_QUALITIES_PER_PASS個の品質について
+        画像全体の出力サイズ（0xFFの後に挿入する0x00を除く下限）を1回の展開で求める。
+        下限が最大サイズに近い品質はバイト数だけを数えて確かめ、ファイルは採用した品質で
+        1回だけ書き込む。
+        
+        Returns:
+            dict: 変換結果（_encode_targetと同じ形式、対象外・縮小して収める必要がある場合・
+                サイズ制限を守れるか確かめられなかった場合はNone）
+        """
+        if decoded is not None and decoded.is_decoded:
+            return None
+        header = decoded.header if decoded is not None else probe_image(input_path)
+        if not self._is_large_png(header):
+            return None
+        reader = PngStripReader(input_path)
+        if not reader.supported:
+            return None
+        if decoded is not None:
+            decoded.release_data()
+        
+        max_bytes = max_size_mb * 1024 * 1024
+        quality = max(1, min(100, int(quality)))
+        min_quality = min(self.min_quality, quality)
+        width, height = reader.width, reader.height
+        mode = reader.output_mode(False)
+        strip_rows = reader.default_strip_rows(STRIP_ROW_MULTIPLE)
+        strip_count = -(-height // strip_rows)
+        # 画像全体から均等に選んだ見本のストリップ
+        sample_indices = sorted({(2 * i + 1) * strip_count // (2 * STREAM_SAMPLE_STRIPS)
+                                 for i in range(STREAM_SAMPLE_STRIPS)})
+        sample_rows = sum(min(strip_rows, height - index * strip_rows) for index in sample_indices)
+        # ファイルを展開した回数
+        passes = 0
+        
+        def predict() -> dict:
+            # 見本のストリップのみを集計し、画像全体の出力サイズを行数の比で予測
+            nonlocal passes
+            step = STREAM_SAMPLE_QUALITIES - 1
+            qualities = sorted({min_quality + (quality - min_quality) * i // step for i in range(step + 1)})
+            stats = JpegStripStats(width, sample_rows, mode, qualities)
+            wanted = set(sample_indices)
+            for index, strip in enumerate(reader.iter_strips(False, self.matte_color, strip_rows, timer)):
+                if index in wanted:
+                    with timer.stage('predict'):
+                        stats.add(strip)
+                    if index == sample_indices[-1]:
+                        break
+            passes += 1
+            return {q: stats.minimum_size(q) * height // sample_rows for q in stats.qualities}
+        
+        def collect(qualities: List[int]) -> JpegStripStats:
+            # ファイル全体を展開し、品質ごとのハフマン符号化の記号を集計（書き込みなし）
+            nonlocal passes
+            stats = JpegStripStats(width, height, mode, qualities)
+            for strip in reader.iter_strips(False, self.matte_color, strip_rows, timer):
+                with timer.stage('encode'):
+                    stats.add(strip)
+            passes += 1
+            return stats
+        
+        def encode(f: Optional[BinaryIO], q: int, stats: JpegStripStats) -> int:
+            # ファイル全体を展開し直してエンコード（fがNoneならバイト数を数えるのみ）
+            nonlocal passes
+            writer = JpegStripWriter(f, width, height, mode, q, stats.huffman_tables(q))
+            for strip in reader.iter_strips(False, self.matte_color, strip_rows, timer):
+                with timer.stage('encode') as stage:
+                    before = writer.bytes_written
+                    writer.write(strip)
+                    stage.nbytes = writer.bytes_written - before
+            passes += 1
+            return writer.close()
+        
+        # 品質 -> 出力サイズ（0x00の挿入分を除く下限、数えた品質は正確なサイズ）、その品質を集計したJpegStripStats
+        sizes = {}
+        collected = {}
+        # 収まるかどうか未確定の品質の区間
+        low, high = min_quality, quality
+        predicted = predict()
+        final_quality = None
+        while True:
+            while low <= high:
+                stats = collect(self._stream_qualities(low, high, sizes, predicted, max_bytes))
+                for q in stats.qualities:
+                    sizes[q] = stats.minimum_size(q)
+                    collected[q] = stats
+                fitting = [q for q in stats.qualities if sizes[q] <= max_bytes]
+                if fitting:
+                    low = max(fitting) + 1
+                over = [q for q in stats.qualities if q >= low and sizes[q] > max_bytes]
+                if over:
+                    high = min(over) - 1
+            
+            # 収まる可能性のある最高品質を、最大サイズに近ければ正確なバイト数を数えて確かめる
+            fitting = [q for q in sizes if sizes[q] <= max_bytes]
+            if not fitting:
+                break
+            q = max(fitting)
+            if sizes[q] > max_bytes * STREAM_SIZE_MARGIN:
+                sizes[q] = encode(None, q, collected[q])
+                if sizes[q] > max_bytes:
+                    # 次に収まる可能性のある品質との間を探索し直す
+                    low = max((p for p in fitting if p < q), default=min_quality - 1) + 1
+                    high = q - 1
+                    continue
+            final_quality = q
+            break
+        within_limit = final_quality is not None
+        if not within_limit:
+            if self.fit_to_size or min_quality not in collected:
+                # 縮小には全画素が必要なため通常の経路でやり直す
+                return None
+            final_quality = min_quality
+        
+        dir_name = os.path.dirname(output_path) or "."
+        temp_path = os.path.join(dir_name, f".tmp_{uuid.uuid4().hex[:8]}_{os.path.basename(output_path)}")
+        try:
+            with open(temp_path, 'xb') as f:
+                size = encode(f, final_quality, collected[final_quality])
+            if within_limit and size > max_bytes:
+                # 0x00の挿入が想定より多かった場合（まれ）は通常の経路でやり直す
+                os.remove(temp_path)
+                return None
+            with timer.stage('replace'):
+                os.replace(temp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        
+        return {
+            'quality': final_quality,
+            'scale': 1.0,
+            'encodes': passes,
+            'output_size': size,
+            'within_limit': within_limit,
+            'has_alpha': reader.has_alpha,
+            'striped': True,
+            'streamed': True
+        }
+        
+    def _stream_qualities(self, low: int, high: int, sizes: dict, predicted: dict,
+                          max_bytes: int) -> List[int]:
+        """
+        ストリップ単位のJPEG変換で、次の1回の展開で出力サイズを求める品質
+        
+        区間が狭ければ区間の全品質、それ以外は区間外の求め済みのサイズと区間内の予測サイズから
+        対数サイズの線形補間で収まる最高品質を予測し、その前後を選ぶ。
+        
+        Args:
+            low: 収まるかどうか未確定の品質の下限
+            high: 収まるかどうか未確定の品質の上限
+            sizes: 求め済みの {品質: 出力サイズ}
+            predicted: 見本のストリップから予測した {品質: 出力サイズ}
+            max_bytes: 最大バイト数
+            
+        Returns:
+            List[int]: 品質のリスト（昇順）
+        """
+        count = STREAM_QUALITIES_PER_PASS
+        if high - low + 1 <= count:
+            return list(range(low, high + 1))
+        points = {q: size for q, size in predicted.items() if low <= q <= high}
+        points.update((q, size) for q, size in sizes.items() if not low <= q <= high)
+        fit = max((q for q in points if points[q] <= max_bytes), default=None)
+        over = min((q for q in points if fit is None or q > fit), default=None)
+        if fit is None:
+            target = low
+        elif over is None or points[over] <= points[fit]:
+            target = fit
+        else:
+            ratio = math.log(max_bytes / points[fit]) / math.log(points[over] / points[fit])
+            target = int(fit + (over - fit) * ratio)
+        start = min(max(target - 1, low), high - count + 1)
+        return list(range(start, start + count))
+            
+    def _search_quality(self, encode: Callable[[int], int], keep: Callable[[], None],
+                        max_bytes: int, quality: int,
+                        min_quality: int = MIN_QUALITY) -> Tuple[int, int, bool]:
+        """
+        サイズ制限内に収まる最高品質を二分探索
+        
+        まず指定品質でエンコードし、収まらなければ [min_quality, quality-1] を
+        二分探索する（品質100からでも約log2(90)+1回のエンコードで確定）。
+        最終品質のエンコード結果はkeep()で保持済みの状態で返す。
+        
+        Args:
+            encode: encode(quality) -> エンコード後のバイト数
+            keep: 直前のエンコード結果を採用候補として保持する関数
+            max_bytes: 最大バイト数
+            quality: 指定品質（探索の上限）
+            min_quality: 最低品質
+            
+        Returns:
+            Tuple[int, int, bool]: (最終品質, エンコード回数, 制限内に収まったか)
+        """
+        quality = max(1, min(100, int(quality)))
+        min_quality = min(min_quality, quality)
+        
+        encodes = 1
+        if encode(quality) <= max_bytes:
+            keep()
+            return quality, encodes, True
+            
+        best = None
+        last = quality
+        low, high = min_quality, quality - 1
+        while low <= high:
+            mid = (low + high) // 2
+            size = encode(mid)
+            encodes += 1
+            last = mid
+            if size <= max_bytes:
+                best = mid
+                keep()
+                low = mid + 1
+            else:
+                high = mid - 1
                 
-                # ファイルサイズチェック
-                if os.path.getsize(temp_output) <= max_size_mb * 1024 * 1024:
-                    break
-                    
-                # 品質を10%ずつ下げる
-                current_quality = max(10, int(current_quality * 0.9))
+        # 最低品質でも収まらない場合は最低品質の結果を採用
+        if best is not None:
+            return best, encodes, True
+        if last != min_quality:
+            encode(min_quality)
+            encodes += 1
+        keep()
+        return min_quality, encodes, False
             
-            # 最終ファイルをコピー
-            os.replace(temp_output, output_path)
+    def _search_quality_predicted(self, encode: Callable[[int], int], keep: Callable[[], None],
+                                  max_bytes: int, quality: int, predictor: SizePredictor,
+                                  timer=NULL_TIMER,
+                                  min_quality: int = MIN_QUALITY) -> Tuple[int, int, bool, int]:
+        """
+        サイズ予測から開始してサイズ制限内に収まる最高品質を探索
+        
+        「収まる最高品質」と「収まらない最低品質」の区間を狭めていく。
+        次に試す品質は、実測サイズで補正した予測からGUIDED_PROBES回まで決め、
+        以降は区間の二分探索に切り替える（予測が外れても回数は二分探索+数回で収まる）。
+        最初の実測結果はサイズ予測モデルの学習に使う。
+        
+        Args:
+            encode: encode(quality) -> エンコード後のバイト数
+            keep: 直前のエンコード結果を採用候補として保持する関数
+            max_bytes: 最大バイト数
+            quality: 指定品質（探索の上限）
+            predictor: この画像のサイズ予測
+            timer: 予測の所要時間を記録するStageTimer
+            min_quality: 最低品質
             
-            return True
+        Returns:
+            Tuple[int, int, bool, int]: (最終品質, エンコード回数, 制限内に収まったか, 予測した品質)
+        """
+        quality = max(1, min(100, int(quality)))
+        min_quality = min(min_quality, quality)
+        
+        with timer.stage('predict'):
+            predicted = max(min_quality, predictor.best_quality(max_bytes, min_quality, quality))
+        
+        # fit: 収まった最高品質（min_quality - 1 は未確認）、over: 収まらなかった最低品質
+        fit, over = min_quality - 1, quality + 1
+        q = predicted
+        encodes = 0
+        guided = 0
+        last = None
+        while over - fit > 1:
+            size = encode(q)
+            encodes += 1
+            last = q
+            if encodes == 1:
+                predictor.observe(q, size)
+            if size <= max_bytes:
+                fit = q
+                keep()
+            else:
+                over = q
+            if over - fit <= 1:
+                break
+            if guided < GUIDED_PROBES:
+                with timer.stage('predict'):
+                    guided += 1
+                    correction = size / max(1.0, predictor.predict(q))
+                    q = predictor.best_quality(max_bytes, fit + 1, over - 1, correction)
+                    # 予測上すべて収まらない場合は fit の直上で確認する
+                    q = max(fit + 1, min(over - 1, q))
+            else:
+                q = (fit + over) // 2
+        
+        if fit >= min_quality:
+            return fit, encodes, True, predicted
+        # 最低品質でも収まらない場合は最低品質の結果を採用
+        if last != min_quality:
+            encode(min_quality)
+            encodes += 1
+        keep()
+        return min_quality, encodes, False, predicted
             
-        except Exception as e:
-            print(f"WebP変換エラー: {input_path} - {str(e)}")
-            return False
+    def load_image(self, image_path: str) -> Optional[DecodedImage]:
+        """
+        画像を開く（キャッシュがあればキャッシュを利用）
+        
+        画素はpixelsへの初回アクセス時にデコードされる。
+        
+        Args:
+            image_path: 画像ファイルパス
             
-    def get_image_info(self, image_path: str) -> Optional[dict]:
+        Returns:
+            DecodedImage: 画像（None if error）
+        """
+        if self.image_cache is not None:
+            return self.image_cache.load(image_path)
+        return DecodedImage.open(image_path)
+            
+    def get_image_info(self, image_path: str,
+                       decoded: Optional[DecodedImage] = None) -> Optional[dict]:
         """
         画像情報を取得
         
+        ヘッダーのみを解析し、画素はデコードしない。
+        未対応形式の場合のみデコードして取得する。
+        
         Args:
             image_path: 画像ファイルパス
+            decoded: デコード済み画像（指定時は再デコードしない）
             
         Returns:
             dict: 画像情報（None if error）
         """
         try:
-            # OpenCVで画像を読み込み
-            # 日本語パス対応
-            img_array = np.fromfile(image_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is None:
+            if decoded is not None:
+                return decoded.info
+            info = probe_image(image_path)
+            if info is not None:
+                return info
+            decoded = self.load_image(image_path)
+            if decoded is None:
                 return None
-                
-            height, width, channels = img.shape
-            
-            # ファイルサイズ
-            file_size = os.path.getsize(image_path)
-            
-            return {
-                'width': width,
-                'height': height,
-                'channels': channels,
-                'file_size': file_size,
-                'file_size_mb': round(file_size / (1024 * 1024), 2)
-            }
+            return decoded.info
             
         except Exception as e:
-            print(f"画像情報取得エラー: {image_path} - {str(e)}")
+            print(f"画像情報取得エラー: {image_path} - {str(e)}", file=sys.stderr)
             return None
             
-    def create_preview(self, image_path: str, max_size: Tuple[int, int] = (300, 300)) -> Optional[np.ndarray]:
+    def create_preview(self, image_path: str, max_size: Tuple[int, int] = (300, 300),
+                       decoded: Optional[DecodedImage] = None) -> Optional[np.ndarray]:
         """
         プレビュー画像を作成
         
         Args:
             image_path: 画像ファイルパス
             max_size: 最大サイズ (width, height)
+            decoded: デコード済み画像（指定時は再デコードしない）
             
         Returns:
             np.ndarray: プレビュー画像（None if error）
         """
         try:
-            # OpenCVで画像を読み込み
-            # 日本語パス対応
-            img_array = np.fromfile(image_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is None:
-                return None
+            def create() -> Optional[np.ndarray]:
+                image = decoded if decoded is not None else self.load_image(image_path)
+                if image is None:
+                    return None
+                # 縮小デコードしてアスペクト比を維持したサイズへ（同サイズは2回目以降キャッシュ）
+                return image.thumbnail(max_size)
                 
-            # リサイズ
-            height, width = img.shape[:2]
-            max_width, max_height = max_size
-            
-            # アスペクト比を維持してリサイズ
-            if width > max_width or height > max_height:
-                scale = min(max_width / width, max_height / height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
-            return img
+            if self.thumbnail_cache is not None:
+                # ディスクにあれば元画像をデコードしない
+                return self.thumbnail_cache.get_or_create(image_path, max_size, create)
+            return create()
             
         except Exception as e:
-            print(f"プレビュー作成エラー: {image_path} - {str(e)}")
+            print(f"プレビュー作成エラー: {image_path} - {str(e)}", file=sys.stderr)
             return None
             
-    def _get_temp_path(self, original_path: str) -> str:
-        """一時ファイルパスを取得"""
-        dir_name = os.path.dirname(original_path)
-        file_name = os.path.basename(original_path)
-        temp_file = f".tmp_{file_name}"
-        return os.path.join(dir_name, temp_file)
+    def _write_atomic(self, output_path: str, data, timer=NULL_TIMER) -> None:
+        """
+        出力先と同じフォルダの一時ファイルに一度だけ書き込み、リネームで置き換える
+        
+        Args:
+            output_path: 出力ファイルパス
+            data: 書き込むバイト列
+            timer: 書き込み・置き換えの所要時間を記録するStageTimer
+        """
+        dir_name = os.path.dirname(output_path) or "."
+        file_name = os.path.basename(output_path)
+        # 並列変換時に衝突しないよう一意な一時ファイル名を使う
+        temp_path = os.path.join(dir_name, f".tmp_{uuid.uuid4().hex[:8]}_{file_name}")
+        try:
+            with timer.stage('write', len(data)):
+                with open(temp_path, 'xb') as f:
+                    f.write(data)
+            with timer.stage('replace'):
+                os.replace(temp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
         
     def cleanup(self):
         """リソースクリーンアップ"""
-        try:
-            # 一時ディレクトリを削除
-            import shutil
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-        except Exception:
-            pass
\ No newline at end of file
+        # エンコードバッファを解放
+        self._trial_buffer = io.BytesIO()
+        self._best_buffer = io.BytesIO()
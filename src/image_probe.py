@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+画像ヘッダー解析
+画素をデコードせず、ファイル先頭のヘッダーだけから画像情報を取得
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import mmap
+import os
+import struct
+from typing import BinaryIO, Optional
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNGカラータイプ -> (チャンネル数, アルファ有無)
+PNG_COLOR_TYPES = {
+    0: (1, False),  # グレースケール
+    2: (3, False),  # RGB
+    3: (3, False),  # パレット
+    4: (2, True),   # グレースケール + アルファ
+    6: (4, True),   # RGBA
+}
+
+# JPEGのSOFマーカー（DHT/JPG/DACを除く）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def probe_image(image_path: str, mapping: Optional[mmap.mmap] = None) -> Optional[dict]:
+    """
+    ヘッダーのみを読んで画像情報を取得
+
+    Args:
+        image_path: 画像ファイルパス
+        mapping: メモリマップ済みのファイル内容（指定時はファイルを開き直さない）
+
+    Returns:
+        dict: 画像情報（format, width, height, channels, bit_depth, color_type,
+              has_alpha, file_size, file_size_mb）。未対応形式・破損時はNone
+    """
+    try:
+        if mapping is not None:
+            mapping.seek(0)
+            info = _probe_stream(mapping)
+            file_size = len(mapping)
+        else:
+            with open(image_path, 'rb') as f:
+                info = _probe_stream(f)
+                file_size = os.fstat(f.fileno()).st_size
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if info is None or info['width'] <= 0 or info['height'] <= 0:
+        return None
+
+    info['file_size'] = file_size
+    info['file_size_mb'] = round(file_size / (1024 * 1024), 2)
+    return info
+
+
+def _probe_stream(f: BinaryIO) -> Optional[dict]:
+    """先頭から形式を判定してヘッダーを解析"""
+    head = f.read(32)
+    if head.startswith(PNG_SIGNATURE):
+        return _probe_png(f, head)
+    if head.startswith(b'\xff\xd8'):
+        return _probe_jpeg(f)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp(f, head)
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return _probe_gif(head)
+    if head[:2] == b'BM':
+        return _probe_bmp(head)
+    return None
+
+
+def _make_info(image_format: str, width: int, height: int, channels: int,
+               bit_depth: int, has_alpha: bool, color_type: Optional[int] = None) -> dict:
+    return {
+        'format': image_format,
+        'width': width,
+        'height': height,
+        'channels': channels,
+        'bit_depth': bit_depth,
+        'color_type': color_type,
+        'has_alpha': has_alpha,
+    }
+
+
+def _probe_png(f: BinaryIO, head: bytes) -> Optional[dict]:
+    # シグネチャ(8) + 長さ(4) + "IHDR"(4) + IHDRデータ(13)
+    if len(head) < 29 or head[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', head[16:26])
+    if color_type not in PNG_COLOR_TYPES:
+        return None
+    channels, has_alpha = PNG_COLOR_TYPES[color_type]
+
+    # IDATまでのチャンクヘッダーだけを走査してtRNS（透過色）を探す
+    if not has_alpha:
+        f.seek(8 + 8 + 13 + 4)
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', chunk)
+            if chunk_type == b'tRNS':
+                has_alpha = True
+                break
+            if chunk_type in (b'IDAT', b'IEND'):
+                break
+            f.seek(length + 4, os.SEEK_CUR)
+
+    if has_alpha and color_type in (0, 2, 3):
+        channels += 1
+
+    return _make_info('PNG', width, height, channels, bit_depth, has_alpha, color_type)
+
+
+def _probe_jpeg(f: BinaryIO) -> Optional[dict]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        # 埋め草の0xFFを読み飛ばす
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue
+        if code in (0xD9, 0xDA):
+            return None
+        length = struct.unpack('>H', f.read(2))[0]
+        if code in JPEG_SOF_MARKERS:
+            bit_depth, height, width, channels = struct.unpack('>BHHB', f.read(6))
+            return _make_info('JPEG', width, height, channels, bit_depth, False)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _probe_webp(f: BinaryIO, head: bytes) -> Optional[dict]:
+    chunk_type = head[12:16]
+    data = head[20:32] + f.read(8)
+    if chunk_type == b'VP8 ':
+        # キーフレームヘッダー: 3バイト + 開始コード3バイト + 14bitの幅/高さ
+        if data[3:6] != b'\x9d\x01\x2a':
+            return None
+        width, height = struct.unpack('<HH', data[6:10])
+        return _make_info('WEBP', width & 0x3FFF, height & 0x3FFF, 3, 8, False)
+    if chunk_type == b'VP8L':
+        if data[0] != 0x2F:
+            return None
+        bits = struct.unpack('<I', data[1:5])[0]
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        has_alpha = bool((bits >> 28) & 1)
+        return _make_info('WEBP', width, height, 4 if has_alpha else 3, 8, has_alpha)
+    if chunk_type == b'VP8X':
+        has_alpha = bool(data[0] & 0x10)
+        width = int.from_bytes(data[4:7], 'little') + 1
+        height = int.from_bytes(data[7:10], 'little') + 1
+        return _make_info('WEBP', width, height, 4 if has_alpha else 3, 8, has_alpha)
+    return None
+
+
+def _probe_gif(head: bytes) -> Optional[dict]:
+    width, height = struct.unpack('<HH', head[6:10])
+    return _make_info('GIF', width, height, 3, 8, False)
+
+
+def _probe_bmp(head: bytes) -> Optional[dict]:
+    if len(head) < 30:
+        return None
+    width, height = struct.unpack('<ii', head[18:26])
+    bit_depth = struct.unpack('<H', head[28:30])[0]
+    has_alpha = bit_depth == 32
+    return _make_info('BMP', width, abs(height), 4 if has_alpha else 3, 8, has_alpha)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+処理時間の計測
+1ファイルごと・処理段階ごとの所要時間とバイト数を記録し、集計・出力する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+
+# 処理段階の表示順（それ以外は末尾に名前順）
+STAGE_ORDER = ('read', 'decode', 'alpha', 'to_pil', 'resize', 'predict', 'encode', 'write', 'replace')
+
+
+class _Stage:
+    """計測中の1段階（withブロック内でnbytesを設定できる）"""
+
+    __slots__ = ('name', 'nbytes', '_timer', '_start')
+
+    def __init__(self, timer: "StageTimer", name: str, nbytes: Optional[int]):
+        self._timer = timer
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self) -> "_Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        self._timer.stages.append((self.name, round(elapsed_ms, 3), self.nbytes))
+        return False
+
+
+class _NullStage:
+    """計測無効時の段階（何もしない）"""
+
+    __slots__ = ('nbytes',)
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class StageTimer:
+    """1ファイル分の処理段階ごとの所要時間を記録"""
+
+    enabled = True
+
+    def __init__(self):
+        # (段階名, 所要時間ms, バイト数) のリスト（エンコードは試行ごとに1件）
+        self.stages: List[tuple] = []
+
+    def stage(self, name: str, nbytes: Optional[int] = None) -> _Stage:
+        """
+        段階の計測
+
+        Args:
+            name: 段階名
+            nbytes: 処理したバイト数（withブロック内で設定してもよい）
+        """
+        return _Stage(self, name, nbytes)
+
+    def as_list(self) -> List[dict]:
+        """変換結果に格納する形式"""
+        return [{'stage': name, 'ms': ms, 'bytes': nbytes} for name, ms, nbytes in self.stages]
+
+
+class NullStageTimer:
+    """計測無効時のタイマー（呼び出しコストのみ）"""
+
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str, nbytes: Optional[int] = None) -> _NullStage:
+        return self._stage
+
+    def as_list(self) -> List[dict]:
+        return []
+
+
+NULL_TIMER = NullStageTimer()
+
+
+def _sort_key(name: str):
+    if name in STAGE_ORDER:
+        return (STAGE_ORDER.index(name), name)
+    return (len(STAGE_ORDER), name)
+
+
+class StageAggregator:
+    """メモリ上で段階ごとに集計するシンク"""
+
+    def __init__(self):
+        self.files = 0
+        self.totals: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, input_path: str, result: dict):
+        """変換結果1件を集計"""
+        stages = result.get('stages')
+        if not stages:
+            return
+        with self._lock:
+            self.files += 1
+            for item in stages:
+                total = self.totals.setdefault(item['stage'],
+                                               {'count': 0, 'ms': 0.0, 'max_ms': 0.0, 'bytes': 0})
+                total['count'] += 1
+                total['ms'] += item['ms']
+                total['max_ms'] = max(total['max_ms'], item['ms'])
+                total['bytes'] += item['bytes'] or 0
+
+    def close(self):
+        pass
+
+    def summary(self) -> dict:
+        """
+        集計結果
+
+        Returns:
+            dict: {'files': ファイル数, 'stages': [{stage, count, total_ms, mean_ms, max_ms, bytes, share}]}
+        """
+        with self._lock:
+            grand_total = sum(t['ms'] for t in self.totals.values()) or 1.0
+            stages = []
+            for name in sorted(self.totals, key=_sort_key):
+                total = self.totals[name]
+                stages.append({
+                    'stage': name,
+                    'count': total['count'],
+                    'total_ms': round(total['ms'], 1),
+                    'mean_ms': round(total['ms'] / total['count'], 2),
+                    'max_ms': round(total['max_ms'], 1),
+                    'bytes': total['bytes'],
+                    'share': round(total['ms'] / grand_total, 3),
+                })
+            return {'files': self.files, 'stages': stages}
+
+
+def format_stage_summary(summary: dict) -> List[str]:
+    """集計結果をログ表示用の行に整形"""
+    lines = [f"処理時間の内訳（{summary['files']}ファイル）:"]
+    for item in summary['stages']:
+        lines.append(
+            f"  {item['stage']:<8} {item['total_ms'] / 1000:>8.2f}秒 "
+            f"{item['share'] * 100:>5.1f}%  平均 {item['mean_ms']:.1f}ms × {item['count']}回"
+        )
+    return lines
+
+
+class JsonlStageSink:
+    """1ファイル1行のJSONで段階ごとの計測結果を書き出すシンク"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, input_path: str, result: dict):
+        stages = result.get('stages')
+        if not stages:
+            return
+        line = json.dumps({
+            'input': input_path,
+            'output': result.get('output_path'),
+            'elapsed_ms': result.get('elapsed_ms'),
+            'stages': stages,
+        }, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class ProfileCapture:
+    """
+    指定した1ファイルの変換をcProfile・tracemallocで記録
+
+    ワーカープロセスへ渡せるよう、対象と出力先のみを保持する。
+    """
+
+    def __init__(self, target: str, output_dir: str, top: int = 25):
+        """
+        初期化
+
+        Args:
+            target: 対象ファイル（パスまたはファイル名）
+            output_dir: .prof・メモリ統計の出力先
+            top: メモリ統計に出力する件数
+        """
+        self.target = target
+        self.output_dir = output_dir
+        self.top = top
+
+    def matches(self, input_path: str) -> bool:
+        if os.path.sep in self.target or '/' in self.target:
+            return os.path.abspath(input_path) == os.path.abspath(self.target)
+        return os.path.basename(input_path) == self.target
+
+    @contextmanager
+    def capture(self, input_path: str):
+        """withブロック内の処理を記録し、終了時にファイルへ保存"""
+        base = os.path.join(self.output_dir, os.path.basename(input_path))
+        profiler = cProfile.Profile()
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                profiler.dump_stats(base + '.prof')
+                with open(base + '.memory.txt', 'w', encoding='utf-8') as f:
+                    f.write(f"peak: {peak / (1024 * 1024):.1f} MB\n")
+                    for stat in snapshot.statistics('lineno')[:self.top]:
+                        f.write(f"{stat}\n")
+            except OSError as e:
+                print(f"プロファイル保存エラー: {base} - {str(e)}", file=sys.stderr)
+
+
+class Instrumentation:
+    """計測設定とシンクのまとめ（バッチ変換に渡す）"""
+
+    def __init__(self, sinks: Iterable = (), profile: Optional[ProfileCapture] = None):
+        """
+        初期化
+
+        Args:
+            sinks: record(入力パス, 変換結果)・close() を持つシンク
+            profile: 1ファイルのプロファイル取得設定
+        """
+        self.sinks = list(sinks)
+        self.profile = profile
+
+    @property
+    def timing(self) -> bool:
+        """段階ごとの計測が必要か"""
+        return bool(self.sinks)
+
+    @property
+    def aggregator(self) -> Optional[StageAggregator]:
+        for sink in self.sinks:
+            if isinstance(sink, StageAggregator):
+                return sink
+        return None
+
+    def record(self, input_path: str, result: dict):
+        for sink in self.sinks:
+            sink.record(input_path, result)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,737 @@
+#!/usr/bin/env python3
+"""
+JPEGストリップ書き込み
+ストリップ単位で色変換・DCT・量子化し、画像全体で最適化したハフマン表の1枚のJPEGとして書き込む
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import io
+import struct
+from typing import BinaryIO, Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+# ストリップの行数はこの倍数にする（4:2:0のMCUの高さ）
+STRIP_ROW_MULTIPLE = 16
+
+# JPEGの幅・高さの上限
+JPEG_MAX_SIDE = 0xFFFF
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+MARKER_SOF0 = 0xC0
+MARKER_DHT = 0xC4
+MARKER_SOS = 0xDA
+MARKER_DQT = 0xDB
+
+# ジグザグ順の位置 -> 8x8ブロック内の位置
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+], dtype=np.intp)
+
+# 整数DCT（libjpeg-turboのjfdctint.c）の固定小数点
+CONST_BITS = 13
+PASS1_BITS = 2
+FIX_0_298631336 = 2446
+FIX_0_390180644 = 3196
+FIX_0_541196100 = 4433
+FIX_0_765366865 = 6270
+FIX_0_899976223 = 7373
+FIX_1_175875602 = 9633
+FIX_1_501321110 = 12299
+FIX_1_847759065 = 15137
+FIX_1_961570560 = 16069
+FIX_2_053119869 = 16819
+FIX_2_562915447 = 20995
+FIX_3_072711026 = 25172
+
+# RGB -> YCbCr変換（jccolor.c）の固定小数点
+SCALE_BITS = 16
+ONE_HALF = 1 << (SCALE_BITS - 1)
+CBCR_OFFSET = 128 << SCALE_BITS
+
+
+def _fix(x: float) -> int:
+    return int(x * (1 << SCALE_BITS) + 0.5)
+
+
+# 値の絶対値 -> 符号化に必要なビット数
+_NBITS = np.zeros(1 << 16, dtype=np.uint8)
+for _bits in range(1, 16):
+    _NBITS[1 << (_bits - 1):1 << _bits] = _bits
+
+
+def _read_segments(data: bytes) -> List[Tuple[int, bytes]]:
+    """JPEGのSOSまでのマーカーセグメント [(マーカー, 内容)]"""
+    if data[:2] != SOI:
+        raise ValueError("JPEGのデータではありません")
+    segments = []
+    pos = 2
+    while True:
+        if data[pos] != 0xFF:
+            raise ValueError("JPEGのマーカーが不正です")
+        marker = data[pos + 1]
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        segments.append((marker, data[pos + 4:pos + 2 + length]))
+        pos += 2 + length
+        if marker == MARKER_SOS:
+            return segments
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes((0xFF, marker)) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _reciprocals(divisor: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    除算を乗算とシフトに置き換える係数（libjpeg-turboのcompute_reciprocalと同じ）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (逆数, 丸めの補正, シフト量)
+    """
+    recip = np.empty(64, dtype=np.int32)
+    corr = np.empty(64, dtype=np.int32)
+    shift = np.empty(64, dtype=np.int32)
+    for i, d in enumerate(int(value) for value in divisor):
+        if d == 1:
+            recip[i], corr[i], shift[i] = 1, 0, 0
+            continue
+        r = 16 + d.bit_length() - 1
+        fq, fr = divmod(1 << r, d)
+        c = d // 2
+        if fr == 0:
+            fq >>= 1
+            r -= 1
+        elif fr <= d // 2:
+            c += 1
+        else:
+            fq += 1
+        recip[i], corr[i], shift[i] = fq, c, r
+    return recip, corr, shift
+
+
+def _fdct_islow(blocks: np.ndarray) -> np.ndarray:
+    """
+    8x8ブロックの整数DCT（jfdctint.cと同じ計算、出力は8倍のスケール）
+
+    Args:
+        blocks: (N, 8, 8) の中心化済みのサンプル
+
+    Returns:
+        np.ndarray: (N, 64) のDCT係数（ブロック内の位置順）
+    """
+    def butterfly(d):
+        tmp0, tmp7 = d[0] + d[7], d[0] - d[7]
+        tmp1, tmp6 = d[1] + d[6], d[1] - d[6]
+        tmp2, tmp5 = d[2] + d[5], d[2] - d[5]
+        tmp3, tmp4 = d[3] + d[4], d[3] - d[4]
+        tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+        tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+        z1 = (tmp12 + tmp13) * FIX_0_541196100
+        even = (tmp10 + tmp11, tmp10 - tmp11,
+                z1 + tmp13 * FIX_0_765366865, z1 - tmp12 * FIX_1_847759065)
+        z1, z2 = tmp4 + tmp7, tmp5 + tmp6
+        z3, z4 = tmp4 + tmp6, tmp5 + tmp7
+        z5 = (z3 + z4) * FIX_1_175875602
+        z1 = z1 * -FIX_0_899976223
+        z2 = z2 * -FIX_2_562915447
+        z3 = z3 * -FIX_1_961570560 + z5
+        z4 = z4 * -FIX_0_390180644 + z5
+        odd = (tmp7 * FIX_1_501321110 + z1 + z4, tmp6 * FIX_3_072711026 + z2 + z3,
+               tmp5 * FIX_2_053119869 + z2 + z4, tmp4 * FIX_0_298631336 + z1 + z3)
+        return even, odd
+
+    def descale(x, n):
+        return (x + (1 << (n - 1))) >> n
+
+    # 1段目: 行ごと（出力はPASS1_BITSだけ拡大）
+    # 8ビットのサンプルでは途中の値は2^31未満に収まるため、int32で計算する
+    rows = blocks.astype(np.int32).transpose(2, 0, 1)
+    (dc, d4, d2, d6), (d1, d3, d5, d7) = butterfly(rows)
+    shift = CONST_BITS - PASS1_BITS
+    work = np.stack([dc << PASS1_BITS, descale(d1, shift), descale(d2, shift), descale(d3, shift),
+                     d4 << PASS1_BITS, descale(d5, shift), descale(d6, shift), descale(d7, shift)])
+    # 2段目: 列ごと（work[列内の位置, ブロック, 行] を行方向に処理）
+    cols = work.transpose(2, 1, 0)
+    (dc, d4, d2, d6), (d1, d3, d5, d7) = butterfly(cols)
+    shift = CONST_BITS + PASS1_BITS
+    out = np.stack([descale(dc, PASS1_BITS), descale(d1, shift), descale(d2, shift),
+                    descale(d3, shift), descale(d4, PASS1_BITS), descale(d5, shift),
+                    descale(d6, shift), descale(d7, shift)])
+    # out[行, ブロック, 列] -> (N, 64)
+    return out.transpose(1, 0, 2).reshape(-1, 64)
+
+
+def _pad(plane: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """最終行・最終列を繰り返して拡張"""
+    pad_rows, pad_cols = rows - plane.shape[0], cols - plane.shape[1]
+    if pad_rows or pad_cols:
+        plane = np.pad(plane, ((0, pad_rows), (0, pad_cols)), mode='edge')
+    return plane
+
+
+def _to_blocks(plane: np.ndarray) -> np.ndarray:
+    """(H, W) -> (H/8, W/8, 8, 8)"""
+    height, width = plane.shape
+    return (plane - 128).reshape(height // 8, 8, width // 8, 8).transpose(0, 2, 1, 3)
+
+
+class _Layout:
+    """
+    指定品質でPillow（libjpeg-turbo）が書き込むヘッダーと量子化表
+
+    1回だけ小さな画像をエンコードし、そのヘッダー（JFIF・量子化表・フレーム・スキャン）を
+    画像のサイズに合わせて使う。このため品質から量子化表への変換・サブサンプリングの設定は
+    通常の経路（Image.save）と一致する。
+    """
+
+    def __init__(self, mode: str, quality: int):
+        buffer = io.BytesIO()
+        Image.new(mode, (16, 16)).save(buffer, 'JPEG', quality=quality)
+        self.segments = _read_segments(buffer.getvalue())
+        quant = {}
+        for marker, payload in self.segments:
+            if marker == MARKER_DQT:
+                pos = 0
+                while pos < len(payload):
+                    precision, table_id = payload[pos] >> 4, payload[pos] & 0x0F
+                    if precision:
+                        raise ValueError("16ビットの量子化表には対応していません")
+                    table = np.empty(64, dtype=np.int64)
+                    table[ZIGZAG] = np.frombuffer(payload, np.uint8, 64, pos + 1)
+                    quant[table_id] = table
+                    pos += 65
+            elif marker == MARKER_SOF0:
+                count = payload[5]
+                specs = [payload[6 + 3 * i:9 + 3 * i] for i in range(count)]
+                # (ID, 水平サンプリング, 垂直サンプリング, 量子化表)
+                self.components = [(spec[0], spec[1] >> 4, spec[1] & 0x0F, spec[2]) for spec in specs]
+            elif marker == MARKER_SOS:
+                count = payload[0]
+                # 成分ごとの (DC表, AC表)
+                self.huffman_ids = [(payload[2 + 2 * i] >> 4, payload[2 + 2 * i] & 0x0F)
+                                    for i in range(count)]
+        if len(self.components) not in (1, 3) or (len(self.components) == 3 and [
+                component[1:3] for component in self.components] != [(2, 2), (1, 1), (1, 1)]):
+            raise ValueError("未対応のサブサンプリングです")
+        # 整数DCTの出力は8倍のため量子化表も8倍にして割る（係数と同じジグザグ順）
+        self.divisors = {table_id: _reciprocals(table[ZIGZAG] << 3) for table_id, table in quant.items()}
+        # 成分ごとの量子化の係数
+        self.component_divisors = [self.divisors[component[3]] for component in self.components]
+
+    def header(self, width: int, height: int, huffman: Dict[Tuple[int, int], '_HuffmanTable']) -> bytes:
+        """画像のサイズとハフマン表を入れたSOSまでのヘッダー"""
+        data = bytearray(SOI)
+        for marker, payload in self.segments:
+            if marker == MARKER_DHT:
+                continue
+            if marker == MARKER_SOF0:
+                payload = payload[:1] + struct.pack('>HH', height, width) + payload[5:]
+            elif marker == MARKER_SOS:
+                # libjpegと同じく成分の順にDC表・AC表を1回ずつ書く
+                written = set()
+                for dc_id, ac_id in self.huffman_ids:
+                    for key in ((0, dc_id), (1, ac_id)):
+                        if key not in written:
+                            written.add(key)
+                            data += _segment(MARKER_DHT, huffman[key].payload(*key))
+            data += _segment(marker, payload)
+        return bytes(data)
+
+
+class _StripTransform:
+    """
+    ストリップを成分ごとのDCT係数に変換（量子化前、品質に依存しない部分）
+
+    色変換・4:2:0のダウンサンプリング・右端/下端の拡張・DCTはlibjpeg-turboと同じ整数演算で行い、
+    全体を1回でエンコードした場合と同じ係数になる。
+    """
+
+    def __init__(self, width: int, height: int, mode: str):
+        if not (0 < width <= JPEG_MAX_SIDE and 0 < height <= JPEG_MAX_SIDE):
+            raise ValueError(f"JPEGの最大サイズ（{JPEG_MAX_SIDE}px）を超えています")
+        if mode not in ('RGB', 'L'):
+            raise ValueError(f"未対応のモードです: {mode}")
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.rows_done = 0
+
+    def __call__(self, strip: Image.Image) -> List[np.ndarray]:
+        """
+        ストリップを上から順に変換
+
+        Returns:
+            List[np.ndarray]: 成分ごとの (ブロック行, ブロック列, 64) のジグザグ順のDCT係数（下端・右端の拡張分を含む）
+        """
+        if strip.width != self.width or strip.mode != self.mode:
+            raise ValueError("ストリップの幅・モードが画像と一致しません")
+        rows = strip.height
+        last = self.rows_done + rows == self.height
+        if self.rows_done + rows > self.height:
+            raise ValueError("ストリップの行数が画像の高さを超えています")
+        if not last and rows % STRIP_ROW_MULTIPLE:
+            raise ValueError(f"最後以外のストリップの行数は{STRIP_ROW_MULTIPLE}の倍数が必要です")
+        self.rows_done += rows
+        pixels = np.asarray(strip)
+        if self.mode == 'L':
+            luma = _pad(pixels.astype(np.int32), -(-rows // 8) * 8, -(-self.width // 8) * 8)
+            return [self._dct(luma)]
+
+        r, g, b = (pixels[:, :, i].astype(np.int32) for i in range(3))
+        luma = (_fix(0.29900) * r + _fix(0.58700) * g + _fix(0.11400) * b + ONE_HALF) >> SCALE_BITS
+        cb = (-_fix(0.16874) * r - _fix(0.33126) * g + _fix(0.5) * b
+              + CBCR_OFFSET + ONE_HALF - 1) >> SCALE_BITS
+        cr = (_fix(0.5) * r - _fix(0.41869) * g - _fix(0.08131) * b
+              + CBCR_OFFSET + ONE_HALF - 1) >> SCALE_BITS
+        del r, g, b
+        mcu_rows = -(-rows // 16) * 16
+        luma = _pad(luma, mcu_rows, -(-self.width // 8) * 8)
+        chroma_width = -(-self.width // 16) * 16
+        planes = [self._dct(luma)]
+        for plane in (cb, cr):
+            # 2x2の平均（丸めは列ごとに1, 2を交互に加える）、行数はMCUの高さまで拡張
+            plane = _pad(plane, -(-rows // 2) * 2, chroma_width)
+            total = plane[0::2, 0::2] + plane[0::2, 1::2] + plane[1::2, 0::2] + plane[1::2, 1::2]
+            total[:, 0::2] += 1
+            total[:, 1::2] += 2
+            planes.append(self._dct(_pad(total >> 2, mcu_rows // 2, chroma_width // 2)))
+        return planes
+
+    @staticmethod
+    def _dct(plane: np.ndarray) -> np.ndarray:
+        blocks = _to_blocks(plane)
+        block_rows, block_cols = blocks.shape[:2]
+        return _fdct_islow(blocks.reshape(-1, 8, 8))[:, ZIGZAG].reshape(block_rows, block_cols, 64)
+
+
+class _HuffmanTable:
+    """ハフマン表（符号長ごとの個数・記号と、記号ごとの符号・符号長）"""
+
+    def __init__(self, bits: Sequence[int], values: Sequence[int]):
+        self.bits = list(bits)
+        self.values = list(values)
+        self.codes = np.zeros(256, dtype=np.uint64)
+        self.sizes = np.zeros(256, dtype=np.int64)
+        code = 0
+        pos = 0
+        for length in range(1, 17):
+            for _ in range(self.bits[length - 1]):
+                self.codes[self.values[pos]] = code
+                self.sizes[self.values[pos]] = length
+                code += 1
+                pos += 1
+            code <<= 1
+
+    @classmethod
+    def optimal(cls, freq: np.ndarray) -> '_HuffmanTable':
+        """
+        記号の出現数から最適なハフマン表を作る（libjpegのjpeg_gen_optimal_tableと同じ手順）
+
+        最長16ビットに制限し、すべて1の符号は使わない。
+        """
+        freq = [int(count) for count in freq[:256]] + [1]
+        codesize = [0] * 257
+        others = [-1] * 257
+        live = [i for i in range(257) if freq[i]]
+        while len(live) > 1:
+            # 出現数が最小の記号（同数なら番号の大きい方）を2つ選んで併合
+            c1 = min(live, key=lambda i: (freq[i], -i))
+            c2 = min((i for i in live if i != c1), key=lambda i: (freq[i], -i))
+            freq[c1] += freq[c2]
+            freq[c2] = 0
+            live.remove(c2)
+            codesize[c1] += 1
+            while others[c1] >= 0:
+                c1 = others[c1]
+                codesize[c1] += 1
+            others[c1] = c2
+            codesize[c2] += 1
+            while others[c2] >= 0:
+                c2 = others[c2]
+                codesize[c2] += 1
+        bits = [0] * 33
+        for size in codesize:
+            if size:
+                bits[size] += 1
+        for i in range(32, 16, -1):
+            while bits[i] > 0:
+                j = i - 2
+                while bits[j] == 0:
+                    j -= 1
+                bits[i] -= 2
+                bits[i - 1] += 1
+                bits[j + 1] += 2
+                bits[j] -= 1
+        i = 16
+        while bits[i] == 0:
+            i -= 1
+        # 予約した記号256の分を除く
+        bits[i] -= 1
+        values = [symbol for size in range(1, 33) for symbol in range(256) if codesize[symbol] == size]
+        return cls(bits[1:17], values)
+
+    def payload(self, table_class: int, table_id: int) -> bytes:
+        """DHTセグメントの内容"""
+        return bytes([(table_class << 4) | table_id] + self.bits + self.values)
+
+
+class _StripCoder:
+    """
+    DCT係数を量子化してMCU順のブロック列にし、ハフマン符号化の記号に分解する
+
+    DC係数の差分はストリップをまたいで続けるため、成分ごとの直前のDC値を保持する。
+    記号は「ハフマン表の番号 * 256 + 記号」の通し番号で表し、表ごとの集計・符号の参照を
+    1回の配列演算で行う。
+    """
+
+    def __init__(self, layout: _Layout, width: int, height: int):
+        self.layout = layout
+        self.height = height
+        self.rows_done = 0
+        count = len(layout.components)
+        self.last_dc = [0] * count
+        # 使うハフマン表 (0: DC / 1: AC, 表の番号) の一覧と、成分ごとのその中の番号
+        self.keys = sorted({(0, ids[0]) for ids in layout.huffman_ids}
+                           | {(1, ids[1]) for ids in layout.huffman_ids})
+        self.dc_slots = np.array([self.keys.index((0, ids[0])) for ids in layout.huffman_ids], dtype=np.intp)
+        self.ac_slots = np.array([self.keys.index((1, ids[1])) for ids in layout.huffman_ids], dtype=np.intp)
+        self.block_cols = -(-width // 8)
+
+    def quantize(self, planes: List[np.ndarray], rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        量子化してMCU順に並べる
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: ((ブロック数, 64) のジグザグ順の係数, ブロックごとの成分番号)
+        """
+        self.rows_done += rows
+        last = self.rows_done == self.height
+        quantized = []
+        for plane, (recip, corr, shift) in zip(planes, self.layout.component_divisors):
+            negative = plane < 0
+            magnitude = np.abs(plane)
+            magnitude += corr
+            magnitude *= recip
+            magnitude >>= shift
+            np.negative(magnitude, out=magnitude, where=negative)
+            quantized.append(magnitude)
+        if len(quantized) == 1:
+            luma = quantized[0][:-(-rows // 8)]
+            return luma.reshape(-1, 64), np.zeros(luma.shape[0] * luma.shape[1], dtype=np.intp)
+
+        luma, cb, cr = quantized
+        if self.block_cols % 2:
+            # 右端のMCUの余りのブロック: AC 0、DCは左隣と同じ
+            dummy = np.zeros_like(luma[:, -1:])
+            dummy[:, :, 0] = luma[:, -1:, 0]
+            luma = np.concatenate([luma, dummy], axis=1)
+        if last and -(-rows // 8) % 2:
+            # 下端のMCUの余りのブロック行: AC 0、DCはMCU内の上の行の右端と同じ
+            luma[-1] = 0
+            luma[-1, :, 0] = np.repeat(luma[-2, 1::2, 0], 2)
+        mcu_rows, mcu_cols = cb.shape[:2]
+        luma = luma.reshape(mcu_rows, 2, mcu_cols, 2, 64).transpose(0, 2, 1, 3, 4)
+        mcus = np.concatenate([luma.reshape(mcu_rows, mcu_cols, 4, 64),
+                               cb[:, :, None], cr[:, :, None]], axis=2)
+        components = np.tile(np.array([0, 0, 0, 0, 1, 2], dtype=np.intp), mcu_rows * mcu_cols)
+        return mcus.reshape(-1, 64), components
+
+    def symbols(self, blocks: np.ndarray, components: np.ndarray) -> dict:
+        """
+        ブロック列をハフマン符号化の記号に分解
+
+        Returns:
+            dict: DC（ブロックごと）とAC（0以外の係数ごと）の記号の通し番号・付加ビット、
+                ブロックごとのEOBの有無
+        """
+        dc = blocks[:, 0]
+        diff = np.empty(len(dc), dtype=np.int32)
+        for component in range(len(self.last_dc)):
+            mask = components == component if len(self.last_dc) > 1 else slice(None)
+            values = dc[mask]
+            if values.size:
+                diff[mask] = np.diff(values, prepend=self.last_dc[component])
+                self.last_dc[component] = int(values[-1])
+        dc_bits = _NBITS[np.abs(diff)].astype(np.intp)
+
+        # 0以外のAC係数（位置はAC内の番号 = ジグザグ順の位置 - 1）
+        nonzero = blocks != 0
+        nonzero[:, 0] = False
+        flat_index = np.flatnonzero(nonzero)
+        block_index = flat_index >> 6
+        position = (flat_index & 63) - 1
+        values = blocks.reshape(-1)[flat_index]
+        first = np.ones(len(position), dtype=bool)
+        np.not_equal(block_index[1:], block_index[:-1], out=first[1:])
+        # 直前の0以外の係数との間の0の数
+        run = np.empty_like(position)
+        run[1:] = position[1:] - position[:-1] - 1
+        run[first] = position[first]
+        ac_bits = _NBITS[np.abs(values)].astype(np.intp)
+        last_position = np.zeros(len(blocks), dtype=np.intp)
+        is_last = np.ones(len(position), dtype=bool)
+        is_last[:-1] = first[1:]
+        last_position[block_index[is_last]] = position[is_last] + 1
+        ac_slots = self.ac_slots[components]
+        # 付加ビットは値の下位ビット（負の値は1を引く、x >> 31 は負なら-1）
+        return {
+            'dc_symbol': self.dc_slots[components] * 256 + dc_bits,
+            'dc_bits': dc_bits,
+            'dc_extra': ((diff + (diff >> 31)) & ((1 << dc_bits) - 1)).astype(np.uint64),
+            'ac_slots': ac_slots,
+            'block_index': block_index,
+            'first': first,
+            'zrl': run >> 4,
+            'ac_symbol': ac_slots[block_index] * 256 + (((run & 15) << 4) | ac_bits),
+            'ac_bits': ac_bits,
+            'ac_extra': ((values + (values >> 31)) & ((1 << ac_bits) - 1)).astype(np.uint64),
+            'eob': last_position != 63,
+        }
+
+
+class JpegStripStats:
+    """
+    ストリップ単位で量子化済み係数の記号の出現数を数える（複数の品質を1回の展開で集計）
+
+    最適なハフマン表（optimize=Trueと同じ表）と、その表で符号化した場合のサイズを求めるための
+    1回目の走査に使う。DCTは品質によらないため、品質ごとに行うのは量子化と集計のみ。
+    """
+
+    def __init__(self, width: int, height: int, mode: str, qualities: Sequence[int]):
+        """
+        初期化
+
+        Args:
+            width: 画像の幅
+            height: 画像の高さ
+            mode: ストリップのモード（"RGB" / "L"）
+            qualities: 集計する品質のリスト
+        """
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self._transform = _StripTransform(width, height, mode)
+        self._coders = {}
+        # 品質 -> 記号の通し番号ごとの出現数、付加ビットの合計
+        self._freq = {}
+        self._extra_bits = {}
+        self._tables = {}
+        for quality in dict.fromkeys(qualities):
+            coder = _StripCoder(_Layout(mode, quality), width, height)
+            self._coders[quality] = coder
+            self._freq[quality] = np.zeros(256 * len(coder.keys), dtype=np.int64)
+            self._extra_bits[quality] = 0
+
+    @property
+    def qualities(self) -> List[int]:
+        return list(self._coders)
+
+    def add(self, strip: Image.Image):
+        """ストリップを上から順に集計"""
+        planes = self._transform(strip)
+        for quality, coder in self._coders.items():
+            symbols = coder.symbols(*coder.quantize(planes, strip.height))
+            freq = self._freq[quality]
+            length = len(freq)
+            freq += np.bincount(symbols['dc_symbol'], minlength=length)
+            freq += np.bincount(symbols['ac_symbol'], minlength=length)
+            # ZRL（0xF0）とEOB（0x00）
+            ac_event_slots = symbols['ac_slots'][symbols['block_index']]
+            freq += np.bincount(ac_event_slots * 256 + 0xF0, weights=symbols['zrl'],
+                                minlength=length).astype(np.int64)
+            freq += np.bincount(symbols['ac_slots'][symbols['eob']] * 256, minlength=length)
+            self._extra_bits[quality] += int(symbols['dc_bits'].sum() + symbols['ac_bits'].sum())
+
+    def huffman_tables(self, quality: int) -> Dict[Tuple[int, int], _HuffmanTable]:
+        """画像全体の出現数から作った最適なハフマン表"""
+        if self._transform.rows_done != self.height:
+            raise ValueError("全ストリップを集計する前にハフマン表は作れません")
+        if quality not in self._tables:
+            freq = self._freq[quality]
+            self._tables[quality] = {key: _HuffmanTable.optimal(freq[256 * slot:256 * (slot + 1)])
+                                     for slot, key in enumerate(self._coders[quality].keys)}
+        return self._tables[quality]
+
+    def entropy_bits(self, quality: int) -> int:
+        """最適なハフマン表で符号化した場合のエントロピー符号化データのビット数（0xFFの後の0x00を除く）"""
+        tables = self.huffman_tables(quality)
+        sizes = np.concatenate([tables[key].sizes for key in self._coders[quality].keys])
+        return self._extra_bits[quality] + int((self._freq[quality] * sizes).sum())
+
+    def header_size(self, quality: int) -> int:
+        """ヘッダー（SOIからSOSまで）のバイト数"""
+        layout = self._coders[quality].layout
+        return len(layout.header(self.width, self.height, self.huffman_tables(quality)))
+
+    def minimum_size(self, quality: int) -> int:
+        """
+        最適なハフマン表で書き込んだ場合のファイルサイズ（0xFFの後に挿入する0x00を除く）
+
+        実際のサイズは挿入する0x00の数（通常はエントロピー符号化データの0.5%未満）だけ大きい。
+        正確なサイズはJpegStripWriterにf=Noneを渡して数える。
+        """
+        return self.header_size(quality) + -(-self.entropy_bits(quality) // 8) + len(EOI)
+
+
+class JpegStripWriter:
+    """
+    ストリップ単位でJPEGを書き込む
+
+    JpegStripStatsで求めた画像全体の最適なハフマン表を使い、ストリップごとに
+    量子化・ハフマン符号化したデータを順に書き込む。DC差分とビット列はストリップを
+    またいでつながるため、全体を1回でoptimize=Trueでエンコードした場合と同じバイト列になる。
+    保持するのは1ストリップ分のみのため、メモリ使用量は画像の幅に比例する。
+
+    最後以外のストリップの行数はSTRIP_ROW_MULTIPLEの倍数にする。
+    """
+
+    def __init__(self, f: BinaryIO, width: int, height: int, mode: str, quality: int,
+                 huffman: Dict[Tuple[int, int], _HuffmanTable]):
+        """
+        初期化
+
+        Args:
+            f: 書き込み先（バイナリモード、Noneならバイト数を数えるのみ）
+            width: 画像の幅
+            height: 画像の高さ（全ストリップの合計）
+            mode: ストリップのモード（"RGB" / "L"）
+            quality: 品質（1-100）
+            huffman: JpegStripStats.huffman_tables()の結果
+        """
+        self.f = f
+        self.height = height
+        self._transform = _StripTransform(width, height, mode)
+        layout = _Layout(mode, quality)
+        self._coder = _StripCoder(layout, width, height)
+        self._huffman = huffman
+        # 記号の通し番号 -> 符号・符号長
+        self._codes = np.concatenate([huffman[key].codes for key in self._coder.keys])
+        self._sizes = np.concatenate([huffman[key].sizes for key in self._coder.keys])
+        # 書き込み待ちの端数ビット
+        self._carry_value = 0
+        self._carry_bits = 0
+        self.bytes_written = 0
+        self._write(layout.header(width, height, huffman))
+
+    @property
+    def rows_written(self) -> int:
+        return self._transform.rows_done
+
+    def write(self, strip: Image.Image):
+        """ストリップを上から順に追加"""
+        planes = self._transform(strip)
+        symbols = self._coder.symbols(*self._coder.quantize(planes, strip.height))
+        values, sizes = self._events(symbols)
+        planes = symbols = None
+        self._write(self._pack(values, sizes))
+
+    def close(self) -> int:
+        """
+        端数ビットを1で埋めてEOIを書き込んで終了
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+        if self.rows_written != self.height:
+            raise ValueError(f"画像データが不足しています（{self.rows_written}/{self.height}行）")
+        if self._carry_bits:
+            padding = 8 - self._carry_bits
+            byte = (self._carry_value << padding) | ((1 << padding) - 1)
+            self._write(b'\xff\x00' if byte == 0xFF else bytes((byte,)))
+            self._carry_bits = 0
+        self._write(EOI)
+        return self.bytes_written
+
+    def _write(self, data: bytes):
+        if self.f is not None:
+            self.f.write(data)
+        self.bytes_written += len(data)
+
+    def _events(self, symbols: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ブロックごとに DC, (ZRL..., AC)..., EOB の順に並べた符号と付加ビット
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (符号と付加ビットをつなげた値, そのビット数)
+        """
+        ac_slots = symbols['ac_slots']
+        block_count = len(ac_slots)
+        block_index = symbols['block_index']
+        zrl = symbols['zrl']
+        eob = symbols['eob']
+
+        # ブロックごとの記号数と、各ブロックの先頭（DC）の位置
+        per_ac = zrl + 1
+        counts = 1 + np.bincount(block_index, weights=per_ac, minlength=block_count).astype(np.intp)
+        counts += eob
+        starts = np.zeros(block_count, dtype=np.intp)
+        np.cumsum(counts[:-1], out=starts[1:])
+        total = int(starts[-1] + counts[-1]) if block_count else 0
+        values = np.zeros(total, dtype=np.uint64)
+        sizes = np.zeros(total, dtype=np.intp)
+
+        dc_bits = symbols['dc_bits']
+        values[starts] = (self._codes[symbols['dc_symbol']] << dc_bits.astype(np.uint64)) | symbols['dc_extra']
+        sizes[starts] = self._sizes[symbols['dc_symbol']] + dc_bits
+
+        if len(block_index):
+            # ブロック内で何番目の記号か（ZRLを含む）
+            cumulative = np.cumsum(per_ac)
+            first_index = np.maximum.accumulate(np.where(symbols['first'],
+                                                         np.arange(len(per_ac)), 0))
+            within = cumulative - (cumulative[first_index] - per_ac[first_index])
+            positions = starts[block_index] + within
+            ac_bits = symbols['ac_bits']
+            ac_symbol = symbols['ac_symbol']
+            values[positions] = (self._codes[ac_symbol] << ac_bits.astype(np.uint64)) | symbols['ac_extra']
+            sizes[positions] = self._sizes[ac_symbol] + ac_bits
+            with_zrl = np.flatnonzero(zrl)
+            if with_zrl.size:
+                repeats = zrl[with_zrl]
+                offsets = np.arange(int(repeats.sum())) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+                zrl_positions = np.repeat(positions[with_zrl] - repeats, repeats) + offsets
+                zrl_symbol = np.repeat(ac_slots[block_index[with_zrl]] * 256 + 0xF0, repeats)
+                values[zrl_positions] = self._codes[zrl_symbol]
+                sizes[zrl_positions] = self._sizes[zrl_symbol]
+
+        eob_blocks = np.flatnonzero(eob)
+        if eob_blocks.size:
+            eob_symbol = ac_slots[eob_blocks] * 256
+            eob_positions = starts[eob_blocks] + counts[eob_blocks] - 1
+            values[eob_positions] = self._codes[eob_symbol]
+            sizes[eob_positions] = self._sizes[eob_symbol]
+        return values, sizes
+
+    def _pack(self, values: np.ndarray, sizes: np.ndarray) -> bytes:
+        """符号を上位ビットから詰めてバイト列にする（0xFFの後に0x00を挿入、端数ビットは次回へ）"""
+        if self._carry_bits:
+            values = np.concatenate([[np.uint64(self._carry_value)], values])
+            sizes = np.concatenate([[self._carry_bits], sizes])
+        ends = np.cumsum(sizes)
+        total_bits = int(ends[-1]) if len(ends) else 0
+        starts = ends - sizes
+        byte_index = starts >> 3
+        # 各符号を開始バイトから64ビットの窓の上位に置き、重ならないため加算で合成
+        window = values << (64 - (starts & 7) - sizes).astype(np.uint64)
+        length = (total_bits >> 3) + 8
+        out = np.zeros(length, dtype=np.int64)
+        for lane in range(5):
+            lane_bytes = (window >> np.uint64(56 - 8 * lane)) & np.uint64(0xFF)
+            out += np.bincount(byte_index + lane, weights=lane_bytes, minlength=length)[:length].astype(np.int64)
+        full = total_bits >> 3
+        self._carry_bits = total_bits & 7
+        self._carry_value = int(out[full]) >> (8 - self._carry_bits) if self._carry_bits else 0
+        data = out[:full].astype(np.uint8)
+        stuffing = np.flatnonzero(data == 0xFF)
+        if stuffing.size:
+            data = np.insert(data, stuffing + 1, 0)
+        return data.tobytes()
@@ -11,7 +11,7 @@ Version: 2.1.1 (CustomTkinter - Compact)
 
 import os
 import sys
-import threading
+import queue
 from pathlib import Path
 from typing import List, Optional
 import tkinter as tk
@@ -20,80 +20,58 @@ import customtkinter as ctk
 import windnd
 
 from image_converter import ImageConverter
+from decoded_image import DecodedImageCache
+from conversion_thread import ConversionThread
+from file_scanner import DirectoryScanner, OrderedFileIndex
+from file_list_store import FileListStore, STATUS_CONVERTED, STATUS_FAILED, STATUS_SKIPPED
+from file_list_view import VirtualFileList
+from instrumentation import Instrumentation, StageAggregator, format_stage_summary
 from preview_widget import PreviewWidget
-
-
-class ConversionThread:
-    """画像変換処理クラス"""
-    
-    def __init__(self, files: List[str], output_dir: str, 
-                 max_size_mb: int, quality: int, output_format: str = "JPEG", callback=None):
-        self.files = files
-        self.output_dir = output_dir
-        self.max_size_mb = max_size_mb
-        self.quality = quality
-        self.output_format = output_format
-        self.callback = callback
-        self.converter = ImageConverter()
-        
-    def start(self):
-        """変換処理開始"""
-        def conversion_worker():
-            total_files = len(self.files)
-            
-            for i, file_path in enumerate(self.files):
-                try:
-                    # ファイル名生成
-                    if self.output_format.upper() == "WEBP":
-                        file_name = Path(file_path).stem + '.webp'
-                    else:
-                        file_name = Path(file_path).stem + '.jpg'
-                    output_path = os.path.join(self.output_dir, file_name)
-                    
-                    # 変換実行
-                    if self.output_format.upper() == "WEBP":
-                        success = self.converter.convert_to_webp(
-                            file_path, output_path, self.max_size_mb, self.quality
-                        )
-                    else:
-                        success = self.converter.convert_to_jpeg(
-                            file_path, output_path, self.max_size_mb, self.quality
-                        )
-                    
-                    if success:
-                        if self.callback:
-                            self.callback("progress", i + 1, total_files)
-                            self.callback("processed", file_path, output_path)
-                    else:
-                        if self.callback:
-                            self.callback("error", f"変換失敗: {file_path}")
-                    
-                except Exception as e:
-                    if self.callback:
-                        self.callback("error", f"エラー: {file_path} - {str(e)}")
-            
-            if self.callback:
-                self.callback("completed", None, None)
-        
-        thread = threading.Thread(target=conversion_worker, daemon=True)
-        thread.start()
-        return thread
+from preview_prefetcher import PreviewPrefetcher
+from thumbnail_cache import ThumbnailCache
 
 
 class MainWindow(ctk.CTkFrame):
     """メインウィンドウ（ компакт版 ）"""
     
+    # ワーカースレッドからのイベントを処理する間隔（約30fps）
+    EVENT_POLL_INTERVAL_MS = 33
+    # 1回のポーリングで処理する最大イベント数（UIの応答性を保つ）
+    EVENT_POLL_MAX_EVENTS = 5000
+    # ログ表示に残す最大行数（古い行から削除）
+    LOG_MAX_LINES = 1000
+    # フォルダ選択時の走査パターン（サブフォルダも走査）
+    SCAN_INCLUDE = ("*.png",)
+    SCAN_EXCLUDE = ()
+    
     def __init__(self, master):
         super().__init__(master)
-        self.selected_files = []
+        self.selected_files = OrderedFileIndex()
+        # 一覧表示用のサイズ・寸法・変換状態（selected_filesと同じ順の列指向ストア）
+        self.file_store = FileListStore()
+        self.folder_scanner = None
         self.conversion_thread = None
         self.current_file_index = 0
-        self.converter = ImageConverter()
+        # ワーカースレッド -> Tkメインループのイベントキュー
+        self.event_queue = queue.Queue()
+        self.log_line_count = 0
+        # デコード結果をプレビュー・情報パネルで共有するキャッシュ
+        self.image_cache = DecodedImageCache(max_bytes=512 * 1024 * 1024)
+        # プレビュー画像のディスクキャッシュ（開いたことのあるフォルダは再デコードせずに表示）
+        self.thumbnail_cache = ThumbnailCache()
+        self.converter = ImageConverter(image_cache=self.image_cache,
+                                        thumbnail_cache=self.thumbnail_cache)
+        # 選択中のファイルの前後を先読み（読み込みはTkのスレッドで行わない）
+        self.prefetcher = PreviewPrefetcher(
+            self.converter, PreviewWidget.DISPLAY_SIZE,
+            lambda path, thumb, info: self.event_queue.put(("preview_ready", path, (thumb, info)))
+        )
         
         self.setup_styles()
         self.setup_ui()
         self.setup_callbacks()
         self.setup_responsive_handlers()
+        self.after(self.EVENT_POLL_INTERVAL_MS, self.poll_events)
         
     def setup_styles(self):
         """スタイルとフォントのセットアップ（元サイズに戻す）"""
@@ -131,7 +109,8 @@ class MainWindow(ctk.CTkFrame):
         # 右: ファイル選択（レイアウト変更対応）
         self.setup_file_selection_panel(top_container)
 
-        # --- 中段: プレビューエリア ---
+        # --- 中段: ファイル一覧とプレビューエリア ---
+        self.setup_file_list_area(self.main_scrollable)
         self.setup_preview_area(self.main_scrollable)
 
         # --- 下段: ログ ---
@@ -190,6 +169,30 @@ class MainWindow(ctk.CTkFrame):
         )
         quality_info.pack(pady=3)                # 5 -> 3
         
+        # 差分変換（出力フォルダのマニフェストで変更のないファイルをスキップ）
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.incremental_check = ctk.CTkCheckBox(
+            self.settings_frame, text="差分変換（変更のないファイルをスキップ）",
+            variable=self.incremental_var, font=self.info_font
+        )
+        self.incremental_check.pack(padx=12, pady=3, anchor="w")
+        
+        # 最低品質でも最大サイズを超える場合は解像度を下げて収める
+        self.fit_to_size_var = tk.BooleanVar(value=False)
+        self.fit_to_size_check = ctk.CTkCheckBox(
+            self.settings_frame, text="収まらない場合は縮小して最大サイズ以内にする",
+            variable=self.fit_to_size_var, font=self.info_font
+        )
+        self.fit_to_size_check.pack(padx=12, pady=3, anchor="w")
+        
+        # 処理段階ごとの所要時間を計測し、完了時にログへ内訳を表示
+        self.stage_timing_var = tk.BooleanVar(value=False)
+        self.stage_timing_check = ctk.CTkCheckBox(
+            self.settings_frame, text="処理時間の内訳をログに表示",
+            variable=self.stage_timing_var, font=self.info_font
+        )
+        self.stage_timing_check.pack(padx=12, pady=3, anchor="w")
+        
         # 出力先
         output_frame = ctk.CTkFrame(self.settings_frame, fg_color="transparent")
         output_frame.pack(fill="x", padx=12, pady=(3, 12))
@@ -235,6 +238,13 @@ class MainWindow(ctk.CTkFrame):
         )
         self.convert_webp_btn.pack(side="right", fill="x", expand=True, padx=(4, 0))
         
+        # 1回のデコードでJPEGとWebPを同時に出力
+        self.convert_multi_btn = ctk.CTkButton(
+            convert_btn_frame, text="🚀 JPEG + WebPに同時変換", font=self.button_font,
+            height=35, command=self.start_conversion_multi
+        )
+        self.convert_multi_btn.pack(fill="x", pady=(6, 0))
+        
     def setup_file_selection_panel(self, parent):
         """ファイル選択パネル（レイアウト変更版：左側欄、右側3ボタン縦配置）"""
         self.file_frame = ctk.CTkFrame(parent)
@@ -313,13 +323,37 @@ class MainWindow(ctk.CTkFrame):
         self.progress_bar.set(0)
         self.progress_bar.pack(fill="x", pady=(8, 0))
         
+    def setup_file_list_area(self, parent):
+        """ファイル一覧（表示中の行のみ描画するため大量のファイルでも重くならない）"""
+        self.file_list_frame = ctk.CTkFrame(parent)
+        self.file_list_frame.pack(fill="x", padx=15, pady=8)
+
+        title = ctk.CTkLabel(self.file_list_frame, text="📋 ファイル一覧", font=self.group_title_font)
+        title.pack(pady=(12, 4))
+
+        self.file_list = VirtualFileList(self.file_list_frame, self.file_store,
+                                         on_select=self.select_file_index)
+        self.file_list.pack(fill="x", padx=12, pady=(4, 12))
+        
     def setup_preview_area(self, parent):
         """プレビューエリア（改善版：左側元画像、右側変換後画像 + 情報パネル）"""
         self.preview_frame = ctk.CTkFrame(parent)
         self.preview_frame.pack(fill="both", expand=True, padx=15, pady=8)
 
         title = ctk.CTkLabel(self.preview_frame, text="👁️ プレビュー", font=self.group_title_font)
-        title.pack(pady=(12, 8))
+        title.pack(pady=(12, 4))
+
+        # 前後のファイルへの移動（前後のプレビューは先読み済み）
+        nav_frame = ctk.CTkFrame(self.preview_frame, fg_color="transparent")
+        nav_frame.pack(pady=(0, 6))
+        self.prev_file_btn = ctk.CTkButton(nav_frame, text="◀", width=36, height=26,
+                                           font=self.button_font, command=self.show_previous_file)
+        self.prev_file_btn.pack(side="left")
+        self.file_position_label = ctk.CTkLabel(nav_frame, text="", width=110, font=self.info_font)
+        self.file_position_label.pack(side="left", padx=6)
+        self.next_file_btn = ctk.CTkButton(nav_frame, text="▶", width=36, height=26,
+                                           font=self.button_font, command=self.show_next_file)
+        self.next_file_btn.pack(side="left")
 
         # スクロール可能なプレビューコンテナ
         self.preview_scrollable = ctk.CTkScrollableFrame(self.preview_frame)
@@ -334,7 +368,8 @@ class MainWindow(ctk.CTkFrame):
         left_original.pack(side="left", fill="both", expand=False, padx=(0, 4))
         left_original.pack_propagate(False)
 
-        self.original_preview = PreviewWidget(left_original, "元画像 (PNG)")
+        self.original_preview = PreviewWidget(left_original, "元画像 (PNG)",
+                                             thumbnail_cache=self.thumbnail_cache)
         self.original_preview.pack(fill="both", expand=True)
 
         # 中央: 矢印（Compact）
@@ -350,7 +385,8 @@ class MainWindow(ctk.CTkFrame):
         right_converted.pack(side="left", fill="both", expand=False, padx=(4, 8))
         right_converted.pack_propagate(False)
 
-        self.converted_preview = PreviewWidget(right_converted, "変換後 (選択形式)")
+        self.converted_preview = PreviewWidget(right_converted, "変換後 (選択形式)",
+                                              thumbnail_cache=self.thumbnail_cache)
         self.converted_preview.pack(fill="both", expand=True)
 
         # 右端: 情報パネル（縮小）
@@ -429,6 +465,18 @@ class MainWindow(ctk.CTkFrame):
         self.progress_bar.set(0)
         self.progress_bar.pack(anchor="w", pady=(0, 4))
         
+        # 進捗件数（ログに1件ずつ書かずここに表示）
+        self.progress_label = ctk.CTkLabel(progress_section, text="", font=self.info_font, anchor="w")
+        self.progress_label.pack(anchor="w")
+        
+        # 中止ボタン（変換中のみ有効）
+        self.cancel_btn = ctk.CTkButton(
+            progress_section, text="中止", font=self.button_font,
+            fg_color="#ef4444", hover_color="#dc2626", width=200, height=28,
+            command=self.cancel_conversion, state="disabled"
+        )
+        self.cancel_btn.pack(anchor="w", pady=(0, 4))
+        
     def setup_responsive_handlers(self):
         """レスポンシブ対応とリサイズハンドラー"""
         # 親ウィンドウのリサイズイベントを取得
@@ -505,10 +553,12 @@ class MainWindow(ctk.CTkFrame):
         self.original_preview.clear()
         self.converted_preview.clear()
         self.update_config_info()
+        self.update_file_position()
         
         # ボタンを確実に表示・アクティブに
         self.convert_jpeg_btn.configure(state="normal")
         self.convert_webp_btn.configure(state="normal")
+        self.convert_multi_btn.configure(state="normal")
         print(f"初期化完了: JPEGボタン={self.convert_jpeg_btn.cget('state')}, WebPボタン={self.convert_webp_btn.cget('state')}")
         
     def setup_drop_handlers(self, drop_container):
@@ -595,16 +645,23 @@ class MainWindow(ctk.CTkFrame):
     def select_folder(self):
         folder = filedialog.askdirectory(title="フォルダを選択")
         if folder:
-            png_files = []
-            for ext in ['*.png', '*.PNG']:
-                png_files.extend(Path(folder).glob(ext))
+            self.start_folder_scan(folder, set_output=True)
             
-            if png_files:
-                self.add_files([str(f) for f in png_files])
-                self.output_path_label.configure(text=folder)
-                self.append_log(f"出力先を自動設定: {folder}")
-            else:
-                messagebox.showinfo("情報", "PNGファイルが見つかりません。")
+    def start_folder_scan(self, folder: str, set_output: bool = False):
+        """フォルダをバックグラウンドで再帰走査し、見つかったPNGを順次追加"""
+        if self.folder_scanner is not None:
+            self.folder_scanner.cancel()
+            
+        scanner = DirectoryScanner(folder, include=self.SCAN_INCLUDE, exclude=self.SCAN_EXCLUDE)
+        self.folder_scanner = scanner
+        self.append_log(f"フォルダを走査中: {folder}")
+        
+        # 走査スレッドからはキュー経由でメインスレッドに渡す
+        scanner.start(
+            lambda chunk: self.event_queue.put(("scan_chunk", scanner, chunk)),
+            lambda found: self.event_queue.put(("scan_done", scanner, (folder, found, set_output))),
+            with_size=True
+        )
                 
     def select_output_folder(self):
         folder = filedialog.askdirectory(title="出力先を選択")
@@ -612,20 +669,59 @@ class MainWindow(ctk.CTkFrame):
             self.output_path_label.configure(text=folder)
             self.check_convert_button_state()
             
-    def add_files(self, files: List[str]):
-        new = [f for f in files if f.lower().endswith('.png') and f not in self.selected_files and os.path.exists(f)]
+    def add_files(self, files: List[str], check_exists: bool = True, log: bool = True,
+                  sizes: Optional[List[int]] = None):
+        """
+        ファイルを追加
+        
+        Args:
+            files: ファイルパス
+            check_exists: PNGかつ存在するもののみ追加するか
+            log: ログに件数を出し、追加した先頭のファイルをプレビューするか
+            sizes: filesと同じ順のファイルサイズ（走査時に取得済みの場合、None時はここで取得）
+        """
+        if check_exists:
+            files = [f for f in files if f.lower().endswith('.png') and f not in self.selected_files
+                     and os.path.exists(f)]
+        was_empty = len(self.selected_files) == 0
+        new = self.selected_files.extend(files)
         if new:
-            self.selected_files.extend(new)
+            if sizes is not None and len(new) != len(files):
+                # 既に追加済みのパスを除いた分のサイズのみ使う
+                size_of = dict(zip(files, sizes))
+                sizes = [size_of[f] for f in new]
+            self.file_store.append(new, sizes if sizes is not None else
+                                   [self._file_size(f) for f in new])
             self.update_file_count()
-            self.append_log(f"{len(new)}個のファイルを追加しました")
+            if log:
+                self.append_log(f"{len(new)}個のファイルを追加しました")
             
-            # プレビュー更新（元版本）
-            self.update_preview_for_file(new[0])
+            # プレビュー更新（走査中の追加分は最初の1件のみ）
+            if log or was_empty:
+                self.update_preview_for_file(new[0], len(self.selected_files) - len(new))
+            else:
+                self.update_file_position()
             self.check_convert_button_state()
             
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return -1
+            
     def clear_files(self):
+        if self.folder_scanner is not None:
+            self.folder_scanner.cancel()
+            self.folder_scanner = None
         self.selected_files.clear()
+        self.file_store.clear()
+        self.file_list.select_row(None)
+        self.image_cache.clear()
+        self.prefetcher.clear()
+        self.current_file_index = 0
         self.update_file_count()
+        self.update_file_position()
         # プレビュー画像を完全にクリア
         self.original_preview.clear()
         self.converted_preview.clear()
@@ -646,10 +742,23 @@ class MainWindow(ctk.CTkFrame):
         state = "normal" if can else "disabled"
         self.convert_jpeg_btn.configure(state=state)
         self.convert_webp_btn.configure(state=state)
+        self.convert_multi_btn.configure(state=state)
         print(f"ボタン状態更新: {state} (ファイル数: {len(self.selected_files)}, 出力先: {self.output_path_label.cget('text')})")
         
     def append_log(self, msg):
-        self.log_text.insert("end", f"> {msg}\n")
+        self.append_log_lines([msg])
+        
+    def append_log_lines(self, messages: List[str]):
+        """複数行をまとめてログに追加（LOG_MAX_LINESを超えた古い行は削除）"""
+        if not messages:
+            return
+        self.log_text.insert("end", "".join(f"> {msg}\n" for msg in messages))
+        self.log_line_count += len(messages)
+        
+        excess = self.log_line_count - self.LOG_MAX_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_line_count -= excess
         self.log_text.see("end")
         
     def start_conversion_jpeg(self):
@@ -660,7 +769,11 @@ class MainWindow(ctk.CTkFrame):
         """WebP変換開始"""
         self._start_conversion("WEBP")
         
-    def _start_conversion(self, output_format):
+    def start_conversion_multi(self):
+        """JPEG・WebP同時変換開始（同じサイズ・品質設定で1回だけデコード）"""
+        self._start_conversion("JPEG", multi_formats=("JPEG", "WEBP"))
+        
+    def _start_conversion(self, output_format, multi_formats=None):
         # 変換前にエラーチェック
         if not self.selected_files:
             messagebox.showwarning("警告", "変換するファイルを選択してください。")
@@ -677,50 +790,229 @@ class MainWindow(ctk.CTkFrame):
             return
         
         self.progress_bar.set(0)
+        self.progress_label.configure(text="")
         self.convert_jpeg_btn.configure(state="disabled", text="変換中...")
         self.convert_webp_btn.configure(state="disabled", text="変換中...")
-        format_text = "JPEG" if output_format == "JPEG" else "WebP"
+        self.convert_multi_btn.configure(state="disabled", text="変換中...")
+        max_size_mb = int(self.size_slider.get())
+        quality = int(self.quality_slider.get())
+        targets = None
+        if multi_formats:
+            targets = [{'format': fmt, 'max_size_mb': max_size_mb, 'quality': quality}
+                       for fmt in multi_formats]
+            format_text = " + ".join("JPEG" if fmt == "JPEG" else "WebP" for fmt in multi_formats)
+        else:
+            format_text = "JPEG" if output_format == "JPEG" else "WebP"
         self.append_log(f"{format_text}変換プロセス開始...")
+        # 変換中は先読みを止める（選択中のファイルのプレビューのみ読み込む）
+        self.prefetcher.pause()
+        self.file_store.reset_status()
+        
+        instrumentation = None
+        if self.stage_timing_var.get():
+            instrumentation = Instrumentation([StageAggregator()])
         
         self.conversion_thread = ConversionThread(
-            self.selected_files, output_dir,
-            int(self.size_slider.get()), int(self.quality_slider.get()),
+            list(self.selected_files), output_dir,
+            max_size_mb, quality,
             output_format,
-            self.conversion_callback
+            self.conversion_callback,
+            incremental=self.incremental_var.get(),
+            instrumentation=instrumentation,
+            fit_to_size=self.fit_to_size_var.get(),
+            targets=targets
         )
         self.conversion_thread.start()
+        self.cancel_btn.configure(state="normal")
+        
+    def cancel_conversion(self):
+        """変換中止（実行中のファイルが終わり次第停止）"""
+        if self.conversion_thread:
+            self.conversion_thread.cancel()
+            self.cancel_btn.configure(state="disabled")
+            self.append_log("中止しています...")
         
     def conversion_callback(self, etype, p1, p2):
-        if etype == "progress":
-            self.progress_bar.set(p1 / p2)
-            self.append_log(f"進捗: {p1}/{p2}")
+        """変換スレッドから呼ばれる（ウィジェットには触れずキューに積むだけ）"""
+        self.event_queue.put((etype, p1, p2))
+        
+    def poll_events(self):
+        """キューに溜まったイベントをメインスレッドでまとめて処理"""
+        log_lines = []
+        progress = None
+        
+        def flush():
+            nonlocal log_lines, progress
+            if progress is not None:
+                done, total = progress
+                self.progress_bar.set(done / total if total else 0)
+                self.progress_label.configure(text=f"{done} / {total}")
+                progress = None
+            self.append_log_lines(log_lines)
+            log_lines = []
+            
+        try:
+            for _ in range(self.EVENT_POLL_MAX_EVENTS):
+                try:
+                    etype, p1, p2 = self.event_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if etype == "progress":
+                    # 進捗は最新値のみ反映
+                    progress = (p1, p2)
+                    continue
+                if etype == "completed":
+                    # 完了ダイアログより前に進捗とログを反映
+                    flush()
+                self.handle_event(etype, p1, p2, log_lines)
+            flush()
+            # 一覧は変更があった場合のみ表示中の行を描き直す
+            self.file_list.refresh()
+        except Exception as e:
+            print(f"イベント処理エラー: {e}")
+        finally:
+            self.after(self.EVENT_POLL_INTERVAL_MS, self.poll_events)
+            
+    def handle_event(self, etype, p1, p2, log_lines: List[str]):
+        """変換・走査イベントを処理（ログ行はlog_linesに追加してまとめて反映）"""
+        if etype == "scan_chunk":
+            # 中止・クリア済みの走査結果は捨てる
+            if p1 is self.folder_scanner:
+                paths = [path for path, _ in p2]
+                self.add_files(paths, check_exists=False, log=False,
+                               sizes=[size for _, size in p2])
+        elif etype == "scan_done":
+            if p1 is self.folder_scanner:
+                folder, found, set_output = p2
+                self.folder_scanner = None
+                log_lines.append(f"{found}個のPNGファイルが見つかりました")
+                if found and set_output:
+                    self.output_path_label.configure(text=folder)
+                    self.check_convert_button_state()
+                    log_lines.append(f"出力先を自動設定: {folder}")
+                elif not found:
+                    messagebox.showinfo("情報", "PNGファイルが見つかりません。")
         elif etype == "processed":
-            self.append_log(f"✓ 完了: {os.path.basename(p1)}")
+            self.file_store.update(p1, status=STATUS_CONVERTED)
+            log_lines.append(f"✓ 完了: {os.path.basename(p1)}")
+        elif etype == "result":
+            # 複数形式の場合は形式ごとに1行
+            outputs = p2['outputs'].items() if 'outputs' in p2 else [(None, p2)]
+            self.file_store.update(
+                p1, size=p2.get('input_size'),
+                output_bytes=sum(result.get('output_size', 0) for _, result in outputs))
+            for output_format, result in outputs:
+                limit_note = "" if result.get('within_limit', True) else "（サイズ超過）"
+                if result.get('scale', 1.0) < 1.0:
+                    limit_note += f"（{result['scale'] * 100:.0f}%に縮小）"
+                format_note = f"{output_format}: " if output_format else ""
+                log_lines.append(f"   {format_note}品質 {result['quality']}% / "
+                                 f"エンコード {result['encodes']}回 / "
+                                 f"{result['output_size'] / 1024:.0f} KB{limit_note}")
+        elif etype == "skipped":
+            self.file_store.update(p1, status=STATUS_SKIPPED)
         elif etype == "error":
-            self.append_log(f"❌ {p1}")
+            if p2:
+                self.file_store.update(p2, status=STATUS_FAILED)
+            log_lines.append(f"❌ {p1}")
+        elif etype == "stages":
+            log_lines.extend(format_stage_summary(p1))
+        elif etype == "summary":
+            log_lines.append(f"📊 変換 {p1['converted']}件 / スキップ {p1['skipped']}件 / "
+                             f"再変換（古い出力） {p1['stale']}件 / 失敗 {p1['failed']}件")
+            if p1['converted'] and p1.get('encodes_saved'):
+                log_lines.append(f"   品質の予測によりエンコード回数を1ファイルあたり平均"
+                                 f"{p1['encodes_saved'] / p1['converted']:.1f}回削減")
+        elif etype == "cancelled":
+            log_lines.append(f"⏹ 変換を中止しました（{p1}/{p2}）")
+        elif etype == "preview_ready":
+            # 先読みスレッドの読み込み完了（その間に選択が変わっていれば表示しない）
+            thumb, info = p2
+            if info is not None:
+                self.file_store.update(p1, size=info.get('file_size'),
+                                       width=info.get('width'), height=info.get('height'))
+            if p1 == self.current_file_path:
+                if thumb is not None:
+                    self.show_preview(p1, thumb, info)
+                else:
+                    self.original_preview.show_error("画像の読み込みに失敗しました")
+                    log_lines.append(f"プレビュー生成失敗: {p1}")
         elif etype == "completed":
-            self.append_log("✨ 全ての変換が正常に完了しました！")
+            self.prefetcher.resume()
+            cancelled = self.conversion_thread is not None and self.conversion_thread.engine.cancelled
             self.convert_jpeg_btn.configure(state="normal", text="🚀 JPEGに変換")
             self.convert_webp_btn.configure(state="normal", text="🚀 WebPに変換")
-            messagebox.showinfo("完了", "全ての変換が完了しました！")
+            self.convert_multi_btn.configure(state="normal", text="🚀 JPEG + WebPに同時変換")
+            self.cancel_btn.configure(state="disabled")
+            if cancelled:
+                messagebox.showinfo("中止", "変換を中止しました。")
+            else:
+                self.append_log("✨ 全ての変換が正常に完了しました！")
+                messagebox.showinfo("完了", "全ての変換が完了しました！")
+            
+    @property
+    def current_file_path(self) -> Optional[str]:
+        """プレビュー中のファイル（なければNone）"""
+        if 0 <= self.current_file_index < len(self.selected_files):
+            return self.selected_files[self.current_file_index]
+        return None
+        
+    def show_previous_file(self):
+        self.select_file_index(self.current_file_index - 1)
+        
+    def show_next_file(self):
+        self.select_file_index(self.current_file_index + 1)
+        
+    def select_file_index(self, index: int):
+        """指定位置のファイルをプレビュー"""
+        if 0 <= index < len(self.selected_files):
+            self.update_preview_for_file(self.selected_files[index], index)
             
-    def update_preview_for_file(self, path: str):
+    def update_file_position(self):
+        count = len(self.selected_files)
+        text = f"{self.current_file_index + 1} / {count}" if count else ""
+        self.file_position_label.configure(text=text)
+        self.prev_file_btn.configure(state="normal" if self.current_file_index > 0 else "disabled")
+        self.next_file_btn.configure(
+            state="normal" if self.current_file_index < count - 1 else "disabled")
+        
+    def update_preview_for_file(self, path: str, index: Optional[int] = None):
+        """
+        プレビューを表示（先読み済みなら即座に、未読み込みなら先読みスレッドの完了後に表示）
+        
+        Args:
+            path: 画像ファイルパス
+            index: selected_files内の位置（None時は検索）
+        """
         try:
-            if not path or not os.path.exists(path):
+            if not path:
                 return
-                
-            img = self.converter.create_preview(path)
-            if img is not None:
-                self.original_preview.set_image(path, img)
-                self.update_file_info_panel(path)
-                self.converted_preview.show_placeholder()
+            if index is None:
+                index = self.selected_files.index(path)
+            self.current_file_index = index
+            self.update_file_position()
+            self.file_list.select_row(index)
+            
+            # ヘッダー解析と表示サイズへの縮小デコードは先読みスレッドで1回だけ行い、
+            # プレビュー・情報パネルで共有
+            # get()で取り出せなかった場合は、直後に読み込みが完了していてもfocus()から通知される
+            cached = self.prefetcher.get(path)
+            if cached is not None:
+                self.show_preview(path, *cached)
             else:
-                self.append_log(f"プレビュー生成失敗: {path}")
+                self.original_preview.show_loading()
+            self.prefetcher.focus(self.selected_files, index, deliver_loaded=cached is None)
                 
         except Exception as e:
             print(f"プレビューエラー: {e}")
             self.append_log(f"プレビューエラー: {e}")
             
+    def show_preview(self, path: str, thumb, info: dict):
+        """読み込み済みのプレビューを表示"""
+        self.original_preview.set_image(path, thumb, info)
+        self.update_file_info_panel(path, info)
+        self.converted_preview.show_placeholder()
+            
     def _get_output_path(self, png, format_type="JPEG"):
         """出力ファイルパスを取得"""
         p = Path(png)
@@ -729,13 +1021,19 @@ class MainWindow(ctk.CTkFrame):
         else:
             return str(p.parent / f"{p.stem}.jpg")
     
-    def update_file_info_panel(self, path: str):
+    def update_file_info_panel(self, path: str, info: Optional[dict] = None):
         try:
             f = Path(path)
             sz = f.stat().st_size / (1024 * 1024)
-            info = self.converter.get_image_info(path)
+            if info is None:
+                info = self.converter.get_image_info(path)
             if info:
-                txt = f"📄 {f.name}\n\n📏 {info['width']} x {info['height']}\n🎨 {info['channels']} ch\n💾 {sz:.2f} MB\n📂 {f.parent}"
+                color = f"{info['channels']} ch"
+                if info.get('bit_depth'):
+                    color += f" / {info['bit_depth']}bit"
+                if info.get('has_alpha'):
+                    color += " / 透過あり"
+                txt = f"📄 {f.name}\n\n📏 {info['width']} x {info['height']}\n🎨 {color}\n💾 {sz:.2f} MB\n📂 {f.parent}"
             else: txt = "情報取得不可"
             self.file_info_label.configure(text=txt)
             self.update_config_info()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+メモリ予算スケジューラー
+ヘッダーの画像サイズから変換時の使用メモリを見積もり、合計が予算内に収まる分だけ並列実行する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import sys
+import threading
+from typing import Optional
+
+from image_converter import LARGE_IMAGE_PIXELS
+from image_probe import probe_image
+from jpeg_strip_writer import STRIP_ROW_MULTIPLE
+from png_strip_reader import READ_CHUNK, STRIP_BYTES
+
+
+# 予算を自動設定する場合の物理メモリに対する割合
+DEFAULT_BUDGET_RATIO = 0.5
+
+# 物理メモリが取得できない場合の予算
+FALLBACK_BUDGET_BYTES = 2 * 1024 * 1024 * 1024
+
+# ヘッダーを解析できない入力の見積もり（圧縮後サイズに対する倍率）
+UNKNOWN_EXPANSION = 12
+
+# ストリップ単位のJPEG変換で、ストリップ1画素あたりの使用メモリ
+# （展開・合成・色変換・DCT・量子化・ハフマン符号化の作業領域（実測で64-75バイト）と断片化の余裕）
+STREAM_BYTES_PER_PIXEL = 96
+
+
+def physical_memory_bytes() -> Optional[int]:
+    """物理メモリ量（取得できない場合はNone）"""
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(status)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullTotalPhys)
+        except Exception:
+            return None
+        return None
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_budget() -> int:
+    """既定のメモリ予算（物理メモリの半分）"""
+    total = physical_memory_bytes()
+    if not total:
+        return FALLBACK_BUDGET_BYTES
+    return int(total * DEFAULT_BUDGET_RATIO)
+
+
+def estimate_working_set(path: str, header: Optional[dict] = None,
+                         large_image_pixels: int = LARGE_IMAGE_PIXELS, outputs: int = 1,
+                         streamed_jpeg: bool = False) -> int:
+    """
+    1ファイルの変換に必要なメモリ量を見積もり
+
+    次の3段階のうち最大のものを返す。
+    - デコード: 圧縮データ + デコード後の配列（16bitはデコード時に倍）
+    - PILへの受け渡し: デコード後の配列 + Pillow側の画像（1画素4バイト）
+    - エンコード: Pillow側の画像 + エンコーダー内部のバッファ（optimize時は最大1画素2バイト）
+      + 試行用・採用候補用のバッファ（1画素1バイトずつ）
+    ストリップ読み込みの対象（巨大な8bitのPNG）はデコード後の配列を作らないため、エンコードのみ。
+    さらにJPEGのみへの変換（streamed_jpeg）ではストリップ単位でエンコードするため、
+    1ストリップの作業領域（画像の幅に比例）のみ。
+    複数形式に同時変換する場合、エンコーダー内部・試行用のバッファは形式の数だけ、
+    Pillow側の画像は透過がある場合に背景色合成用とアルファ付きの2枚になる。
+
+    Args:
+        path: 入力ファイルパス
+        header: probe_imageの結果（Noneの場合は解析する）
+        large_image_pixels: ImageConverterのストリップ読み込みのしきい値
+        outputs: 同時にエンコードする出力形式の数
+        streamed_jpeg: JPEGのみへの変換で、縮小して収める可能性がないか
+
+    Returns:
+        int: 見積もりバイト数
+    """
+    if header is None:
+        header = probe_image(path)
+    if header is None:
+        try:
+            return os.path.getsize(path) * UNKNOWN_EXPANSION
+        except OSError:
+            return 0
+
+    pixels = header['width'] * header['height']
+    images = 2 if outputs > 1 and header.get('has_alpha') else 1
+    encode = pixels * (4 * images + (2 + 2) * max(1, outputs))
+    bit_depth = header.get('bit_depth') or 8
+    if (large_image_pixels and header['format'] == 'PNG' and bit_depth == 8
+            and pixels >= large_image_pixels):
+        if streamed_jpeg:
+            # 1ストリップはPNGの展開後のデータでSTRIP_BYTES前後（PngStripReader.default_strip_rows）
+            sample_bytes = 1 if header.get('color_type') == 3 else max(1, header.get('channels') or 3)
+            rows = max(1, STRIP_BYTES // (header['width'] * sample_bytes))
+            rows = -(-rows // STRIP_ROW_MULTIPLE) * STRIP_ROW_MULTIPLE
+            return READ_CHUNK + header['width'] * rows * STREAM_BYTES_PER_PIXEL
+        return encode
+
+    channels = 4 if header.get('has_alpha') else max(1, header.get('channels') or 3)
+    decoded = pixels * channels
+    if bit_depth > 8:
+        decoded *= 2
+    return max(header.get('file_size', 0) + decoded, decoded + pixels * 4, encode)
+
+
+class MemoryScheduler:
+    """
+    見積もりメモリの合計が予算を超えないよう変換の開始を制御
+
+    実行中のタスクがない場合は予算を超える1件も開始を許可するため、
+    巨大な画像は単独で、小さな画像は並列数の上限まで同時に実行される。
+    """
+
+    def __init__(self, budget_bytes: int):
+        """
+        初期化
+
+        Args:
+            budget_bytes: メモリ予算（バイト）
+        """
+        self.budget_bytes = max(1, int(budget_bytes))
+        self.in_use = 0
+        self.running = 0
+        # 統計（見積もりの最大同時使用量・予算超過で単独実行した件数）
+        self.peak_bytes = 0
+        self.serialized = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost: int) -> bool:
+        """
+        予算内なら確保
+
+        Args:
+            cost: 見積もりバイト数
+
+        Returns:
+            bool: 開始してよい場合True
+        """
+        with self._lock:
+            if self.running and self.in_use + cost > self.budget_bytes:
+                return False
+            if cost > self.budget_bytes:
+                self.serialized += 1
+            self.in_use += cost
+            self.running += 1
+            self.peak_bytes = max(self.peak_bytes, self.in_use)
+            return True
+
+    def release(self, cost: int):
+        """完了したタスクの分を解放"""
+        with self._lock:
+            self.in_use -= cost
+            self.running -= 1
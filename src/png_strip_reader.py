@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+PNGストリップ読み込み
+巨大なPNGを数百行ずつ展開し、全画素のnumpy配列を作らずにストリップ単位で渡す
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import io
+import struct
+import zlib
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from decoded_image import composite_on_matte, is_opaque
+from instrumentation import NULL_TIMER
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# カラータイプ -> 1画素のバイト数（ビット深度8のみ対応）
+BYTES_PER_PIXEL = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# 1回に展開する行数の目安（1ストリップのバイト数がこれを超えないよう調整）
+STRIP_BYTES = 1 * 1024 * 1024
+
+# ファイルの読み込み単位
+READ_CHUNK = 1024 * 1024
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """PNGチャンクを組み立て"""
+    crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', crc)
+
+
+def _iter_chunks(f):
+    """PNGチャンクを順に返す（IDATは本体を読みながら返す）"""
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            return
+        length, chunk_type = struct.unpack('>I4s', head)
+        if chunk_type == b'IDAT':
+            yield chunk_type, length
+        else:
+            yield chunk_type, f.read(length)
+            f.seek(4, io.SEEK_CUR)
+            if chunk_type == b'IEND':
+                return
+
+
+class PngStripReader:
+    """
+    非インターレース・ビット深度8のPNGを行単位で展開する読み込み器
+
+    各ストリップは「直前の行（展開済み・フィルターなし）+ ストリップの行」を
+    圧縮なしのPNGとして組み立て、フィルター解除をPillowのデコーダーに任せる。
+    これにより1画素ずつのPython処理を行わずに、メモリ使用量を
+    ストリップ分（画像の幅に比例）に抑える。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.width = 0
+        self.height = 0
+        self.color_type = -1
+        self.supported = False
+        self._ihdr = b''
+        self._extra_chunks = b''
+        # 読み込んだ範囲に透過画素があったか（iter_strips()の途中で更新）
+        self.has_alpha = False
+        self._read_header()
+
+    def _read_header(self):
+        with open(self.path, 'rb') as f:
+            if f.read(8) != PNG_SIGNATURE:
+                return
+            for chunk_type, data in _iter_chunks(f):
+                if chunk_type == b'IHDR':
+                    self._ihdr = data
+                    (self.width, self.height, bit_depth, self.color_type,
+                     _, _, interlace) = struct.unpack('>IIBBBBB', data)
+                    self.supported = (bit_depth == 8 and interlace == 0
+                                      and self.color_type in BYTES_PER_PIXEL)
+                elif chunk_type in (b'PLTE', b'tRNS'):
+                    # 色の解釈に必要なチャンクは各ストリップにも付ける
+                    self._extra_chunks += _chunk(chunk_type, data)
+                elif chunk_type == b'IDAT':
+                    return
+
+    @property
+    def has_alpha_channel(self) -> bool:
+        """アルファ（tRNSを含む）を持つ形式か"""
+        return self.color_type in (4, 6) or b'tRNS' in self._extra_chunks
+
+    @property
+    def row_bytes(self) -> int:
+        """フィルター種別1バイトを含む1行のバイト数"""
+        return 1 + self.width * BYTES_PER_PIXEL[self.color_type]
+
+    def default_strip_rows(self, multiple: int = 1) -> int:
+        """STRIP_BYTESに収まる行数（multipleの倍数に切り上げ）"""
+        rows = max(1, STRIP_BYTES // self.row_bytes)
+        return -(-rows // multiple) * multiple
+
+    def output_mode(self, keep_alpha: bool) -> str:
+        """iter_strips()が返すストリップのモード"""
+        alpha_source = self.has_alpha_channel
+        if alpha_source and keep_alpha:
+            return 'RGBA'
+        if self.color_type == 0 and not alpha_source:
+            return 'L'
+        return 'RGB'
+
+    def _iter_rows(self, strip_rows: int):
+        """IDATを少しずつ展開し、strip_rows行分のフィルター済みデータを返す"""
+        row_bytes = self.row_bytes
+        strip_bytes = strip_rows * row_bytes
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        with open(self.path, 'rb') as f:
+            f.seek(8)
+            for chunk_type, length in _iter_chunks(f):
+                if chunk_type != b'IDAT':
+                    continue
+                remaining = length
+                while remaining:
+                    block = f.read(min(READ_CHUNK, remaining))
+                    if not block:
+                        raise ValueError("IDATが途中で終わっています")
+                    remaining -= len(block)
+                    pending += decompressor.decompress(block)
+                    while len(pending) >= strip_bytes:
+                        yield bytes(pending[:strip_bytes])
+                        del pending[:strip_bytes]
+                f.seek(4, io.SEEK_CUR)
+        pending += decompressor.flush()
+        if pending:
+            usable = len(pending) - len(pending) % row_bytes
+            if usable:
+                yield bytes(pending[:usable])
+
+    def _decode_strip(self, previous_row: Optional[bytes], filtered: bytes) -> Image.Image:
+        """前の行を付けたストリップをPNGとしてデコード（前の行は除いて返す）"""
+        rows = len(filtered) // self.row_bytes
+        data = filtered
+        if previous_row is not None:
+            # 前の行はフィルターなし（種別0）で先頭に置く
+            data = b'\x00' + previous_row + filtered
+            rows += 1
+        ihdr = struct.pack('>II', self.width, rows) + self._ihdr[8:]
+        png = (PNG_SIGNATURE + _chunk(b'IHDR', ihdr) + self._extra_chunks
+               + _chunk(b'IDAT', zlib.compress(data, 0)) + _chunk(b'IEND', b''))
+        strip = Image.open(io.BytesIO(png))
+        strip.load()
+        if previous_row is not None:
+            strip = strip.crop((0, 1, self.width, rows))
+        return strip
+
+    def iter_strips(self, keep_alpha: bool, matte: Tuple[int, int, int] = (255, 255, 255),
+                    strip_rows: Optional[int] = None, timer=NULL_TIMER) -> Iterator[Image.Image]:
+        """
+        上から順にストリップを返す（最後のストリップ以外はstrip_rows行）
+
+        保持するのは展開中のストリップのみのため、メモリ使用量は画像の幅に比例する。
+
+        Args:
+            keep_alpha: アルファを残すか（Falseならmatteに合成）
+            matte: 背景色（RGB）
+            strip_rows: 1ストリップの行数（None時はSTRIP_BYTESから決める）
+            timer: 所要時間を記録するStageTimer
+
+        Returns:
+            Iterator[Image.Image]: output_mode(keep_alpha)のストリップ
+        """
+        alpha_source = self.has_alpha_channel
+        mode = self.output_mode(keep_alpha)
+        self.has_alpha = False
+        previous_row = None
+        top = 0
+        for filtered in self._iter_rows(strip_rows or self.default_strip_rows()):
+            with timer.stage('decode', len(filtered)):
+                strip = self._decode_strip(previous_row, filtered)
+                # 次のストリップのフィルター解除に使う最終行（展開済みの生データ）
+                previous_row = strip.crop((0, strip.height - 1, self.width, strip.height)).tobytes()
+                if alpha_source:
+                    rgba = np.asarray(strip.convert('RGBA'))
+                    if not self.has_alpha and not is_opaque(rgba):
+                        self.has_alpha = True
+                    if keep_alpha:
+                        strip = Image.fromarray(rgba, 'RGBA')
+                    else:
+                        # RGBAの並びのまま合成するため背景色を逆順で渡す
+                        strip = Image.fromarray(composite_on_matte(rgba, matte[::-1]), 'RGB')
+                elif strip.mode != mode:
+                    strip = strip.convert(mode)
+            top += strip.height
+            yield strip
+        if top != self.height:
+            raise ValueError(f"画像データが不足しています（{top}/{self.height}行）")
+
+    def read(self, keep_alpha: bool, matte: Tuple[int, int, int] = (255, 255, 255),
+             timer=NULL_TIMER) -> Tuple[Image.Image, bool]:
+        """
+        ストリップ単位で読み込み、1枚のPillow画像を組み立てる
+
+        Args:
+            keep_alpha: アルファを残すか（Falseならmatteに合成）
+            matte: 背景色（RGB）
+            timer: 所要時間を記録するStageTimer
+
+        Returns:
+            Tuple[Image.Image, bool]: (画像, 透過画素を含むか)
+        """
+        image = Image.new(self.output_mode(keep_alpha), (self.width, self.height))
+        top = 0
+        for strip in self.iter_strips(keep_alpha, matte, timer=timer):
+            image.paste(strip, (0, top))
+            top += strip.height
+        return image, self.has_alpha
+
+def read_png_striped(path: str, keep_alpha: bool, matte: Tuple[int, int, int] = (255, 255, 255),
+                     timer=NULL_TIMER) -> Optional[Tuple[Image.Image, bool]]:
+    """
+    PNGをストリップ単位で読み込み（未対応の形式はNone）
+
+    Args:
+        path: PNGファイルパス
+        keep_alpha: アルファを残すか（Falseならmatteに合成）
+        matte: 背景色（RGB）
+        timer: 所要時間を記録するStageTimer
+
+    Returns:
+        Tuple[Image.Image, bool]: (画像, 透過画素を含むか)（None if 未対応）
+    """
+    reader = PngStripReader(path)
+    if not reader.supported:
+        return None
+    return reader.read(keep_alpha, matte, timer)
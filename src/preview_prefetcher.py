@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+プレビューの先読み
+選択中のファイルの前後のサムネイル・画像情報をバックグラウンドで用意する
+（customtkinterに依存しない）
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from image_converter import ImageConverter
+
+
+# 先読みする範囲（選択中のファイルから後ろ・前に何件か）
+PREFETCH_AHEAD = 8
+PREFETCH_BEHIND = 4
+
+# 先読み結果を保持する件数（古いものから破棄）
+PREFETCH_KEEP = 64
+
+# 先読みスレッド数の上限
+PREFETCH_WORKERS = 2
+
+# 先読みスレッドのnice値（Linuxのみ、変換ワーカーより後回しにする）
+PREFETCH_NICE = 10
+
+
+def _lower_thread_priority():
+    """呼び出したスレッドの優先度を下げる（対応していないOSでは何もしない）"""
+    if not sys.platform.startswith('linux') or not hasattr(os, 'setpriority'):
+        return
+    try:
+        # Linuxではスレッドごとにnice値を持つ
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICE)
+    except OSError:
+        pass
+
+
+class PreviewPrefetcher:
+    """
+    選択中のファイルの前後を先読みするスレッドプール
+
+    focus()のたびに未開始の先読みを差し替えるため、離れたファイルの先読みは始まらない
+    （実行中のものは完了後に結果を保持するだけ）。完了時点で選択中のファイルの結果のみ
+    deliverで通知し、前後の結果はget()で即座に取り出せる。選択したファイルが読み込み済みなら
+    focus()の時点で通知する。
+    変換中はpause()で先読みを止め、選択中のファイルのみ1件ずつ読み込む。
+    """
+
+    def __init__(self, converter: ImageConverter, max_size: Tuple[int, int],
+                 deliver: Callable[[str, Optional[np.ndarray], Optional[dict]], None],
+                 workers: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            converter: サムネイルの作成に使う変換エンジン（キャッシュを共有）
+            max_size: サムネイルの最大サイズ (width, height)
+            deliver: deliver(パス, サムネイル, 画像情報) 選択中のファイルの読み込み完了時に
+                先読みスレッドから呼ばれる（失敗時はNone, None、GUIへはキュー経由で渡す）
+            workers: 先読みスレッド数（None時はCPUコア数とPREFETCH_WORKERSの小さい方）
+        """
+        self.converter = converter
+        self.max_size = tuple(max_size)
+        self.deliver = deliver
+        self.workers = max(1, workers or min(PREFETCH_WORKERS, os.cpu_count() or 1))
+        # 読み込み済みの結果（パス -> (サムネイル, 画像情報)）
+        self._results: "OrderedDict[str, Tuple[np.ndarray, dict]]" = OrderedDict()
+        # 未開始の先読み（先頭ほど優先）と実行中のパス
+        self._pending: deque = deque()
+        self._running = set()
+        self._focus_path: Optional[str] = None
+        self._paused = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def _ensure_started(self):
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"preview-prefetch-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def get(self, path: str) -> Optional[Tuple[np.ndarray, dict]]:
+        """先読み済みの (サムネイル, 画像情報)（なければNone）"""
+        with self._condition:
+            result = self._results.get(path)
+            if result is not None:
+                self._results.move_to_end(path)
+            return result
+
+    def focus(self, files: Sequence[str], index: int, deliver_loaded: bool = True):
+        """
+        選択中のファイルを変更し、前後の先読みをやり直す
+
+        選択したファイルが読み込み済みなら、その時点でdeliverで通知する（get()で取り出せなかった
+        直後に読み込みが完了した場合も、選択の変更と同じロックの中で確認するため取りこぼさない）。
+
+        Args:
+            files: ファイル一覧（インデックスで参照できるもの）
+            index: 選択中のファイルのインデックス
+            deliver_loaded: 読み込み済みの場合に通知するか（呼び出し側でget()の結果を表示済みならFalse）
+        """
+        count = len(files)
+        if not 0 <= index < count:
+            return
+        order = [index]
+        for distance in range(1, PREFETCH_AHEAD + 1):
+            if index + distance < count:
+                order.append(index + distance)
+            if distance <= PREFETCH_BEHIND and index - distance >= 0:
+                order.append(index - distance)
+        paths = [files[i] for i in order]
+
+        with self._condition:
+            if self._closed:
+                return
+            self._focus_path = paths[0]
+            self._pending.clear()
+            for path in paths:
+                if path not in self._running and path not in self._results:
+                    self._pending.append(path)
+            self._ensure_started()
+            self._condition.notify_all()
+            # 選択の変更と同じロックの中で確認する（先読みスレッドは完了時に選択中か確認するため、
+            # どちらか一方だけが通知する）
+            loaded = self._results.get(paths[0]) if deliver_loaded else None
+            if loaded is not None:
+                self._results.move_to_end(paths[0])
+        if loaded is not None:
+            self.deliver(paths[0], *loaded)
+
+    def pause(self):
+        """先読みを止める（選択中のファイルの読み込みは続ける）"""
+        with self._condition:
+            self._paused = True
+
+    def resume(self):
+        """先読みを再開"""
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+    def clear(self):
+        """未開始の先読みと読み込み済みの結果を破棄"""
+        with self._condition:
+            self._focus_path = None
+            self._pending.clear()
+            self._results.clear()
+
+    def close(self):
+        """スレッドを終了（実行中の読み込みは完了まで待たない）"""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def _next_task(self) -> Optional[str]:
+        """次に読み込むパス（終了時はNone）"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if self._pending:
+                    path = self._pending[0]
+                    # 一時停止中は選択中のファイルのみ
+                    if not self._paused or path == self._focus_path:
+                        self._pending.popleft()
+                        self._running.add(path)
+                        return path
+                self._condition.wait()
+
+    def _worker(self):
+        _lower_thread_priority()
+        while True:
+            path = self._next_task()
+            if path is None:
+                return
+            result = self.get(path)
+            try:
+                if result is None:
+                    result = self._load(path)
+            except Exception as e:
+                print(f"プレビュー先読みエラー: {path} - {str(e)}", file=sys.stderr)
+                result = None
+            with self._condition:
+                self._running.discard(path)
+                if result is not None:
+                    self._results[path] = result
+                    self._results.move_to_end(path)
+                    while len(self._results) > PREFETCH_KEEP:
+                        self._results.popitem(last=False)
+                # 読み込み中に選択が変わっていれば通知しない
+                current = path == self._focus_path
+            if current:
+                self.deliver(path, *(result or (None, None)))
+
+    def _load(self, path: str) -> Optional[Tuple[np.ndarray, dict]]:
+        decoded = self.converter.load_image(path)
+        if decoded is None:
+            return None
+        thumb = self.converter.create_preview(path, self.max_size, decoded=decoded)
+        info = decoded.info
+        # ディスクキャッシュから読めた場合はメモリマップを残さない（変換時に開き直す）
+        decoded.release_data()
+        if thumb is None:
+            return None
+        return thumb, info
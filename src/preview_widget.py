@@ -17,13 +17,23 @@ import tkinter as tk
 import customtkinter as ctk
 from PIL import Image
 
+from image_probe import probe_image
+from decoded_image import decode_reduced, read_buffer, resize_to_fit, to_pil_image
+from thumbnail_cache import ThumbnailCache
+
 
 class PreviewWidget(ctk.CTkFrame):
     """画像プレビューウィジェット（コンパクト版）"""
     
-    def __init__(self, master, title: str = "プレビュー"):
+    # 画像表示フレームのサイズ（プレビュー画像はこのサイズに直接デコード・縮小する）
+    DISPLAY_SIZE = (200, 130)
+    
+    def __init__(self, master, title: str = "プレビュー",
+                 thumbnail_cache: Optional[ThumbnailCache] = None):
         super().__init__(master)
         self.title = title
+        # プレビュー画像のディスクキャッシュ（Noneなら毎回縮小デコード）
+        self.thumbnail_cache = thumbnail_cache
         self.current_image = None
         self.current_image_path = None
         self.image_info = None
@@ -97,13 +107,26 @@ class PreviewWidget(ctk.CTkFrame):
             height=130
         )
         
-    def set_image(self, image_path: Optional[str], preview_image: Optional[np.ndarray] = None):
+    def show_loading(self):
+        """読み込み中の表示（先読みの完了を待つ間）"""
+        self.image_label.configure(
+            text="読み込み中...",
+            text_color="#e5e5e5",
+            fg_color="#2a2a2a",
+            image=None,
+            width=200,
+            height=130
+        )
+        
+    def set_image(self, image_path: Optional[str], preview_image: Optional[np.ndarray] = None,
+                  image_info: Optional[dict] = None):
         """
         画像を設定
         
         Args:
             image_path: 画像ファイルパス（Noneまたは空文字列の場合はプレースホルダー表示）
             preview_image: プレビュー画像（Noneの場合は自動生成）
+            image_info: 画像情報（ImageConverter.get_image_info形式、Noneの場合は自動取得）
         """
         self.current_image_path = image_path
         
@@ -120,7 +143,7 @@ class PreviewWidget(ctk.CTkFrame):
             if preview_image is not None:
                 self.current_image = preview_image
                 self._display_image(preview_image)
-                self._update_info(image_path)
+                self._update_info(image_path, image_info)
             else:
                 self.show_error("画像の読み込みに失敗しました")
                 
@@ -130,17 +153,12 @@ class PreviewWidget(ctk.CTkFrame):
     def _create_preview_image(self, image_path: str) -> Optional[np.ndarray]:
         """プレビュー画像を作成"""
         try:
-            # OpenCVで画像を読み込み (日本語パス対応版)
-            img_array = np.fromfile(image_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is None:
-                return None
-                
-            # プレビューサイズにリサイズ（ компакт 版）
+            # 表示サイズへ縮小デコード（JPEG/WebPはデコーダー側で縮小）
             preview_size = self._get_preview_size()
-            img_resized = self._resize_image(img, preview_size)
-            
-            return img_resized
+            if self.thumbnail_cache is not None:
+                return self.thumbnail_cache.get_or_create(
+                    image_path, preview_size, lambda: decode_reduced(image_path, preview_size))
+            return decode_reduced(image_path, preview_size)
             
         except Exception as e:
             print(f"プレビュー画像作成エラー: {str(e)}")
@@ -148,54 +166,41 @@ class PreviewWidget(ctk.CTkFrame):
             
     def _get_preview_size(self) -> Tuple[int, int]:
         """プレビューサイズを取得（130px対応版）"""
-        # 130pxに拡大したプレビューサイズ
-        max_width = 280    # 350 -> 280
-        max_height = 130   # 200 -> 130 (130pxに拡大)
-
-        return (max_width, max_height)
+        # 表示フレームと同じサイズ（280x130で作って表示時に再縮小しない）
+        return self.DISPLAY_SIZE
         
     def _resize_image(self, img: np.ndarray, max_size: Tuple[int, int]) -> np.ndarray:
         """画像をリサイズ（Aspect Ratio維持）"""
-        height, width = img.shape[:2]
-        max_width, max_height = max_size
-        
-        # アスペクト比を維持してリサイズ
-        if width > max_width or height > max_height:
-            scale = min(max_width / width, max_height / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
-        return img
+        return resize_to_fit(img, max_size)
         
     def _display_image(self, img: np.ndarray):
         """画像を表示（130px対応版 + アスペクト比維持）"""
         try:
-            # OpenCVのBGRをRGBに変換
-            if len(img.shape) == 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB) if len(img.shape) == 2 else img
-            
-            # PIL Imageに変換
-            pil_image = Image.fromarray(img_rgb)
+            # PIL Imageに変換（BGRはrawモードで読み替え、RGB配列を作らない）
+            pil_image = to_pil_image(img)
             
             # フレームサイズを取得
-            frame_width = 200
-            frame_height = 130
+            frame_width, frame_height = self.DISPLAY_SIZE
             
-            # アスペクト比を維持してリサイズ
             img_width, img_height = pil_image.size
-            scale_w = frame_width / img_width
-            scale_h = frame_height / img_height
-            scale = min(scale_w, scale_h)
-            
-            # 新しいサイズを計算（ Center 配置用）
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            
-            # リサイズ
-            resized_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            fits_frame = (img_width <= frame_width and img_height <= frame_height
+                          and (img_width == frame_width or img_height == frame_height))
+            if fits_frame:
+                # 既に表示サイズで作成済みなら再リサイズしない
+                new_width, new_height = img_width, img_height
+                resized_image = pil_image
+            else:
+                # アスペクト比を維持してリサイズ
+                scale_w = frame_width / img_width
+                scale_h = frame_height / img_height
+                scale = min(scale_w, scale_h)
+                
+                # 新しいサイズを計算（ Center 配置用）
+                new_width = max(1, int(img_width * scale))
+                new_height = max(1, int(img_height * scale))
+                
+                # リサイズ
+                resized_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
             
             # CTkImageを使用（ Center 配置）
             ctk_image = ctk.CTkImage(light_image=resized_image, size=(new_width, new_height))
@@ -214,20 +219,32 @@ class PreviewWidget(ctk.CTkFrame):
             print(f"プレビュー表示エラー: {str(e)}")
             self.show_error(f"画像表示エラー: {str(e)}")
             
-    def _update_info(self, image_path: str):
+    def _update_info(self, image_path: str, image_info: Optional[dict] = None):
         """情報を更新（ компакт 版）"""
         try:
             # ファイル情報取得
             file_info = Path(image_path)
+            
+            # 画像情報が渡されていなければヘッダーのみ解析（デコードしない）
+            if image_info is None:
+                image_info = probe_image(image_path)
+            if image_info is not None:
+                self._show_info(file_info.name, image_info['width'], image_info['height'],
+                                image_info['channels'], image_info['file_size'] / (1024 * 1024),
+                                image_info.get('bit_depth'), image_info.get('has_alpha', False))
+                return
+                
             file_size = file_info.stat().st_size
             file_size_mb = file_size / (1024 * 1024)
             
-            # 画像情報取得（複数回試行）
+            # 未対応形式の場合のみデコードして取得（複数回試行）
             img = None
             for attempt in range(3):
                 try:
-                    # 日本語パス対応版
-                    img_array = np.fromfile(image_path, dtype=np.uint8)
+                    # 日本語パス対応版（メモリマップしてコピーせずにデコード）
+                    img_array = read_buffer(image_path)
+                    if img_array.size == 0:
+                        break
                     img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
                     if img is not None:
                         break
@@ -241,29 +258,39 @@ class PreviewWidget(ctk.CTkFrame):
             if img is not None:
                 height, width = img.shape[:2]
                 channels = img.shape[2] if len(img.shape) == 3 else 1
-                
-                info_text = f"📁 {file_info.name}\n"
-                info_text += f"📏 {width} × {height}\n"
-                info_text += f"🎨 {channels}ch\n"
-                info_text += f"💾 {file_size_mb:.2f}MB"
-                
-                self.image_info = {
-                    'width': width,
-                    'height': height,
-                    'channels': channels,
-                    'file_size_mb': file_size_mb
-                }
+                self._show_info(file_info.name, width, height, channels, file_size_mb)
             else:
                 info_text = f"📁 {file_info.name}\n❌ 画像情報が取得できませんでした"
                 self.image_info = None
-                
-            self.info_label.configure(text=info_text)
+                self.info_label.configure(text=info_text)
             
         except Exception as e:
             error_msg = f"❌ 情報取得エラー: {str(e)}"
             self.info_label.configure(text=error_msg)
             print(f"プレビュー情報更新エラー: {e}")
             
+    def _show_info(self, name: str, width: int, height: int, channels: int, file_size_mb: float,
+                   bit_depth: Optional[int] = None, has_alpha: bool = False):
+        """画像情報を表示"""
+        color_text = f"{channels}ch"
+        if bit_depth:
+            color_text += f" / {bit_depth}bit"
+        if has_alpha:
+            color_text += " / 透過あり"
+            
+        info_text = f"📁 {name}\n"
+        info_text += f"📏 {width} × {height}\n"
+        info_text += f"🎨 {color_text}\n"
+        info_text += f"💾 {file_size_mb:.2f}MB"
+        
+        self.image_info = {
+            'width': width,
+            'height': height,
+            'channels': channels,
+            'file_size_mb': file_size_mb
+        }
+        self.info_label.configure(text=info_text)
+            
     def show_error(self, message: str):
         """エラーを表示"""
         self.image_label.configure(
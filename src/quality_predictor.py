@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+品質予測
+画像から抜き出した小領域の試しエンコード・エントロピー・エッジ密度・画像サイズから
+指定品質でのエンコード後サイズを予測し、品質探索の開始点を決める
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import io
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+# この画素数未満の画像は予測しない（エンコードが十分速いため）
+MIN_PREDICT_PIXELS = 1000 * 1000
+
+# 試しエンコードに使う見本画像の画素数の目安
+SAMPLE_PIXELS = 160 * 1000
+
+# 見本画像に並べる小領域の一辺（JPEGのMCU境界に合わせて16の倍数）
+SAMPLE_TILE = 64
+
+# 学習の忘却係数（古い結果ほど影響を小さくする）
+FORGETTING = 0.97
+
+
+def bisection_encodes(quality: int, min_quality: int, answer: Optional[int]) -> int:
+    """
+    予測なしの二分探索（ImageConverter._search_quality）が同じ結果に至るまでのエンコード回数
+
+    Args:
+        quality: 指定品質
+        min_quality: 最低品質
+        answer: サイズ制限内に収まる最高品質（収まらない場合はNone）
+
+    Returns:
+        int: エンコード回数
+    """
+    def fits(q):
+        return answer is not None and q <= answer
+
+    encodes = 1
+    if fits(quality):
+        return encodes
+    best = None
+    last = quality
+    low, high = min_quality, quality - 1
+    while low <= high:
+        mid = (low + high) // 2
+        encodes += 1
+        last = mid
+        if fits(mid):
+            best = mid
+            low = mid + 1
+        else:
+            high = mid - 1
+    if best is None and last != min_quality:
+        encodes += 1
+    return encodes
+
+
+def sample_tiles(pil_img: Image.Image, target_pixels: int = SAMPLE_PIXELS,
+                 tile: int = SAMPLE_TILE) -> Tuple[Image.Image, float]:
+    """
+    画像全体から等間隔に小領域を抜き出し、1枚の見本画像に並べる
+
+    縮小すると細部やノイズが平均化されてバイト数の見積もりが内容によって大きくずれるため、
+    元の解像度のまま一部の領域だけを使う。
+
+    Returns:
+        Tuple[Image.Image, float]: (見本画像, 元画像と見本画像の画素数比)
+    """
+    width, height = pil_img.size
+    tile = min(tile, width, height)
+    count = max(1, target_pixels // (tile * tile))
+    grid_x = max(1, min(width // tile, round(math.sqrt(count * width / height))))
+    grid_y = max(1, min(height // tile, math.ceil(count / grid_x)))
+    sample = Image.new(pil_img.mode, (grid_x * tile, grid_y * tile))
+    for j in range(grid_y):
+        y = (j * (height - tile) // max(1, grid_y - 1)) // 16 * 16
+        for i in range(grid_x):
+            x = (i * (width - tile) // max(1, grid_x - 1)) // 16 * 16
+            sample.paste(pil_img.crop((x, y, x + tile, y + tile)), (i * tile, j * tile))
+    return sample, (width * height) / (sample.width * sample.height)
+
+
+class SizeModel:
+    """見本画像から元画像へのサイズ補正係数をオンライン学習（逐次最小二乗法）"""
+
+    def __init__(self):
+        # 特徴量: [定数, エントロピー/8, エッジ密度, log10(画素数)/8]
+        self.weights = np.zeros(4)
+        self.covariance = np.eye(4)
+        self.samples = 0
+        # 複数形式の同時変換で同じ形式のモデルを共有する場合に備える
+        self._lock = threading.Lock()
+
+    def log_ratio(self, features: np.ndarray) -> float:
+        """log(実サイズ / 画素数比で拡大した見本画像のサイズ) の予測値"""
+        with self._lock:
+            return float(self.weights @ features)
+
+    def observe(self, features: np.ndarray, log_ratio: float):
+        """実測した補正係数で学習"""
+        with self._lock:
+            px = self.covariance @ features
+            gain = px / (FORGETTING + features @ px)
+            self.weights += gain * (log_ratio - self.weights @ features)
+            self.covariance = (self.covariance - np.outer(gain, px)) / FORGETTING
+            self.samples += 1
+
+
+class SizePredictor:
+    """1画像分のサイズ予測（見本画像の試しエンコード結果をキャッシュ）"""
+
+    def __init__(self, sample: Image.Image, pixels: int, pixel_ratio: float,
+                 image_format: str, save_options: dict, model: SizeModel):
+        self.sample = sample
+        self.pixels = pixels
+        self.pixel_ratio = pixel_ratio
+        self.image_format = image_format
+        self.save_options = save_options
+        self.model = model
+        self.features = self._features()
+        self._sample_sizes: Dict[int, int] = {}
+        self._buffer = io.BytesIO()
+
+    def _features(self) -> np.ndarray:
+        gray = np.asarray(self.sample.convert('L'), dtype=np.int16)
+        hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+        prob = hist[hist > 0] / gray.size
+        entropy = float(-(prob * np.log2(prob)).sum())
+        edges = 0.0
+        if gray.shape[0] > 1 and gray.shape[1] > 1:
+            edges = float((np.abs(np.diff(gray, axis=0)).mean()
+                           + np.abs(np.diff(gray, axis=1)).mean()) / 255.0)
+        return np.array([1.0, entropy / 8.0, edges, math.log10(self.pixels) / 8.0])
+
+    def sample_size(self, quality: int) -> int:
+        """見本画像を指定品質でエンコードしたバイト数"""
+        size = self._sample_sizes.get(quality)
+        if size is None:
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self.sample.save(self._buffer, self.image_format, quality=quality,
+                             optimize=True, **self.save_options)
+            size = self._buffer.tell()
+            self._sample_sizes[quality] = size
+        return size
+
+    def predict(self, quality: int) -> float:
+        """元画像を指定品質でエンコードした場合のバイト数の予測"""
+        return (self.sample_size(quality) * self.pixel_ratio
+                * math.exp(self.model.log_ratio(self.features)))
+
+    def best_quality(self, max_bytes: float, low: int, high: int, correction: float = 1.0) -> int:
+        """
+        予測サイズが上限に収まる最高品質
+
+        Args:
+            max_bytes: 最大バイト数
+            low: 探索範囲の下限
+            high: 探索範囲の上限
+            correction: 予測に掛ける補正（実測 / 予測）
+
+        Returns:
+            int: 品質（範囲内に収まるものがなければlow - 1）
+        """
+        best = low - 1
+        while low <= high:
+            mid = (low + high) // 2
+            if self.predict(mid) * correction <= max_bytes:
+                best = mid
+                low = mid + 1
+            else:
+                high = mid - 1
+        return best
+
+    def observe(self, quality: int, actual_size: int):
+        """元画像の実測サイズで補正係数を学習（見本画像をエンコード済みの品質のみ）"""
+        sample_size = self._sample_sizes.get(quality)
+        if not sample_size or actual_size <= 0:
+            return
+        self.model.observe(self.features, math.log(actual_size / (sample_size * self.pixel_ratio)))
+
+
+class QualityPredictor:
+    """出力形式ごとのサイズ予測モデル（変換ごとに結果を学習）"""
+
+    def __init__(self):
+        self.models: Dict[str, SizeModel] = {}
+        # 統計（予測を使ったファイル数・削減したエンコード回数の合計）
+        self.files = 0
+        self.encodes_saved = 0
+        self._lock = threading.Lock()
+
+    def for_image(self, pil_img: Image.Image, image_format: str,
+                  save_options: Optional[dict] = None) -> Optional[SizePredictor]:
+        """
+        画像のサイズ予測を作成
+
+        Args:
+            pil_img: 変換する画像
+            image_format: 出力形式（"JPEG" / "WEBP"）
+            save_options: エンコード時の追加オプション
+
+        Returns:
+            SizePredictor: サイズ予測（小さい画像はNone）
+        """
+        width, height = pil_img.size
+        pixels = width * height
+        if pixels < MIN_PREDICT_PIXELS:
+            return None
+        sample, pixel_ratio = sample_tiles(pil_img)
+        with self._lock:
+            model = self.models.get(image_format)
+            if model is None:
+                model = SizeModel()
+                self.models[image_format] = model
+        return SizePredictor(sample, pixels, pixel_ratio, image_format,
+                             dict(save_options or {}), model)
+
+    def record(self, encodes_saved: int):
+        with self._lock:
+            self.files += 1
+            self.encodes_saved += encodes_saved
+
+    @property
+    def average_saved(self) -> float:
+        return self.encodes_saved / self.files if self.files else 0.0
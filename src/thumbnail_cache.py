@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+サムネイルのディスクキャッシュ
+プレビュー用のサムネイルをディスクに保存し、起動し直しても再デコードしない
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# サムネイルの作り方を変えた場合に上げる（古いキャッシュを使わない）
+THUMBNAIL_VERSION = 1
+
+# 既定のキャッシュ上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 上限を超えた場合、この割合まで古いものから削除（削除のたびに走査しない）
+EVICT_TARGET_RATIO = 0.9
+
+# 保存時のPNG圧縮レベル（小さい画像のため読み込み速度を優先）
+PNG_COMPRESSION = 1
+
+# この時間以上残っている一時ファイルは書き込み途中で終了したものとして削除（秒）
+STALE_TEMP_SECONDS = 3600
+
+# 最終使用日時の更新間隔（秒、表示のたびにディスクへ書き込まない）
+TOUCH_INTERVAL = 60
+
+TEMP_PREFIX = '.tmp_'
+ENTRY_SUFFIX = '.png'
+
+
+def default_cache_dir() -> str:
+    """OSごとの標準のキャッシュフォルダ"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'png2jpeg', 'thumbnails')
+
+
+class ThumbnailCache:
+    """
+    サムネイルのディスクキャッシュ
+
+    キーは画像のパス・ファイルサイズ・更新日時とサムネイルの寸法のハッシュで、
+    元画像が変更されるとキーが変わり古いエントリーは使われなくなる（上限超過時に削除）。
+    エントリーの更新日時を最終使用日時として扱い、上限を超えると古いものから削除する。
+    書き込みは同じフォルダの一時ファイルからのリネームのため、複数のスレッド・プロセスが
+    同時に読み書きしても書きかけのファイルを読むことはない。
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        初期化
+
+        Args:
+            directory: キャッシュフォルダ（None時はOSの標準のキャッシュフォルダ）
+            max_bytes: キャッシュの最大バイト数
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        # キャッシュ全体のバイト数（初回の書き込み時にフォルダを走査して求める）
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        # 統計（ヒット・ミス・削除した件数）
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def make_key(path: str, file_size: int, mtime_ns: int, max_size: Tuple[int, int]) -> str:
+        """
+        エントリーのキー
+
+        Args:
+            path: 画像ファイルパス
+            file_size: ファイルサイズ
+            mtime_ns: 更新日時（ナノ秒）
+            max_size: サムネイルの最大サイズ (width, height)
+
+        Returns:
+            str: キー（SHA-256の16進文字列）
+        """
+        path = os.path.normcase(os.path.abspath(path))
+        source = f"{THUMBNAIL_VERSION}\0{path}\0{file_size}\0{mtime_ns}\0{max_size[0]}x{max_size[1]}"
+        return hashlib.sha256(source.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        # 1フォルダのファイル数を抑えるため先頭2文字で分ける
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, path: str, max_size: Tuple[int, int]) -> Optional[np.ndarray]:
+        """
+        キャッシュ済みのサムネイルを取得
+
+        Args:
+            path: 画像ファイルパス
+            max_size: サムネイルの最大サイズ (width, height)
+
+        Returns:
+            np.ndarray: サムネイル（キャッシュにない・元画像が変更された場合はNone）
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return self._read(self.make_key(path, stat.st_size, stat.st_mtime_ns, max_size))
+
+    def get_or_create(self, path: str, max_size: Tuple[int, int],
+                      create: Callable[[], Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        """
+        キャッシュ済みのサムネイルを取得、なければ作成して保存
+
+        Args:
+            path: 画像ファイルパス
+            max_size: サムネイルの最大サイズ (width, height)
+            create: サムネイルを作成する関数（None if error）
+
+        Returns:
+            np.ndarray: サムネイル（None if error）
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return create()
+        # 作成前の更新日時でキーを決める（作成中に変更されても新しい内容を古いキーで保存しない）
+        key = self.make_key(path, stat.st_size, stat.st_mtime_ns, max_size)
+        thumb = self._read(key)
+        if thumb is None:
+            thumb = create()
+            if thumb is not None:
+                self._write(key, thumb)
+        return thumb
+
+    def put(self, path: str, max_size: Tuple[int, int], thumb: np.ndarray):
+        """サムネイルを保存（元画像の現在のサイズ・更新日時をキーにする）"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self._write(self.make_key(path, stat.st_size, stat.st_mtime_ns, max_size), thumb)
+
+    def _read(self, key: str) -> Optional[np.ndarray]:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                last_used = os.fstat(f.fileno()).st_mtime
+                data = f.read()
+        except OSError:
+            # 未作成、または他のプロセスが削除した
+            with self._lock:
+                self.misses += 1
+            return None
+        thumb = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        with self._lock:
+            if thumb is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if thumb is None:
+            # 壊れたエントリーは削除して作り直す
+            self._remove(entry_path)
+            return None
+        # 最終使用日時を更新（LRUの順序、直近に更新済みなら省略）
+        now = time.time()
+        if now - last_used >= TOUCH_INTERVAL:
+            try:
+                os.utime(entry_path, (now, now))
+            except OSError:
+                pass
+        return thumb
+
+    def _write(self, key: str, thumb: np.ndarray):
+        entry_path = self._entry_path(key)
+        ok, encoded = cv2.imencode(ENTRY_SUFFIX, thumb,
+                                   [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+        if not ok:
+            return
+        folder = os.path.dirname(entry_path)
+        temp_path = os.path.join(folder, f"{TEMP_PREFIX}{uuid.uuid4().hex[:8]}_{key}{ENTRY_SUFFIX}")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(encoded.tobytes())
+            # 同じキーを上書きする場合（他のスレッド・プロセスが同時に作成した場合など）は
+            # 差分のみ合計に加える
+            try:
+                replaced_bytes = os.stat(entry_path).st_size
+            except OSError:
+                replaced_bytes = 0
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            print(f"サムネイルキャッシュ書き込みエラー: {entry_path} - {str(e)}", file=sys.stderr)
+            self._remove(temp_path)
+            return
+
+        if self._add_bytes(encoded.nbytes - replaced_bytes) > self.max_bytes:
+            self.evict()
+
+    def _add_bytes(self, nbytes: int) -> int:
+        """書き込んだバイト数を合計に加える（初回はフォルダを走査して求める）"""
+        with self._lock:
+            known = self._total_bytes is not None
+            if known:
+                self._total_bytes += nbytes
+                return self._total_bytes
+        total = self._scan()[1]
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = total
+            return self._total_bytes
+
+    def _scan(self) -> Tuple[list, int]:
+        """全エントリーの (最終使用日時, バイト数, パス) と合計バイト数"""
+        entries = []
+        total = 0
+        now = time.time()
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return entries, total
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                files = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.startswith(TEMP_PREFIX):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        self._remove(entry.path)
+                    continue
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """上限を超えていれば最終使用日時の古いものから削除"""
+        # 他のスレッドが削除中なら任せる
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            self._evict()
+        finally:
+            self._evict_lock.release()
+
+    def _evict(self):
+        entries, total = self._scan()
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TARGET_RATIO
+            entries.sort()
+            removed = 0
+            for _, size, entry_path in entries:
+                if total <= target:
+                    break
+                if self._remove(entry_path):
+                    removed += 1
+                # 他のプロセスが先に削除した場合もその分は減っている
+                total -= size
+            with self._lock:
+                self.evicted += removed
+        with self._lock:
+            self._total_bytes = total
+
+    def clear(self):
+        """キャッシュを全削除"""
+        entries, _ = self._scan()
+        for _, _, entry_path in entries:
+            self._remove(entry_path)
+        with self._lock:
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        """キャッシュ全体のバイト数"""
+        return self._add_bytes(0)
+
+    @staticmethod
+    def _remove(file_path: str) -> bool:
+        try:
+            os.remove(file_path)
+            return True
+        except OSError:
+            return False
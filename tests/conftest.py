@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+テスト共通設定
+srcフォルダをパスに追加し、テスト用の画像を生成する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# srcフォルダをパスに追加
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_dir, 'src'))
+
+
+def make_pixels(width: int, height: int, channels: int = 3, seed: int = 0) -> np.ndarray:
+    """グラデーションにノイズを加えた画像（圧縮後のサイズが品質で変わるもの）"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    planes = [(x * 255 // max(1, width - 1)), (y * 255 // max(1, height - 1)), ((x + y) % 256)]
+    base = np.stack([planes[i % 3] for i in range(channels)], axis=2).astype(np.int16)
+    noise = rng.integers(-24, 25, size=base.shape, dtype=np.int16)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.fixture
+def pixels():
+    return make_pixels
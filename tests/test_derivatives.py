@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+派生画像のテスト
+元画像より大きい幅を指定した場合に、実際の幅のファイル名・キーで1枚にまとめて出力することを確認する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import json
+import os
+
+from PIL import Image
+
+from batch_cli import main
+from derivatives import DerivativeGenerator, derivative_outputs, fit_levels, make_levels
+
+
+def test_fit_levels_merges_widths_at_or_above_source():
+    levels = make_levels([320, 640, 1280, 2560], 4, 90)
+
+    fitted = fit_levels(levels, 1000)
+
+    assert [level['width'] for level in fitted] == [320, 640, 1000]
+    # まとめた段の最大サイズは大きい方
+    assert fitted[-1]['max_size_mb'] == 4
+
+
+def test_generate_names_outputs_after_actual_width(tmp_path, pixels):
+    input_path = str(tmp_path / "photo.png")
+    Image.fromarray(pixels(160, 90)).save(input_path)
+    levels = make_levels([80, 160, 320], 1, 90)
+    outputs = derivative_outputs(input_path, str(tmp_path), levels, source_width=160)
+
+    generator = DerivativeGenerator()
+    assert generator.generate(input_path, outputs)
+
+    assert list(generator.last_result['outputs']) == ['JPEG@80w', 'JPEG@160w']
+    for key, result in generator.last_result['outputs'].items():
+        width = int(key.split('@')[1][:-1])
+        assert os.path.basename(result['output_path']) == f"photo-{width}w.jpg"
+        with Image.open(result['output_path']) as img:
+            assert img.width == width == result['width']
+    assert not (tmp_path / "photo-320w.jpg").exists()
+
+
+def test_generate_rejects_widths_above_source(tmp_path, pixels):
+    input_path = str(tmp_path / "photo.png")
+    Image.fromarray(pixels(160, 90)).save(input_path)
+    outputs = derivative_outputs(input_path, str(tmp_path), make_levels([320], 1, 90))
+
+    generator = DerivativeGenerator()
+
+    assert not generator.generate(input_path, outputs)
+    assert "320" in generator.last_error
+    assert not (tmp_path / "photo-320w.jpg").exists()
+
+
+def test_cli_manifest_keys_match_actual_widths(tmp_path, pixels, capsys):
+    input_path = str(tmp_path / "photo.png")
+    Image.fromarray(pixels(160, 90)).save(input_path)
+    output_dir = tmp_path / "out"
+    argv = [input_path, '-o', str(output_dir), '--widths', '80,320,640', '-w', '1', '--incremental']
+
+    assert main(argv) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    files = [record for record in records if record['event'] == 'file']
+    assert sorted((os.path.basename(record['output']), record['width']) for record in files) == [
+        ("photo-160w.jpg", 160), ("photo-80w.jpg", 80)]
+    manifest_path = [path for path in output_dir.iterdir() if path.suffix == '.json'][0]
+    with open(manifest_path, encoding='utf-8') as f:
+        entry = next(iter(json.load(f)['entries'].values()))
+    assert sorted(entry['outputs']) == ['JPEG@160w', 'JPEG@80w']
+
+    # 2回目は変更なしとしてスキップ
+    assert main(argv) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record['status'] for record in records if record['event'] == 'file'] == ['skipped']
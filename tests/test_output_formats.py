@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+出力形式のテスト
+指定した形式のデータが書き込まれ、拡張子・結果の形式と一致することを確認する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from batch_cli import main
+from batch_engine import convert_file, get_output_path
+from image_converter import AVAILABLE_FORMATS, OUTPUT_EXTENSIONS
+
+
+def detect_format(path: str) -> str:
+    """ファイル先頭のマジックバイトから形式を判定"""
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'AVIF'
+    return 'unknown'
+
+
+@pytest.fixture
+def input_png(tmp_path, pixels):
+    path = str(tmp_path / "photo.png")
+    Image.fromarray(pixels(96, 64)).save(path)
+    return path
+
+
+@pytest.mark.parametrize('image_format', AVAILABLE_FORMATS)
+def test_convert_file_writes_requested_format(tmp_path, input_png, image_format):
+    output_path = get_output_path(input_png, str(tmp_path), image_format)
+    assert output_path.endswith(OUTPUT_EXTENSIONS[image_format])
+
+    success, result = convert_file(input_png, output_path, image_format, 4, 90)
+
+    assert success
+    assert result['output_path'] == output_path
+    assert detect_format(output_path) == image_format
+    with Image.open(output_path) as img:
+        assert img.format == image_format
+
+
+def test_convert_file_rejects_unknown_format(tmp_path, input_png):
+    output_path = str(tmp_path / "photo.png.out")
+
+    success, result = convert_file(input_png, output_path, 'PNG', 4, 90)
+
+    assert not success
+    assert "未対応の出力形式" in result['error']
+    assert not os.path.exists(output_path)
+
+
+@pytest.mark.parametrize('image_format', AVAILABLE_FORMATS)
+def test_cli_format_option(tmp_path, capsys, input_png, image_format):
+    output_dir = tmp_path / "out"
+
+    code = main([input_png, '-o', str(output_dir), '-f', image_format.lower(), '-w', '1'])
+
+    assert code == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    converted = [record for record in records
+                 if record['event'] == 'file' and record['status'] == 'ok']
+    assert len(converted) == 1
+    assert converted[0]['format'] == image_format
+    output_path = converted[0]['output']
+    assert output_path.endswith(OUTPUT_EXTENSIONS[image_format])
+    assert detect_format(output_path) == image_format
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+プレビュー先読みのテスト
+get()で取り出せなかった直後に読み込みが完了しても、focus()で通知されることを確認する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import queue
+import time
+
+from PIL import Image
+
+from image_converter import ImageConverter
+from preview_prefetcher import PreviewPrefetcher
+
+
+def test_focus_delivers_already_loaded_result(tmp_path, pixels):
+    files = []
+    for name in ("a.png", "b.png"):
+        path = str(tmp_path / name)
+        Image.fromarray(pixels(64, 48)).save(path)
+        files.append(path)
+    events = queue.Queue()
+    prefetcher = PreviewPrefetcher(ImageConverter(), (32, 32),
+                                   lambda path, thumb, info: events.put((path, thumb)), workers=1)
+    try:
+        # bを選択中にaの先読みが完了する（選択中ではないため通知されない）
+        prefetcher.focus(files, 1)
+        assert events.get(timeout=30)[0] == files[1]
+        deadline = time.monotonic() + 30
+        while prefetcher.get(files[0]) is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert events.empty()
+
+        # 呼び出し側で表示済みなら通知しない
+        prefetcher.focus(files, 0, deliver_loaded=False)
+        assert events.empty()
+
+        # get()で取り出せなかった後に完了していた場合もfocus()の時点で通知する
+        prefetcher.focus(files, 0)
+        path, thumb = events.get_nowait()
+        assert path == files[0] and thumb is not None
+        assert events.empty()
+    finally:
+        prefetcher.close()
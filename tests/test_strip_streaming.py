@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+ストリップ単位の読み込み・JPEG書き込みのテスト
+PngStripReaderがImage.openと同じ画素を返すこと、ストリップ単位のJPEGが通常の経路と同じ出力になり
+最大ファイルサイズを守ることを確認する
+
+Author: Generated for user
+Date: 2026-10-18
+Version: 1.0.0
+"""
+
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import png_strip_reader
+from image_converter import ImageConverter
+from jpeg_strip_writer import JpegStripStats, JpegStripWriter
+from png_strip_reader import PngStripReader
+
+
+def make_png(path: str, pixels, color_type: str) -> Image.Image:
+    """色の形式ごとのPNGを保存（tRNS付きは透過色の画素を含める）"""
+    rgb = pixels(53, 41)
+    if color_type == 'RGB':
+        img = Image.fromarray(rgb)
+    elif color_type == 'RGBA':
+        img = Image.fromarray(np.dstack([rgb, rgb[:, :, 0]]), 'RGBA')
+    elif color_type == 'LA':
+        img = Image.fromarray(np.dstack([rgb[:, :, 1], rgb[:, :, 0]]), 'LA')
+    elif color_type in ('L', 'L+tRNS'):
+        img = Image.fromarray(rgb[:, :, 1])
+    elif color_type in ('P', 'P+tRNS'):
+        img = Image.fromarray(rgb).quantize(64)
+    elif color_type == 'RGB+tRNS':
+        rgb[::3, ::5] = (10, 20, 30)
+        img = Image.fromarray(rgb)
+    params = {}
+    if color_type == 'L+tRNS':
+        params['transparency'] = int(rgb[0, 0, 1])
+    elif color_type == 'P+tRNS':
+        params['transparency'] = bytes(range(0, 256, 4))
+    elif color_type == 'RGB+tRNS':
+        params['transparency'] = (10, 20, 30)
+    img.save(path, **params)
+    return img
+
+
+@pytest.mark.parametrize('color_type', ['L', 'RGB', 'P', 'LA', 'RGBA',
+                                        'L+tRNS', 'P+tRNS', 'RGB+tRNS'])
+@pytest.mark.parametrize('strip_rows', [1, 7, 64])
+def test_strip_reader_matches_image_open(tmp_path, pixels, color_type, strip_rows):
+    path = str(tmp_path / "image.png")
+    make_png(path, pixels, color_type)
+
+    reader = PngStripReader(path)
+    assert reader.supported
+    mode = reader.output_mode(True)
+    strips = list(reader.iter_strips(True, strip_rows=strip_rows))
+
+    assert all(strip.mode == mode for strip in strips)
+    assert [strip.height for strip in strips[:-1]] == [strip_rows] * (len(strips) - 1)
+    with Image.open(path) as img:
+        expected = np.asarray(img.convert(mode))
+    assert np.array_equal(np.concatenate([np.asarray(strip) for strip in strips]), expected)
+    assert reader.has_alpha == (mode == 'RGBA')
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGB'])
+@pytest.mark.parametrize('size', [(53, 41), (64, 48), (17, 3)])
+def test_strip_writer_matches_pillow(pixels, mode, size):
+    img = Image.fromarray(pixels(*size)).convert(mode)
+    expected = io.BytesIO()
+    img.save(expected, 'JPEG', quality=80, optimize=True)
+
+    strips = [img.crop((0, top, img.width, min(img.height, top + 16)))
+              for top in range(0, img.height, 16)]
+    stats = JpegStripStats(img.width, img.height, mode, [80])
+    for strip in strips:
+        stats.add(strip)
+    output = io.BytesIO()
+    writer = JpegStripWriter(output, img.width, img.height, mode, 80, stats.huffman_tables(80))
+    for strip in strips:
+        writer.write(strip)
+    size_written = writer.close()
+
+    assert output.getvalue() == expected.getvalue()
+    assert size_written == len(expected.getvalue())
+    # サイズの下限は0xFFの後の0x00を除いたもの
+    assert stats.minimum_size(80) <= size_written
+
+
+@pytest.fixture
+def large_png(tmp_path, pixels, monkeypatch):
+    """複数のストリップに分かれるPNG（ストリップの大きさを小さくする）"""
+    monkeypatch.setattr(png_strip_reader, 'STRIP_BYTES', 16 * 1024)
+    path = str(tmp_path / "large.png")
+    Image.fromarray(pixels(300, 700)).save(path)
+    return path
+
+
+@pytest.mark.parametrize('max_size_mb', [4, 0.04, 0.02, 0.0001])
+def test_streamed_jpeg_matches_normal_path(tmp_path, large_png, max_size_mb):
+    results = {}
+    for name, threshold in (('streamed', 1), ('normal', 0)):
+        converter = ImageConverter(large_image_pixels=threshold, predict_quality=False)
+        output_path = str(tmp_path / f"{name}.jpg")
+        assert converter.convert_to_jpeg(large_png, output_path, max_size_mb, 85)
+        with open(output_path, 'rb') as f:
+            results[name] = (converter.last_result, f.read())
+
+    streamed, streamed_bytes = results['streamed']
+    normal, normal_bytes = results['normal']
+    assert streamed.get('streamed') and not normal.get('streamed')
+    assert streamed['quality'] == normal['quality']
+    assert streamed['within_limit'] == normal['within_limit']
+    assert streamed['output_size'] == len(streamed_bytes)
+    assert streamed_bytes == normal_bytes
+    if streamed['within_limit']:
+        assert len(streamed_bytes) <= max_size_mb * 1024 * 1024
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.tmp_')]